@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.security import OAuth2PasswordBearer
+from typing import Dict, Any, Optional
+from app.services.container import services
+from app.utils.loop_monitor import loop_monitor
+from app.utils.profiler import COLLAPSED, FORMATS, SPEEDSCOPE, ProfilerBusy, profiler
+import json
+import os
+
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
+
+def _configured(name: str) -> set:
+    return {value.strip().lower() for value in os.getenv(name, "").split(",") if value.strip()}
+
+async def require_admin(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    """Allow users listed in ADMIN_USER_IDS or ADMIN_EMAILS (comma separated)"""
+    user = await services.supabase_service.get_user_by_token(token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if str(user.get("id", "")).lower() not in _configured("ADMIN_USER_IDS") \
+            and str(user.get("email", "")).lower() not in _configured("ADMIN_EMAILS"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+@router.get("/loop")
+async def get_loop_diagnostics(limit: Optional[int] = 20, user: Dict[str, Any] = Depends(require_admin)) -> Dict[str, Any]:
+    """Event-loop lag and the most recent blocking calls, with stacks and the route they ran for"""
+    if not loop_monitor.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loop diagnostics are disabled; set LOOP_DIAGNOSTICS=true to enable")
+    return {
+        "metrics": loop_monitor.metrics(),
+        "events": loop_monitor.events(limit)
+    }
+
+@router.get("/profile")
+async def get_profile(
+    seconds: float = Query(30, gt=0),
+    format: str = Query(COLLAPSED),
+    task_id: Optional[str] = None,
+    idle: bool = False,
+    user: Dict[str, Any] = Depends(require_admin)
+):
+    """Sample this worker's threads for ``seconds`` and return the profile as a file.
+
+    ``format`` is ``collapsed`` (flamegraph.pl / speedscope) or ``speedscope``;
+    ``task_id`` keeps only samples taken while that job or WebSocket task was running.
+    """
+    if not profiler.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiler is disabled; set PROFILER_ENABLED=true to enable")
+    if format not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of {', '.join(FORMATS)}")
+    try:
+        profile = await profiler.profile(seconds, task_id=task_id, idle=idle)
+    except ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running in this worker")
+
+    name = f"profile-{os.getpid()}-{int(profile.started_at)}"
+    headers = {"X-Profile-Samples": str(profile.samples), "X-Profile-Seconds": f"{profile.duration:.2f}"}
+    if format == SPEEDSCOPE:
+        headers["Content-Disposition"] = f'attachment; filename="{name}.speedscope.json"'
+        return Response(content=json.dumps(profile.speedscope()), media_type="application/json", headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{name}.collapsed.txt"'
+    return Response(content=profile.collapsed(), media_type="text/plain", headers=headers)
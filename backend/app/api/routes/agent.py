@@ -1,21 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.security import OAuth2PasswordBearer
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from app.services.supabase_service import SupabaseService
-from app.services.encryption_service import EncryptionService
-from app.services.openai_service import OpenAIService
-from app.services.anthropic_service import AnthropicService
-from app.services.azure_openai_service import AzureOpenAIService
-from app.services.gemini_service import GeminiService
-from app.services.deepseek_service import DeepSeekService
+from app.services.container import services
+from app.services.provider_registry import provider_registry
+from app.services.llm_client_registry import llm_client_registry
+from app.services.ws_sender import WebSocketSender
+from app.services.fanout import FIRST, BEST, fanout_models, task_options, get_scorer, run_fanout
+from app.services.result_cache import BYPASS, ONLY, CACHE_OPTION_KEYS, result_cache
+from app.services.page_profile import PageProfile
+from app.utils.metrics import ERRORS, WEBSOCKET_CONNECTIONS
+from app.utils import activity, tracing
 import json
 import os
+import time
+import uuid
+import asyncio
 from dotenv import load_dotenv
 
 router = APIRouter()
-supabase_service = SupabaseService()
-encryption_service = EncryptionService()
+WS_MAX_CONCURRENT_TASKS = int(os.getenv("WS_MAX_CONCURRENT_TASKS", "3"))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
 class TaskRequest(BaseModel):
@@ -24,30 +28,129 @@ class TaskRequest(BaseModel):
     options: Optional[Dict[str, Any]] = None
 
 class AgentResponse(BaseModel):
-    type: str  # "thinking", "response", "action", "error"
+    type: str  # "thinking", "delta", "response", "action", "page_stats", "error"
     content: str
+    step_id: Optional[int] = None
     action_type: Optional[str] = None
     action_data: Optional[Dict[str, Any]] = None
 
 # Helper function to determine provider from model name
 def get_provider_from_model(model: str) -> str:
-    if model.startswith(("gpt", "text-davinci")):
-        return "openai"
-    elif model.startswith("claude"):
-        return "anthropic"
-    elif model.startswith("gemini"):
-        return "gemini"
-    elif model.startswith("deepseek"):
-        return "deepseek"
-    elif model.startswith("azure-"):
-        return "azure-openai"
-    else:
-        return "unknown"
-
-@router.post("/execute")
+    return provider_registry.resolve(model) or "unknown"
+
+def create_service(provider: str, api_key: str):
+    return provider_registry.create_service(provider, api_key)
+
+def model_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Options to hand to the models, without the fan-out, result cache and browser profile settings"""
+    return {k: v for k, v in task_options(options).items() if k not in CACHE_OPTION_KEYS and k != "profile"}
+
+def get_service_and_llm(user_id: str, provider: str, encrypted_key: str, model: str, options: Optional[Dict[str, Any]]):
+    """Return the cached provider service and LLM client, decrypting the key only on first use"""
+    service = llm_client_registry.get_service(
+        user_id,
+        provider,
+        encrypted_key,
+        lambda: create_service(provider, services.encryption_service.decrypt(encrypted_key))
+    )
+    llm = llm_client_registry.get_llm(
+        user_id,
+        provider,
+        encrypted_key,
+        model,
+        options,
+        lambda: service.create_llm(model, options, user_id)
+    )
+    return service, llm
+
+async def get_fanout_candidates(user_id: str, model: str, options: Dict[str, Any], token: Optional[str] = None) -> List[tuple]:
+    """``(model, service, llm)`` for every model a task should fan out to.
+
+    Returns an empty list when the task runs on a single model. Models with
+    an unknown provider or no stored API key are skipped.
+    """
+    preferences = await services.supabase_service.get_user_preferences(user_id, token)
+    models = fanout_models(model, options, preferences)
+    if len(models) < 2:
+        return []
+    
+    if options.get("fanout", FIRST) not in (FIRST, BEST):
+        raise ValueError(f"Unknown fan-out strategy: {options['fanout']}")
+    get_scorer(options.get("scorer"))
+    
+    llm_options = model_options(options)
+    candidates = []
+    for candidate in models:
+        provider = get_provider_from_model(candidate)
+        if provider == "unknown":
+            continue
+        encrypted_key = await services.supabase_service.get_user_api_key(user_id, provider, token)
+        if not encrypted_key:
+            continue
+        service, llm = get_service_and_llm(user_id, provider, encrypted_key, candidate, llm_options)
+        candidates.append((candidate, service, llm))
+    return candidates if len(candidates) > 1 else []
+
+def browser_profile(user_id: str, options: Dict[str, Any]) -> Optional[str]:
+    """The persistent browser profile a task browses with when it asks for one with ``profile: true``"""
+    return user_id if options.get("profile") is True else None
+
+async def stream_fanout(candidates: List[tuple], task: str, options: Dict[str, Any], profile: Optional[str] = None):
+    """Run a task on every candidate and yield the selected run's events, then a fan-out report"""
+    outcome = await run_fanout(
+        candidates,
+        task,
+        model_options(options),
+        strategy=options.get("fanout", FIRST),
+        scorer=get_scorer(options.get("scorer")),
+        timeout=options.get("fanout_timeout"),
+        profile=profile
+    )
+    report = outcome["fanout"]
+    for result in outcome["results"]:
+        yield dict(result, model=report["winner"])
+    yield {
+        "type": "fanout",
+        "content": f"Selected {report['winner']} ({report['strategy']})",
+        "model": report["winner"],
+        "fanout": report
+    }
+
+async def cached_events(user_id: str, model: str, task: str, options: Dict[str, Any], run):
+    """Serve a task from the result cache according to ``options["cache"]``.
+
+    ``bypass`` (the default) always runs, ``prefer`` replays a cached run when
+    there is one and stores fresh runs, and ``only`` never runs the agent.
+    ``run`` is only called on a miss.
+    """
+    mode = result_cache.mode(options)
+    if mode != BYPASS:
+        # Similarity search scans the index, so keep it off the event loop
+        if result_cache.embedder is not None:
+            cached = await asyncio.to_thread(result_cache.get, user_id, model, task)
+        else:
+            cached = result_cache.get(user_id, model, task)
+        if cached is not None:
+            for result in cached:
+                yield dict(result, cached=True)
+            return
+        if mode == ONLY:
+            raise LookupError("No cached result for this task")
+    
+    results = []
+    async for result in run():
+        if result["type"] != "delta":
+            results.append(result)
+        yield result
+    
+    if mode != BYPASS and not any(r["type"] == "error" for r in results):
+        result_cache.set(user_id, model, task, results, ttl=options.get("cache_ttl"))
+
+@router.post("/execute", status_code=status.HTTP_202_ACCEPTED)
 async def execute_task(task_data: TaskRequest, token: str = Depends(oauth2_scheme)):
     # Get the user from the token
-    user = await supabase_service.get_user_by_token(token)
+    with tracing.span("auth.get_user_by_token"):
+        user = await services.supabase_service.get_user_by_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,39 +166,285 @@ async def execute_task(task_data: TaskRequest, token: str = Depends(oauth2_schem
             detail=f"Unsupported model: {task_data.model}"
         )
     
-    # Check if user has required API key
-    has_key = await supabase_service.check_user_api_key(user["id"], provider)
-    if not has_key:
+    # Get the user's API key, served from the settings cache after the first fetch
+    with tracing.span("settings.get_user_api_key", **{"agent.provider": provider}):
+        encrypted_key = await services.supabase_service.get_user_api_key(user["id"], provider, token)
+    if not encrypted_key:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"{provider.capitalize()} API key required",
             headers={"X-Error-Code": "missing_api_key", "X-Provider": provider}
         )
     
-    # Get and decrypt API key
-    encrypted_key = await supabase_service.get_user_api_key(user["id"], provider)
-    api_key = encryption_service.decrypt(encrypted_key)
+    # Several models in options (or auto_select in preferences) fan the task out
+    options = task_data.options or {}
+    try:
+        result_cache.mode(options)
+        PageProfile.from_options(options)
+        with tracing.span("agent.fanout_candidates"):
+            candidates = await get_fanout_candidates(user["id"], task_data.model, options, token)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    # Reuse the pooled service and LLM client for this user, provider and model
+    with tracing.span("agent.get_client", **{"agent.provider": provider, "agent.model": task_data.model}):
+        service, llm = get_service_and_llm(user["id"], provider, encrypted_key, task_data.model, model_options(options))
     
-    # Execute task with appropriate service
-    service = None
-    if provider == "openai":
-        service = OpenAIService(api_key)
-    elif provider == "anthropic":
-        service = AnthropicService(api_key)
-    elif provider == "azure-openai":
-        service = AzureOpenAIService(api_key)
-    elif provider == "gemini":
-        service = GeminiService(api_key)
-    elif provider == "deepseek":
-        service = DeepSeekService(api_key)
+    # Job workers run outside this request, so the job's span is parented explicitly
+    request_context = tracing.current_context()
     
-    results = await service.execute_task(task_data.model, task_data.task, task_data.options)
+    async def run_job():
+        results = []
+        actions = []
+        model = task_data.model
+        
+        def run():
+            profile = browser_profile(user["id"], options)
+            if candidates:
+                return stream_fanout(candidates, task_data.task, options, profile=profile)
+            return service.stream_task(task_data.model, task_data.task, model_options(options), llm=llm, profile=profile)
+        
+        # Anything that ends the run without finishing or failing is a cancel (DELETE, shutdown)
+        run_status = "cancelled"
+        try:
+            with tracing.span("agent.job", context=request_context, **{"agent.model": task_data.model}):
+                async for result in cached_events(user["id"], task_data.model, task_data.task, options, run):
+                    model = result.get("model", model)
+                    results.append(result)
+                    if result.get("action_data"):
+                        actions.append(result["action_data"])
+                    yield result
+            run_status = "completed"
+        except Exception:
+            run_status = "failed"
+            raise
+        finally:
+            # Queue the interaction log; it is written to the database in the background
+            services.interaction_logger.log(
+                user_id=user["id"],
+                model=model,
+                task=task_data.task,
+                status=run_status,
+                actions=actions,
+                results=results,
+                token=token
+            )
     
-    return results
+    # Hand the run to the job workers and return straight away
+    try:
+        with tracing.span("job.submit"):
+            job = await services.job_manager.submit(user["id"], task_data.model, task_data.task, task_data.options, run_job)
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many queued tasks, try again later"
+        )
+    
+    response = {"job_id": job["id"], "status": job["status"]}
+    trace_id = tracing.current_trace_id()
+    if trace_id is not None:
+        response["trace_id"] = trace_id
+    return response
+
+async def get_user_job(job_id: str, token: str, wait: float = 0.0, after: int = 0) -> Dict[str, Any]:
+    user = await services.supabase_service.get_user_by_token(token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    
+    job = await services.job_manager.get(job_id, wait=wait, after=after)
+    if not job or job["user_id"] != user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to long-poll for new results"),
+    after: int = Query(0, ge=0, description="Only return results after this index"),
+    token: str = Depends(oauth2_scheme)
+):
+    job = await get_user_job(job_id, token, wait=wait, after=after)
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "model": job["model"],
+        "task": job["task"],
+        "results": job["results"][after:],
+        "result_count": len(job["results"]),
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    }
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, token: str = Depends(oauth2_scheme)):
+    job = await get_user_job(job_id, token)
+    
+    cancelled = await services.job_manager.cancel(job["id"])
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job already {job['status']}"
+        )
+    return {"job_id": job["id"], "status": "cancelling"}
+
+def task_status(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "model": session["model"],
+        "status": session["status"],
+        "steps": session["steps"],
+        "running_seconds": round(time.time() - session["started_at"], 1)
+    }
+
+async def run_ws_task(sender: WebSocketSender, user: Dict[str, Any], token: str, task_id: str, data: Dict[str, Any], session: Dict[str, Any]):
+    """Run one WebSocket task in a trace of its own, linked to the connection's trace"""
+    activity.attribute(task_id=task_id)
+    with tracing.span(
+        "ws.task",
+        context=tracing.empty_context(),
+        links=tracing.link_to_current(),
+        **{"task.id": task_id, "agent.model": data["model"]}
+    ):
+        await _run_ws_task(sender, user, token, task_id, data, session)
+
+async def _run_ws_task(sender: WebSocketSender, user: Dict[str, Any], token: str, task_id: str, data: Dict[str, Any], session: Dict[str, Any]):
+    """Run one WebSocket task, tagging every event it sends with its task id.
+
+    Runs as a task of its own, so nothing is raised out of it: every outcome
+    ends with an ``error`` or ``done`` frame, and every run that started is logged.
+    """
+    async def send(event: Dict[str, Any]):
+        await sender.send(dict(event, task_id=task_id))
+    
+    results = []
+    actions = []
+    model = data["model"]
+    options = data.get("options") or {}
+    
+    try:
+        # Determine provider based on model
+        provider = get_provider_from_model(data["model"])
+        
+        if provider == "unknown":
+            await send({
+                "type": "error",
+                "content": f"Unsupported model: {data['model']}"
+            })
+            return
+        
+        # Get the user's API key, served from the settings cache after the first fetch
+        with tracing.span("settings.get_user_api_key", **{"agent.provider": provider}):
+            encrypted_key = await services.supabase_service.get_user_api_key(user["id"], provider, token)
+        
+        if not encrypted_key:
+            await send({
+                "type": "error",
+                "content": f"{provider.capitalize()} API key required",
+                "require_action": "api_key_input",
+                "provider": provider
+            })
+            return
+        
+        # Several models in options (or auto_select in preferences) fan the task out
+        try:
+            result_cache.mode(options)
+            PageProfile.from_options(options)
+            with tracing.span("agent.fanout_candidates"):
+                candidates = await get_fanout_candidates(user["id"], data["model"], options, token)
+        except ValueError as e:
+            await send({
+                "type": "error",
+                "content": str(e)
+            })
+            return
+        
+        # Reuse the pooled service and LLM client for this user, provider and model
+        with tracing.span("agent.get_client", **{"agent.provider": provider, "agent.model": data["model"]}):
+            service, llm = get_service_and_llm(user["id"], provider, encrypted_key, data["model"], model_options(options))
+        
+        # Send thinking status
+        models = ", ".join(candidate[0] for candidate in candidates) or data["model"]
+        await send({
+            "type": "thinking",
+            "content": f"Processing your request with {models}..."
+        })
+        
+        def run():
+            profile = browser_profile(user["id"], options)
+            if candidates:
+                return stream_fanout(candidates, data["task"], options, profile=profile)
+            # Token deltas are on unless the client opts out with "stream": false
+            stream_tokens = data.get("stream", True)
+            return service.stream_task(
+                data["model"], data["task"], model_options(options), llm=llm, stream_tokens=stream_tokens, profile=profile
+            )
+        
+        # Stream the response
+        async for result in cached_events(user["id"], data["model"], data["task"], options, run):
+            model = result.get("model", model)
+            await send(result)
+            if result["type"] == "delta":
+                # The step summary that follows carries the full text
+                continue
+            results.append(result)
+            session["steps"] = max(session["steps"], result.get("step_id") or 0)
+            if result.get("action_data"):
+                actions.append(result["action_data"])
+        session["status"] = "completed"
+    except asyncio.CancelledError:
+        session["status"] = "cancelled"
+    except WebSocketDisconnect:
+        # The client is gone; the run is still logged below
+        session["status"] = "cancelled"
+    except Exception as e:
+        print(f"WebSocket task {task_id} error: {str(e)}")
+        ERRORS.labels("agent").inc()
+        session["status"] = "failed"
+        try:
+            await send({
+                "type": "error",
+                "content": str(e)
+            })
+        except WebSocketDisconnect:
+            pass
+    
+    # Queue the interaction log; it is written to the database in the background
+    services.interaction_logger.log(
+        user_id=user["id"],
+        model=model,
+        task=data["task"],
+        status=session["status"],
+        actions=actions,
+        results=results,
+        token=token
+    )
+    
+    try:
+        await send({
+            "type": "done",
+            "status": session["status"]
+        })
+    except WebSocketDisconnect:
+        pass
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    connection_id = None
+    running: Dict[str, Dict[str, Any]] = {}
+    
+    # Outbound frames go through a bounded queue so a slow client can't stall the agent
+    sender = WebSocketSender(websocket)
+    sender.start()
+    WEBSOCKET_CONNECTIONS.inc()
     
     try:
         # First message should be authentication token
@@ -103,105 +452,114 @@ async def websocket_endpoint(websocket: WebSocket):
         auth_data = json.loads(auth_msg)
         
         if "token" not in auth_data:
-            await websocket.send_json({
+            await sender.send({
                 "type": "error",
                 "content": "Authentication required"
             })
+            await sender.close()
             await websocket.close()
             return
         
         # Verify token and get user
-        user = await supabase_service.get_user_by_token(auth_data["token"])
+        with tracing.span("auth.get_user_by_token"):
+            user = await services.supabase_service.get_user_by_token(auth_data["token"])
         if not user:
-            await websocket.send_json({
+            await sender.send({
                 "type": "error",
                 "content": "Invalid authentication"
             })
+            await sender.close()
             await websocket.close()
             return
         
+        # Track the connection so every worker can see it
+        connection_id = await services.connection_registry.register(user["id"])
+        
         # Send authentication success
-        await websocket.send_json({
+        await sender.send({
             "type": "system",
             "content": "Authentication successful"
         })
         
-        # Process messages
+        # Process messages; each task runs on its own so several can share the socket
         async for message in websocket.iter_text():
             data = json.loads(message)
+            message_type = data.get("type", "task")
+            
+            if message_type == "cancel":
+                session = running.get(data.get("task_id"))
+                if session is None:
+                    await sender.send({
+                        "type": "error",
+                        "task_id": data.get("task_id"),
+                        "content": "No running task with that id"
+                    })
+                    continue
+                session["task"].cancel()
+                continue
+            
+            if message_type == "status":
+                await sender.send({
+                    "type": "status",
+                    "tasks": {
+                        task_id: task_status(session) for task_id, session in running.items()
+                        if data.get("task_id") in (None, task_id)
+                    }
+                })
+                continue
             
             if "task" not in data or "model" not in data:
-                await websocket.send_json({
+                await sender.send({
                     "type": "error",
                     "content": "Invalid request format"
                 })
                 continue
             
-            # Determine provider based on model
-            provider = get_provider_from_model(data["model"])
-            
-            if provider == "unknown":
-                await websocket.send_json({
+            task_id = str(data.get("task_id") or uuid.uuid4())
+            if task_id in running:
+                await sender.send({
                     "type": "error",
-                    "content": f"Unsupported model: {data['model']}"
+                    "task_id": task_id,
+                    "content": "A task with this id is already running"
                 })
                 continue
             
-            # Check if user has required API key
-            has_key = await supabase_service.check_user_api_key(user["id"], provider)
-            
-            if not has_key:
-                await websocket.send_json({
+            if len(running) >= WS_MAX_CONCURRENT_TASKS:
+                await sender.send({
                     "type": "error",
-                    "content": f"{provider.capitalize()} API key required",
-                    "require_action": "api_key_input",
-                    "provider": provider
+                    "task_id": task_id,
+                    "content": f"Too many running tasks (limit {WS_MAX_CONCURRENT_TASKS}); wait for one to finish or cancel it"
                 })
                 continue
             
-            # Get and decrypt API key
-            encrypted_key = await supabase_service.get_user_api_key(user["id"], provider)
-            api_key = encryption_service.decrypt(encrypted_key)
-            
-            # Send thinking status
-            await websocket.send_json({
-                "type": "thinking",
-                "content": f"Processing your request with {data['model']}..."
-            })
-            
-            # Initialize appropriate service
-            service = None
-            if provider == "openai":
-                service = OpenAIService(api_key)
-            elif provider == "anthropic":
-                service = AnthropicService(api_key)
-            elif provider == "azure-openai":
-                service = AzureOpenAIService(api_key)
-            elif provider == "gemini":
-                service = GeminiService(api_key)
-            elif provider == "deepseek":
-                service = DeepSeekService(api_key)
-            
-            # Stream the response
-            async for result in service.stream_task(data["model"], data["task"], data.get("options", {})):
-                await websocket.send_json(result)
-            
-            # Log the interaction to the database
-            await supabase_service.log_interaction(
-                user_id=user["id"],
-                model=data["model"],
-                task=data["task"],
-                status="completed"
-            )
+            session = {
+                "model": data["model"],
+                "status": "running",
+                "steps": 0,
+                "started_at": time.time()
+            }
+            session["task"] = asyncio.create_task(run_ws_task(sender, user, auth_data["token"], task_id, data, session))
+            session["task"].add_done_callback(lambda _, task_id=task_id: running.pop(task_id, None))
+            running[task_id] = session
                 
     except WebSocketDisconnect:
         print(f"WebSocket disconnected")
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+        ERRORS.labels("websocket").inc()
         try:
-            await websocket.send_json({
+            await sender.send({
                 "type": "error",
                 "content": str(e)
             })
         except:
-            pass 
\ No newline at end of file
+            pass
+    finally:
+        # Tasks die with their connection
+        for session in list(running.values()):
+            session["task"].cancel()
+        await asyncio.gather(*(session["task"] for session in list(running.values())), return_exceptions=True)
+        await sender.close()
+        WEBSOCKET_CONNECTIONS.dec()
+        if connection_id is not None:
+            await services.connection_registry.unregister(connection_id)
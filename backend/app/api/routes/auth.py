@@ -2,15 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import Optional, Dict
-from app.services.supabase_service import SupabaseService
-from app.services.encryption_service import EncryptionService
+from app.services.container import services
+from app.services.llm_client_registry import llm_client_registry
 from app.models.user import User, ApiKeyUpdate
 import os
 from dotenv import load_dotenv, set_key
 
 router = APIRouter()
-supabase_service = SupabaseService()
-encryption_service = EncryptionService()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
 class Token(BaseModel):
@@ -24,7 +22,7 @@ class LoginResponse(BaseModel):
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await supabase_service.authenticate_user(form_data.username, form_data.password)
+    user = await services.supabase_service.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,7 +38,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 @router.post("/signup")
 async def signup(user: User):
-    result = await supabase_service.create_user(user.email, user.password)
+    result = await services.supabase_service.create_user(user.email, user.password)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -50,7 +48,7 @@ async def signup(user: User):
 
 @router.get("/me")
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = await supabase_service.get_user_by_token(token)
+    user = await services.supabase_service.get_user_by_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,7 +62,7 @@ async def update_api_key(
     api_key_data: ApiKeyUpdate,
     token: str = Depends(oauth2_scheme)
 ):
-    user = await supabase_service.get_user_by_token(token)
+    user = await services.supabase_service.get_user_by_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -72,13 +70,14 @@ async def update_api_key(
         )
     
     # Encrypt the API key before storing
-    encrypted_key = encryption_service.encrypt(api_key_data.api_key)
+    encrypted_key = services.encryption_service.encrypt(api_key_data.api_key)
     
     # Update the user's API key in the database
-    success = await supabase_service.update_user_api_key(
+    success = await services.supabase_service.update_user_api_key(
         user["id"], 
         api_key_data.provider, 
-        encrypted_key
+        encrypted_key,
+        token
     )
     
     if not success:
@@ -87,6 +86,9 @@ async def update_api_key(
             detail="Failed to update API key"
         )
     
+    # Drop the decrypted key and pooled clients built from the old one
+    llm_client_registry.invalidate(user["id"], api_key_data.provider)
+    
     # For development, also update the .env file
     # In production, this would be handled differently
     env_path = os.path.join(os.getcwd(), '.env')
@@ -111,13 +113,13 @@ async def check_api_key(
     provider: str,
     token: str = Depends(oauth2_scheme)
 ):
-    user = await supabase_service.get_user_by_token(token)
+    user = await services.supabase_service.get_user_by_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
     
-    has_key = await supabase_service.check_user_api_key(user["id"], provider)
+    has_key = await services.supabase_service.check_user_api_key(user["id"], provider, token)
     
     return {"has_key": has_key} 
\ No newline at end of file
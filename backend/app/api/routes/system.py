@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+from typing import Dict, Any
+from app.services.agent_runner import agent_runner
+from app.services.browser_pool import browser_pool
+from app.services.browser_profiles import browser_profiles
+from app.services.page_profile import page_load_metrics
+from app.services.llm_client_registry import llm_client_registry
+from app.services.rate_limiter import rate_limiter
+from app.services.ws_sender import ws_send_metrics
+from app.services.result_cache import result_cache
+from app.services.llm_memo import llm_memo
+from app.services.container import services
+from app.api.routes.admin import require_admin
+from app.utils.loop_monitor import loop_monitor
+from app.utils.profiler import profiler
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats(user: Dict[str, Any] = Depends(require_admin)) -> Dict[str, Any]:
+    """Return runtime metrics for the agent execution subsystems (admins only)"""
+    return {
+        "agent_runner": agent_runner.metrics(),
+        "browser_pool": browser_pool.metrics(),
+        "browser_profiles": browser_profiles.metrics(),
+        "page_loads": page_load_metrics.metrics(),
+        "llm_clients": llm_client_registry.metrics(),
+        "interaction_logs": services.interaction_logger.metrics(),
+        "jobs": services.job_manager.metrics(),
+        "rate_limits": rate_limiter.metrics(),
+        "connections": await services.connection_registry.metrics(),
+        "websocket": ws_send_metrics.metrics(),
+        "result_cache": result_cache.metrics(),
+        "llm_memo": llm_memo.metrics(),
+        "event_loop": loop_monitor.metrics(),
+        "profiler": profiler.metrics(),
+        "startup": services.metrics()
+    }
@@ -1,8 +1,31 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import auth, agent
+from app.api.routes import admin, auth, agent, system
+from app.services.container import services
+from app.utils.activity import ActivityMiddleware
+from app.utils.loop_monitor import loop_monitor
+from app.utils.metrics import PrometheusMiddleware, render_metrics
+from app.utils.profiler import profiler
+from app.utils.tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+import os
 
-app = FastAPI(title="Browser Use API", description="API for AI agent browser interactions")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared set of services per worker process
+    setup_tracing()
+    await services.start()
+    await loop_monitor.start()
+    await profiler.start()
+    if os.getenv("STARTUP_PROFILE", "false").lower() == "true":
+        print(f"Startup timings (seconds): {services.metrics()}")
+    yield
+    await profiler.stop()
+    await loop_monitor.stop()
+    await services.stop()
+    shutdown_tracing()
+
+app = FastAPI(title="Browser Use API", description="API for AI agent browser interactions", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -13,14 +36,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route template for /metrics
+app.add_middleware(PrometheusMiddleware)
+
+# A server span per request and WebSocket connection when TRACING_EXPORTER is set
+app.add_middleware(TracingMiddleware)
+
+# Attributes event-loop stalls and profiler samples to their route when LOOP_DIAGNOSTICS or PROFILER_ENABLED is on
+app.add_middleware(ActivityMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(agent.router, prefix="/api/agent", tags=["Agent"])
+app.include_router(system.router, prefix="/api/system", tags=["System"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
     return {"message": "Browser Use API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
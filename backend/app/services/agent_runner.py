@@ -0,0 +1,135 @@
+import os
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from app.utils import activity
+
+# Markers passed from worker threads back to the event loop
+_STEP = "step"
+_DONE = "done"
+_ERROR = "error"
+
+
+class AgentRunner:
+    """Drive browser_use agent steps without blocking the event loop.
+
+    Agents whose ``run`` is an async generator or coroutine are driven natively
+    on the event loop. Synchronous ``run`` implementations are iterated on a
+    bounded worker pool and each step is handed back through an asyncio queue.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, queue_size: Optional[int] = None):
+        """Initialize the runner with a bounded pool of worker threads"""
+        if max_workers is None:
+            max_workers = int(os.getenv("AGENT_WORKER_THREADS", "8"))
+        if queue_size is None:
+            queue_size = int(os.getenv("AGENT_STEP_QUEUE_SIZE", "16"))
+
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="agent-step"
+        )
+        self._active_runs = 0
+        self._threaded_runs = 0
+
+    async def iterate(self, agent: Any) -> AsyncGenerator[Any, None]:
+        """Yield the steps produced by ``agent.run()`` as they happen"""
+        run = agent.run
+        self._active_runs += 1
+        try:
+            if inspect.isasyncgenfunction(run):
+                # Native async iterator, nothing to offload
+                async for step in run():
+                    yield step
+            elif inspect.iscoroutinefunction(run):
+                # The library runs the whole session as a coroutine and returns its history
+                history = await run()
+                for step in self._history_steps(history):
+                    yield step
+            else:
+                async for step in self._iterate_in_worker(run):
+                    yield step
+        finally:
+            self._active_runs -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return a snapshot of the runner state"""
+        return {
+            "max_workers": self.max_workers,
+            "active_runs": self._active_runs,
+            "threaded_runs": self._threaded_runs,
+        }
+
+    def shutdown(self) -> None:
+        """Stop accepting new work and release the worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _history_steps(history: Any):
+        if history is None:
+            return []
+        # AgentHistoryList keeps its steps on ``.history``
+        return getattr(history, "history", history)
+
+    async def _iterate_in_worker(self, run: Any) -> AsyncGenerator[Any, None]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        # Lets diagnostics attribute the worker thread to the task it runs for
+        current = activity.current_activity.get()
+
+        def put(kind: str, payload: Any) -> bool:
+            # Block the worker while the queue is full so a slow consumer
+            # applies backpressure to the agent instead of buffering steps
+            while True:
+                try:
+                    future = asyncio.run_coroutine_threadsafe(queue.put((kind, payload)), loop)
+                except RuntimeError:
+                    # Event loop is gone
+                    return False
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except FutureTimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
+
+        def produce() -> None:
+            steps = None
+            with activity.in_thread(current):
+                try:
+                    steps = run()
+                    for step in self._history_steps(steps):
+                        if stop.is_set() or not put(_STEP, step):
+                            break
+                    else:
+                        put(_DONE, None)
+                except BaseException as e:
+                    put(_ERROR, e)
+                finally:
+                    close = getattr(steps, "close", None)
+                    if stop.is_set() and callable(close):
+                        close()
+
+        self._threaded_runs += 1
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                kind, payload = await queue.get()
+                if kind == _DONE:
+                    break
+                if kind == _ERROR:
+                    raise payload
+                yield payload
+        finally:
+            stop.set()
+            self._threaded_runs -= 1
+
+
+agent_runner = AgentRunner()
@@ -1,23 +1,15 @@
-import os
-import asyncio
-from typing import Dict, Any, List, AsyncGenerator
+from typing import Dict, Any
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_anthropic import ChatAnthropic
-from browser_use import Agent
-import json
+from app.services.base_provider_service import BaseProviderService
+from pydantic import SecretStr
 
-class AnthropicService:
-    def __init__(self, api_key: str):
-        """Initialize the Anthropic service with an API key"""
-        self.api_key = api_key
-        os.environ["ANTHROPIC_API_KEY"] = api_key
+class AnthropicService(BaseProviderService):
+    provider = "anthropic"
+    display_name = "Anthropic"
     
-    async def execute_task(
-        self, 
-        model: str, 
-        task: str, 
-        options: Dict[str, Any] = None
-    ) -> Dict[str, Any]:
-        """Execute a task using the Anthropic model and return results"""
+    def build_llm(self, model: str, options: Dict[str, Any] = None) -> BaseChatModel:
+        """Build a chat model client for the model and task options"""
         if options is None:
             options = {}
         
@@ -27,95 +19,10 @@ class AnthropicService:
         # Initialize the model
         llm = ChatAnthropic(
             model_name=model,
+            api_key=SecretStr(self.api_key),
             temperature=temperature,
             timeout=timeout,
+            callbacks=self.llm_callbacks(),
         )
         
-        # Create agent with the model
-        agent = Agent(
-            task=task,
-            llm=llm
-        )
-        
-        results = []
-        actions = []
-        
-        # Execute agent actions and collect results
-        for step in agent.run():
-            # Process step results
-            results.append({
-                "content": step.response,
-                "type": "response"
-            })
-            
-            # Process actions
-            if step.action:
-                action_data = {
-                    "type": step.action.type,
-                    "description": step.action.description,
-                    "result": step.action.result,
-                    "timestamp": step.action.timestamp.isoformat() if step.action.timestamp else None
-                }
-                actions.append(action_data)
-                results.append({
-                    "content": f"Action: {step.action.description}",
-                    "type": "action",
-                    "action_data": action_data
-                })
-        
-        return {
-            "results": results,
-            "actions": actions,
-            "task": task,
-            "model": model
-        }
-    
-    async def stream_task(
-        self, 
-        model: str, 
-        task: str, 
-        options: Dict[str, Any] = None
-    ) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream task execution results as they happen"""
-        if options is None:
-            options = {}
-        
-        temperature = options.get("temperature", 0.0)
-        timeout = options.get("timeout", 100)
-        
-        # Initialize the model
-        llm = ChatAnthropic(
-            model_name=model,
-            temperature=temperature,
-            timeout=timeout,
-        )
-        
-        # Create agent with the model
-        agent = Agent(
-            task=task,
-            llm=llm
-        )
-        
-        # Start the execution in a background task
-        for step in agent.run():
-            # Yield the response
-            yield {
-                "type": "response",
-                "content": step.response
-            }
-            
-            # Yield any actions
-            if step.action:
-                action_data = {
-                    "type": step.action.type,
-                    "description": step.action.description,
-                    "result": step.action.result,
-                    "timestamp": step.action.timestamp.isoformat() if step.action.timestamp else None
-                }
-                
-                yield {
-                    "type": "action",
-                    "content": f"Action: {step.action.description}",
-                    "action_type": step.action.type,
-                    "action_data": action_data
-                } 
\ No newline at end of file
+        return llm
@@ -0,0 +1,214 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Any, List, AsyncGenerator, AsyncIterator, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from browser_use import Agent
+from app.services.agent_runner import agent_runner
+from app.services.browser_pool import browser_pool, BrowserLease
+from app.services.browser_profiles import browser_profiles
+from app.services.page_profile import PageProfile, PageLoadStats
+from app.utils.metrics import AGENT_RUNS_IN_FLIGHT
+from app.utils.tracing import enabled as tracing_enabled, span, trace_method
+from app.services.rate_limiter import rate_limiter, key_fingerprint
+from app.services.rate_limit_callback import RateLimitCallbackHandler, permit_gate
+from app.services.metrics_callback import LLMMetricsCallbackHandler
+from app.services.tracing_callback import TracingCallbackHandler
+from app.services.step_serializer import serialize_step, collect_actions
+from app.services.token_stream import TokenStreamHandler, with_token_streaming
+from app.services.llm_memo_cache import with_memoization
+
+class BaseProviderService:
+    """Shared agent execution for every LLM provider.
+
+    Subclasses only say how to build their chat model in ``build_llm`` and,
+    if needed, which extra ``Agent`` arguments they take.
+    """
+    
+    provider = ""
+    display_name = ""
+    
+    def __init__(self, api_key: str):
+        """Initialize the service with an API key"""
+        self.api_key = api_key
+    
+    def build_llm(self, model: str, options: Dict[str, Any] = None) -> BaseChatModel:
+        """Build a chat model client for the model and task options"""
+        raise NotImplementedError
+    
+    def create_llm(self, model: str, options: Dict[str, Any] = None, user_id: Optional[str] = None) -> BaseChatModel:
+        """Build the chat model and memoize its calls unless the task opts out with ``memoize: false``
+
+        Memoized answers are only shared between calls made by the same user
+        with the same provider key; without a ``user_id`` nothing is memoized.
+        Calls that miss the memo take their rate limit permit through
+        ``permit_gate``, which LangChain consults after the cache lookup.
+        """
+        llm = self.build_llm(model, options).model_copy(update={"rate_limiter": permit_gate})
+        if user_id and (options or {}).get("memoize", True):
+            llm = with_memoization(llm, model, (user_id, self.provider, key_fingerprint(self.api_key)))
+        return llm
+    
+    def agent_options(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Extra keyword arguments for the ``Agent`` built for a task"""
+        return {}
+    
+    def llm_callbacks(self) -> List[Any]:
+        """Callbacks attached to every chat model this service builds"""
+        callbacks = [
+            RateLimitCallbackHandler(rate_limiter, self.provider, key_fingerprint(self.api_key)),
+            LLMMetricsCallbackHandler(self.provider)
+        ]
+        if tracing_enabled():
+            callbacks.append(TracingCallbackHandler(self.provider))
+        return callbacks
+    
+    async def execute_task(
+        self, 
+        model: str, 
+        task: str, 
+        options: Dict[str, Any] = None,
+        llm: Optional[BaseChatModel] = None,
+        profile: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Execute a task and return all results once it finishes"""
+        results = []
+        async for event in self.stream_task(model, task, options, llm=llm, profile=profile):
+            results.append(event)
+        
+        return {
+            "results": results,
+            "actions": collect_actions(results),
+            "task": task,
+            "model": model
+        }
+    
+    async def stream_task(
+        self, 
+        model: str, 
+        task: str, 
+        options: Dict[str, Any] = None,
+        llm: Optional[BaseChatModel] = None,
+        stream_tokens: bool = False,
+        profile: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream task execution results as they happen.
+
+        With ``stream_tokens`` the LLM output is also sent as ``delta`` events
+        while each step is generated, ahead of the step's summary events.
+        ``profile`` names the persistent browser profile (usually the user id)
+        the run browses with. The last event reports the run's page loads.
+        """
+        if options is None:
+            options = {}
+        
+        use_vision = self.agent_options(options).get("use_vision", True)
+        page_profile = PageProfile.from_options(options, use_vision=use_vision)
+        
+        # Reuse a pooled client when one is passed in
+        if llm is None:
+            llm = self.create_llm(model, options)
+        
+        with span("agent.run", **{
+            "agent.provider": self.provider,
+            "agent.model": model,
+            "agent.stream_tokens": stream_tokens,
+            "page.profile": page_profile.name
+        }):
+            if not stream_tokens:
+                async with self._lease(profile, page_profile) as lease:
+                    agent = self._create_agent(task, llm, lease, options)
+                    step_id = 0
+                    async for step in agent_runner.iterate(agent):
+                        step_id += 1
+                        for event in serialize_step(step, step_id):
+                            yield event
+                    yield self._page_stats_event(lease.stats)
+                return
+            
+            # Tokens arrive from LLM callbacks while steps arrive from the agent;
+            # both feed one queue so they reach the client in order
+            events: asyncio.Queue = asyncio.Queue()
+            handler = TokenStreamHandler(events.put_nowait)
+            llm = with_token_streaming(llm, handler)
+            done = object()
+            
+            async with self._lease(profile, page_profile) as lease:
+                agent = self._create_agent(
+                    task, llm, lease, options, register_new_step_callback=handler.on_agent_step
+                )
+                
+                async def drive() -> None:
+                    try:
+                        step_id = 0
+                        async for step in agent_runner.iterate(agent):
+                            step_id += 1
+                            for event in serialize_step(step, step_id):
+                                events.put_nowait(event)
+                            handler.step_id = max(handler.step_id, step_id + 1)
+                    finally:
+                        events.put_nowait(done)
+                
+                runner = asyncio.create_task(drive())
+                try:
+                    while True:
+                        event = await events.get()
+                        if event is done:
+                            break
+                        yield event
+                    # Surface any error raised by the agent
+                    await runner
+                    yield self._page_stats_event(lease.stats)
+                finally:
+                    if not runner.done():
+                        runner.cancel()
+                        await asyncio.gather(runner, return_exceptions=True)
+    
+    @asynccontextmanager
+    async def _lease(self, profile: Optional[str], page_profile: Optional[PageProfile] = None) -> AsyncIterator[BrowserLease]:
+        """Lease a pooled context, opening the profile when it is free"""
+        async with AsyncExitStack() as stack:
+            with span("browser.lease", **{"browser.profile": profile is not None}) as current:
+                user_data_dir = await stack.enter_async_context(browser_profiles.checkout(profile))
+                lease = await stack.enter_async_context(
+                    browser_pool.lease(user_data_dir=user_data_dir, page_profile=page_profile)
+                )
+                if current is not None:
+                    current.set_attribute("browser.persistent", user_data_dir is not None)
+            in_flight = AGENT_RUNS_IN_FLIGHT.labels(self.provider)
+            in_flight.inc()
+            try:
+                yield lease
+            finally:
+                in_flight.dec()
+    
+    @staticmethod
+    def _page_stats_event(stats: PageLoadStats) -> Dict[str, Any]:
+        report = stats.to_dict()
+        return {
+            "type": "page_stats",
+            "content": f"Loaded {report['requests']} requests, blocked {report['blocked_total']} ({report['profile']} profile)",
+            "page_stats": report
+        }
+    
+    def _create_agent(
+        self,
+        task: str,
+        llm: BaseChatModel,
+        lease: Any,
+        options: Dict[str, Any],
+        **kwargs: Any
+    ) -> Agent:
+        """Build an agent that browses in a leased pool context"""
+        agent = Agent(
+            task=task,
+            llm=llm,
+            browser=lease.browser,
+            browser_context=lease.context,
+            **self.agent_options(options),
+            **kwargs
+        )
+        # Per-step spans; the first page state also covers starting the browser context
+        trace_method(agent, "step", "agent.step", lambda agent: {"agent.step": agent.state.n_steps})
+        trace_method(agent, "multi_act", "agent.act")
+        trace_method(lease.context, "get_state", "browser.get_state")
+        return agent
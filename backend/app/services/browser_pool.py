@@ -0,0 +1,332 @@
+import os
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+import psutil
+
+from app.utils.metrics import BROWSER_LAUNCH_SECONDS
+from app.utils.tracing import span
+
+if TYPE_CHECKING:
+    # browser_use (and Playwright) is imported on first launch, not at app import
+    from browser_use import Browser
+    from browser_use.browser.context import BrowserContextConfig
+    from app.services.pooled_context import PooledBrowserContext
+    from app.services.page_profile import PageProfile, PageLoadStats
+
+
+class BrowserLease:
+    """A browser context handed out by the pool for the duration of one task"""
+
+    def __init__(self, browser: "Browser", context: "PooledBrowserContext", slot_index: int):
+        self.browser = browser
+        self.context = context
+        self.slot_index = slot_index
+
+    @property
+    def stats(self) -> "PageLoadStats":
+        return self.context.stats
+
+
+class _BrowserSlot:
+    """One warm Chromium instance and its usage counters"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser: Optional["Browser"] = None
+        self.driver_pid: Optional[int] = None
+        self.active = 0
+        self.uses = 0
+        self.launched_at = 0.0
+        self.launch_seconds = 0.0
+        self.retiring = False
+        # A close and (re)launch is in flight; set under the pool's condition
+        self.recycling = False
+        self.launch_failures = 0
+        self.retry_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.browser is not None and not self.retiring and not self.recycling
+
+
+class BrowserPool:
+    """Keep warm Chromium instances and lease isolated contexts from them.
+
+    Every lease gets a fresh ``BrowserContext`` so tasks never share cookies or
+    storage, unless the caller passes a persistent profile directory. A browser is recycled once it has served ``max_uses`` contexts or
+    its process tree grows past ``max_memory_mb``.
+
+    A browser that fails to launch is retried with exponential backoff
+    from ``launch_backoff`` seconds. After ``max_launch_failures`` failures
+    in a row its slot stays empty, and once every slot has failed leases
+    raise instead of waiting.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_contexts_per_browser: Optional[int] = None,
+        max_uses: Optional[int] = None,
+        max_memory_mb: Optional[int] = None,
+        headless: Optional[bool] = None,
+        launch_backoff: Optional[float] = None,
+        max_launch_failures: Optional[int] = None,
+    ):
+        """Initialize the pool from arguments or environment variables"""
+        self.size = size if size is not None else int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        self.max_contexts_per_browser = (
+            max_contexts_per_browser
+            if max_contexts_per_browser is not None
+            else int(os.getenv("BROWSER_POOL_MAX_CONTEXTS", "4"))
+        )
+        self.max_uses = max_uses if max_uses is not None else int(os.getenv("BROWSER_POOL_MAX_USES", "50"))
+        self.max_memory_mb = (
+            max_memory_mb if max_memory_mb is not None else int(os.getenv("BROWSER_POOL_MAX_MEMORY_MB", "1024"))
+        )
+        if headless is None:
+            headless = os.getenv("BROWSER_HEADLESS", "true").lower() != "false"
+        self.headless = headless
+        self.launch_backoff = (
+            launch_backoff if launch_backoff is not None else float(os.getenv("BROWSER_POOL_LAUNCH_BACKOFF", "1"))
+        )
+        self.max_launch_failures = (
+            max_launch_failures
+            if max_launch_failures is not None
+            else int(os.getenv("BROWSER_POOL_MAX_LAUNCH_FAILURES", "5"))
+        )
+
+        self._slots: List[_BrowserSlot] = [_BrowserSlot(i) for i in range(self.size)]
+        self._condition = asyncio.Condition()
+        self._launch_lock = asyncio.Lock()
+        self._started = False
+
+        self._leases_total = 0
+        self._recycles_total = 0
+        self._launch_failures_total = 0
+        self._waiting = 0
+        self._wait_seconds_total = 0.0
+
+    async def start(self) -> None:
+        """Launch every browser in the pool so the first tasks start warm"""
+        async with self._condition:
+            if self._started:
+                return
+            self._started = True
+            # Claimed under the condition so a concurrent lease never launches them a second time
+            slots = [slot for slot in self._slots if slot.browser is None and not slot.recycling]
+            for slot in slots:
+                slot.launch_failures = 0
+                slot.recycling = True
+        for slot in slots:
+            await self._recycle(slot)
+
+    async def close(self) -> None:
+        """Close every browser in the pool"""
+        for slot in self._slots:
+            await self._close_browser(slot)
+        self._started = False
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        config: Optional["BrowserContextConfig"] = None,
+        user_data_dir: Optional[str] = None,
+        page_profile: Optional["PageProfile"] = None,
+    ) -> AsyncIterator[BrowserLease]:
+        """Lease a browser context, returning it to the pool on exit.
+
+        With ``user_data_dir`` the context opens that Chromium profile;
+        otherwise it is isolated and discarded afterwards. ``page_profile``
+        sets what the context loads and its viewport.
+        """
+        from browser_use.browser.context import BrowserContextConfig
+        from app.services.pooled_context import PooledBrowserContext
+        from app.services.page_profile import page_load_metrics
+
+        if not self._started:
+            await self.start()
+
+        if config is None and page_profile is not None and page_profile.viewport:
+            config = BrowserContextConfig(browser_window_size=dict(page_profile.viewport))
+
+        slot = await self._acquire_slot()
+        context = PooledBrowserContext(slot.browser, config, user_data_dir=user_data_dir, page_profile=page_profile)
+        try:
+            yield BrowserLease(slot.browser, context, slot.index)
+        finally:
+            try:
+                await context.close()
+            except Exception as e:
+                print(f"Error closing browser context: {str(e)}")
+            page_load_metrics.record(context.stats)
+            await self._release_slot(slot)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return pool counters and per-browser usage"""
+        browsers = []
+        for slot in self._slots:
+            browsers.append({
+                "index": slot.index,
+                "running": slot.browser is not None,
+                "active_contexts": slot.active,
+                "uses": slot.uses,
+                "memory_mb": round(self._memory_mb(slot), 1),
+                "age_seconds": round(time.monotonic() - slot.launched_at, 1) if slot.browser else 0.0,
+                "launch_seconds": round(slot.launch_seconds, 3),
+                "launch_failures": slot.launch_failures,
+                "failed": self._failed(slot),
+            })
+
+        return {
+            "size": self.size,
+            "max_contexts_per_browser": self.max_contexts_per_browser,
+            "active_contexts": sum(slot.active for slot in self._slots),
+            "waiting": self._waiting,
+            "leases_total": self._leases_total,
+            "recycles_total": self._recycles_total,
+            "launch_failures_total": self._launch_failures_total,
+            "failed_browsers": sum(1 for slot in self._slots if self._failed(slot)),
+            "wait_seconds_total": round(self._wait_seconds_total, 3),
+            "browsers": browsers,
+        }
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        started = time.monotonic()
+        async with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    slot = self._pick_slot()
+                    if slot is not None:
+                        break
+                    if all(self._failed(candidate) for candidate in self._slots):
+                        raise RuntimeError("No pooled browser could be launched")
+                    # Wake up for the next launch retry even if nothing is released
+                    retries = [
+                        candidate.retry_at for candidate in self._slots
+                        if candidate.browser is None and not candidate.recycling and not self._failed(candidate)
+                    ]
+                    timeout = max(0.0, min(retries) - time.monotonic()) if retries else None
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting -= 1
+
+            slot.active += 1
+            slot.uses += 1
+            self._leases_total += 1
+            self._wait_seconds_total += time.monotonic() - started
+            return slot
+
+    def _pick_slot(self) -> Optional[_BrowserSlot]:
+        candidates = [
+            slot for slot in self._slots
+            if slot.ready and slot.active < self.max_contexts_per_browser
+        ]
+        if not candidates:
+            # Relaunch browsers that failed to start once their backoff is over, so waiters are not stuck forever
+            now = time.monotonic()
+            for slot in self._slots:
+                if slot.browser is None and not slot.recycling and not self._failed(slot) and now >= slot.retry_at:
+                    self._schedule_recycle(slot)
+            return None
+        return min(candidates, key=lambda slot: slot.active)
+
+    async def _release_slot(self, slot: _BrowserSlot) -> None:
+        async with self._condition:
+            slot.active -= 1
+            if slot.uses >= self.max_uses or self._memory_mb(slot) > self.max_memory_mb:
+                slot.retiring = True
+            if slot.retiring and slot.active == 0:
+                self._schedule_recycle(slot)
+            self._condition.notify_all()
+
+    def _failed(self, slot: _BrowserSlot) -> bool:
+        return slot.browser is None and slot.launch_failures >= self.max_launch_failures
+
+    def _schedule_recycle(self, slot: _BrowserSlot) -> None:
+        # Callers hold the condition, so only one recycle per slot is ever in flight
+        slot.recycling = True
+        asyncio.create_task(self._recycle(slot))
+
+    async def _recycle(self, slot: _BrowserSlot) -> None:
+        if slot.browser is not None:
+            self._recycles_total += 1
+        await self._close_browser(slot)
+        await self._launch(slot)
+        async with self._condition:
+            slot.recycling = False
+            self._condition.notify_all()
+
+    async def _launch(self, slot: _BrowserSlot) -> None:
+        # Launch one browser at a time so the new driver process can be told apart
+        from browser_use import Browser, BrowserConfig
+
+        async with self._launch_lock:
+            started = time.monotonic()
+            before = self._child_pids()
+            browser = Browser(config=BrowserConfig(headless=self.headless))
+            try:
+                with span("browser.launch", **{"browser.slot": slot.index}):
+                    await browser.get_playwright_browser()
+            except Exception as e:
+                self._launch_failures_total += 1
+                slot.launch_failures += 1
+                slot.retry_at = time.monotonic() + min(60.0, self.launch_backoff * 2 ** (slot.launch_failures - 1))
+                print(f"Error launching pooled browser (attempt {slot.launch_failures}): {str(e)}")
+                return
+
+            new_pids = self._child_pids() - before
+            slot.browser = browser
+            slot.driver_pid = min(new_pids) if new_pids else None
+            slot.active = 0
+            slot.uses = 0
+            slot.retiring = False
+            slot.launch_failures = 0
+            slot.launched_at = time.monotonic()
+            slot.launch_seconds = slot.launched_at - started
+            BROWSER_LAUNCH_SECONDS.observe(slot.launch_seconds)
+
+    async def _close_browser(self, slot: _BrowserSlot) -> None:
+        browser = slot.browser
+        slot.browser = None
+        slot.driver_pid = None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f"Error closing pooled browser: {str(e)}")
+
+    @staticmethod
+    def _child_pids() -> set:
+        try:
+            return {child.pid for child in psutil.Process().children()}
+        except psutil.Error:
+            return set()
+
+    @staticmethod
+    def _memory_mb(slot: _BrowserSlot) -> float:
+        """Resident memory of the browser's driver process and everything it spawned"""
+        if slot.driver_pid is None:
+            return 0.0
+        try:
+            root = psutil.Process(slot.driver_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0.0
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,216 @@
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locks on Windows; profiles are still locked within a worker
+    fcntl = None
+
+# Chromium profile directories that only hold caches; trimmed first when a profile is too big
+CACHE_DIRS = ("Cache", "Code Cache", "GPUCache", "Service Worker/CacheStorage", "Service Worker/ScriptCache")
+
+
+class _ProfileLock:
+    """Exclusive lock on one profile, held by a single run across every worker"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        self._file = open(self.path, "a")
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self) -> None:
+        if self._file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class BrowserProfileStore:
+    """Persistent per-user Chromium profiles (cookies, localStorage, HTTP cache).
+
+    Each user gets a directory under ``root`` that runs open as a persistent
+    context, so logins, consent banners and cached assets survive between
+    tasks. Only one run uses a profile at a time; a concurrent run of the
+    same user gets a fresh, throwaway context instead of waiting. A profile
+    run opens a persistent context rather than a warm pooled one, so it is
+    off unless ``BROWSER_PROFILES=true`` and the task asks for it. Profiles
+    over ``max_profile_mb`` lose their HTTP cache, and once every profile
+    together passes ``quota_mb`` the least recently used ones are deleted.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        quota_mb: Optional[int] = None,
+        max_profile_mb: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        """Initialize the store from arguments or environment variables"""
+        self.root = root or os.getenv("BROWSER_PROFILE_DIR", "/tmp/browser-data")
+        self.quota_mb = quota_mb if quota_mb is not None else int(os.getenv("BROWSER_PROFILE_QUOTA_MB", "2048"))
+        self.max_profile_mb = (
+            max_profile_mb if max_profile_mb is not None else int(os.getenv("BROWSER_PROFILE_MAX_MB", "256"))
+        )
+        self.enabled = enabled if enabled is not None else os.getenv("BROWSER_PROFILES", "false").lower() == "true"
+        self.scan_interval = float(os.getenv("BROWSER_PROFILE_SCAN_INTERVAL", "600"))
+
+        self._sizes: Dict[str, int] = {}
+        self._scanned_at = 0.0
+        self._in_use: set = set()
+        # Sizing and eviction run in worker threads, one run's at a time
+        self._sizes_lock = threading.Lock()
+
+        self.checkouts_total = 0
+        self.reused_total = 0
+        self.busy_total = 0
+        self.trimmed_total = 0
+        self.evictions_total = 0
+
+    def profile_name(self, user_id: str) -> str:
+        # Hashed so user ids never become paths
+        return hashlib.sha256(user_id.encode()).hexdigest()[:32]
+
+    @asynccontextmanager
+    async def checkout(self, user_id: Optional[str]) -> AsyncIterator[Optional[str]]:
+        """Yield the user's profile directory for one run, or None for a throwaway context"""
+        if not self.enabled or not user_id:
+            yield None
+            return
+
+        name = self.profile_name(user_id)
+        path = os.path.join(self.root, name)
+        lock = _ProfileLock(path + ".lock")
+        acquired = False
+        if name not in self._in_use:
+            self._in_use.add(name)
+            os.makedirs(self.root, exist_ok=True)
+            acquired = await asyncio.to_thread(lock.try_acquire)
+            if not acquired:
+                self._in_use.discard(name)
+        if not acquired:
+            self.busy_total += 1
+            yield None
+            return
+
+        self.checkouts_total += 1
+        if os.path.isdir(path):
+            self.reused_total += 1
+        # The lock file's mtime is the profile's last use, for LRU eviction
+        os.utime(lock.path)
+        try:
+            yield path
+        finally:
+            try:
+                await asyncio.to_thread(self._settle, name, path)
+            except Exception as e:
+                print(f"Error sizing browser profile: {str(e)}")
+            self._in_use.discard(name)
+            lock.release()
+            try:
+                await asyncio.to_thread(self._enforce_quota)
+            except Exception as e:
+                print(f"Error evicting browser profiles: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "root": self.root,
+            "profiles": len(self._sizes),
+            "in_use": len(self._in_use),
+            "size_mb": round(sum(self._sizes.values()) / (1024 * 1024), 1),
+            "quota_mb": self.quota_mb,
+            "checkouts_total": self.checkouts_total,
+            "reused_total": self.reused_total,
+            "busy_total": self.busy_total,
+            "trimmed_total": self.trimmed_total,
+            "evictions_total": self.evictions_total,
+        }
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    continue
+        return total
+
+    def _settle(self, name: str, path: str) -> None:
+        """Record the profile's size after a run, dropping its HTTP cache when over the limit"""
+        with self._sizes_lock:
+            self._settle_locked(name, path)
+
+    def _settle_locked(self, name: str, path: str) -> None:
+        size = self._dir_size(path)
+        if size > self.max_profile_mb * 1024 * 1024:
+            for cache_dir in CACHE_DIRS:
+                shutil.rmtree(os.path.join(path, "Default", cache_dir), ignore_errors=True)
+            self.trimmed_total += 1
+            size = self._dir_size(path)
+        self._sizes[name] = size
+
+    def _scan(self) -> None:
+        """Re-measure every profile, including ones written by other workers"""
+        sizes = {}
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                sizes[entry.name] = self._dir_size(entry.path)
+        self._sizes = sizes
+        self._scanned_at = time.monotonic()
+
+    def _enforce_quota(self) -> None:
+        with self._sizes_lock:
+            self._enforce_quota_locked()
+
+    def _enforce_quota_locked(self) -> None:
+        if time.monotonic() - self._scanned_at > self.scan_interval:
+            self._scan()
+
+        quota = self.quota_mb * 1024 * 1024
+
+        def last_used(name: str) -> float:
+            try:
+                return os.path.getmtime(os.path.join(self.root, name + ".lock"))
+            except OSError:
+                return 0.0
+
+        for name in sorted(self._sizes, key=last_used):
+            if sum(self._sizes.values()) <= quota:
+                break
+            if name in self._in_use:
+                continue
+            path = os.path.join(self.root, name)
+            lock = _ProfileLock(path + ".lock")
+            if not lock.try_acquire():
+                # Another worker is using it
+                continue
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                lock.release()
+            self._sizes.pop(name, None)
+            self.evictions_total += 1
+
+
+browser_profiles = BrowserProfileStore()
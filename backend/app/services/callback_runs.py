@@ -0,0 +1,52 @@
+import asyncio
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+from uuid import UUID
+
+T = TypeVar("T")
+
+
+class RunRegistry(Generic[T]):
+    """Per-run state for LangChain callbacks, handed back if the calling task ends first.
+
+    LangChain reports ``on_llm_end`` / ``on_llm_error`` only for calls that
+    finish; when the task awaiting a call is cancelled (a fan-out loser, a
+    WebSocket ``cancel`` or disconnect, a cancelled job) neither fires. Each
+    entry is tied to the task that started the run, and ``on_abandon`` gets it
+    once that task is done without the run having ended. Handlers using this
+    must be ``run_inline`` so runs are started from the calling task itself.
+    """
+
+    def __init__(self, on_abandon: Callable[[T], None]):
+        self.on_abandon = on_abandon
+        self._runs: Dict[UUID, Tuple[T, Optional[asyncio.Task], Optional[Callable]]] = {}
+
+    def add(self, run_id: UUID, value: T) -> None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+
+        abandon = None
+        if task is not None:
+            def abandon(_: asyncio.Task) -> None:
+                entry = self._runs.pop(run_id, None)
+                if entry is not None:
+                    self.on_abandon(entry[0])
+            task.add_done_callback(abandon)
+        self._runs[run_id] = (value, task, abandon)
+
+    def get(self, run_id: UUID) -> Optional[T]:
+        entry = self._runs.get(run_id)
+        return entry[0] if entry else None
+
+    def pop(self, run_id: UUID) -> Optional[T]:
+        entry = self._runs.pop(run_id, None)
+        if entry is None:
+            return None
+        value, task, abandon = entry
+        if task is not None:
+            task.remove_done_callback(abandon)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._runs)
@@ -0,0 +1,94 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+from typing import Any, Dict, Optional
+
+from app.services.shared_state import SharedState, shared_state
+
+
+class ConnectionRegistry:
+    """Live WebSocket connections across every worker process.
+
+    Each worker records its connections in the shared state with a TTL and
+    refreshes them from a heartbeat task, so a crashed worker's entries
+    expire on their own instead of lingering.
+    """
+
+    def __init__(self, state: Optional[SharedState] = None, ttl: Optional[float] = None):
+        """Initialize the registry from arguments or environment variables"""
+        self.state = state or shared_state
+        self.ttl = ttl if ttl is not None else float(os.getenv("CONNECTION_TTL", "60"))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._connections: Dict[str, Dict[str, Any]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        for connection_id in list(self._connections):
+            await self.unregister(connection_id)
+
+    async def register(self, user_id: str) -> str:
+        """Record a new connection for a user and return its id"""
+        connection_id = str(uuid.uuid4())
+        entry = {
+            "user_id": user_id,
+            "worker": self.worker_id,
+            "connected_at": time.time()
+        }
+        self._connections[connection_id] = entry
+        await self._publish(connection_id, entry)
+        return connection_id
+
+    async def unregister(self, connection_id: str) -> None:
+        self._connections.pop(connection_id, None)
+        try:
+            await self.state.delete(self._key(connection_id))
+        except Exception as e:
+            print(f"Error unregistering connection: {str(e)}")
+
+    async def connections(self, user_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Return live connections on every worker, optionally for one user"""
+        entries = await self.state.scan("connection:")
+        return {
+            key[len("connection:"):]: entry for key, entry in entries.items()
+            if user_id is None or entry.get("user_id") == user_id
+        }
+
+    async def metrics(self) -> Dict[str, Any]:
+        try:
+            total = len(await self.connections())
+        except Exception as e:
+            print(f"Error counting connections: {str(e)}")
+            total = None
+        return {
+            "local": len(self._connections),
+            "total": total
+        }
+
+    @staticmethod
+    def _key(connection_id: str) -> str:
+        return f"connection:{connection_id}"
+
+    async def _publish(self, connection_id: str, entry: Dict[str, Any]) -> None:
+        try:
+            await self.state.set(self._key(connection_id), entry, ttl=self.ttl)
+        except Exception as e:
+            print(f"Error registering connection: {str(e)}")
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            for connection_id, entry in list(self._connections.items()):
+                await self._publish(connection_id, entry)
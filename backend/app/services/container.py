@@ -0,0 +1,105 @@
+import os
+import time
+from typing import Any, Callable, Dict
+
+from app.services.agent_runner import agent_runner
+from app.services.browser_pool import browser_pool
+from app.services.shared_state import shared_state
+
+
+class ServiceContainer:
+    """Process-wide service singletons shared by every router.
+
+    Services are built on first access, so importing the app stays cheap, and
+    the FastAPI lifespan hook calls ``start`` and ``stop`` to build, warm and
+    close them once per worker process.
+    """
+
+    def __init__(self):
+        self._supabase_service = None
+        self._encryption_service = None
+        self._interaction_logger = None
+        self._job_manager = None
+        self._connection_registry = None
+        self.startup_timings: Dict[str, float] = {}
+
+    @property
+    def supabase_service(self) -> Any:
+        if self._supabase_service is None:
+            from app.services.supabase_service import SupabaseService
+            self._supabase_service = SupabaseService()
+        return self._supabase_service
+
+    @property
+    def encryption_service(self) -> Any:
+        if self._encryption_service is None:
+            from app.services.encryption_service import EncryptionService
+            self._encryption_service = EncryptionService()
+        return self._encryption_service
+
+    @property
+    def interaction_logger(self) -> Any:
+        if self._interaction_logger is None:
+            from app.services.interaction_logger import InteractionLogger
+            self._interaction_logger = InteractionLogger(self.supabase_service)
+        return self._interaction_logger
+
+    @property
+    def job_manager(self) -> Any:
+        if self._job_manager is None:
+            from app.services.job_queue import JobManager
+            self._job_manager = JobManager()
+        return self._job_manager
+
+    @property
+    def connection_registry(self) -> Any:
+        if self._connection_registry is None:
+            from app.services.connection_registry import ConnectionRegistry
+            self._connection_registry = ConnectionRegistry()
+        return self._connection_registry
+
+    async def start(self) -> None:
+        """Build the services and start their background work, timing each phase"""
+        self._timed("supabase_service", lambda: self.supabase_service)
+        self._timed("encryption_service", lambda: self.encryption_service)
+
+        started = time.perf_counter()
+        await self.interaction_logger.start()
+        await self.job_manager.start()
+        await self.connection_registry.start()
+        self.startup_timings["background_workers"] = time.perf_counter() - started
+
+        # Pre-warm the browser pool so the first tasks don't pay for a cold start
+        if os.getenv("BROWSER_POOL_PREWARM", "true").lower() != "false":
+            started = time.perf_counter()
+            await browser_pool.start()
+            self.startup_timings["browser_pool"] = time.perf_counter() - started
+
+    async def stop(self) -> None:
+        """Stop background work and release connections"""
+        if self._connection_registry is not None:
+            await self._connection_registry.stop()
+        if self._job_manager is not None:
+            await self._job_manager.stop()
+        # Flush queued interaction logs before the Supabase client goes away
+        if self._interaction_logger is not None:
+            await self._interaction_logger.stop()
+        await browser_pool.close()
+        agent_runner.shutdown()
+        from app.services.llm_client_registry import llm_client_registry
+        await llm_client_registry.aclose()
+        if self._supabase_service is not None:
+            await self._supabase_service.close()
+        await shared_state.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: round(seconds, 4) for name, seconds in self.startup_timings.items()}
+
+    def _timed(self, name: str, build: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        result = build()
+        self.startup_timings[name] = time.perf_counter() - started
+        return result
+
+
+services = ServiceContainer()
@@ -1,9 +1,11 @@
 import os
+import time
 import base64
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from dotenv import load_dotenv
+from app.utils.metrics import DECRYPT_SECONDS
 
 load_dotenv()
 
@@ -52,5 +54,7 @@ class EncryptionService:
             return ""
         
         # Convert to bytes, decrypt, and convert back to string
+        started = time.perf_counter()
         decrypted_data = self.cipher.decrypt(encrypted_data.encode())
+        DECRYPT_SECONDS.observe(time.perf_counter() - started)
         return decrypted_data.decode() 
\ No newline at end of file
@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import importlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Option keys that configure the fan-out itself and are not passed to the models
+FANOUT_OPTION_KEYS = ("models", "fanout", "scorer", "fanout_timeout")
+
+FIRST = "first"
+BEST = "best"
+
+Scorer = Callable[[Dict[str, Any]], float]
+
+
+def default_scorer(outcome: Dict[str, Any]) -> float:
+    """Prefer runs that finished with a final response, in fewer steps, sooner"""
+    if outcome["status"] != "completed":
+        return float("-inf")
+    results = outcome["result"]["results"]
+    responses = [r for r in results if r.get("type") == "response" and r.get("content")]
+    score = 1.0 if responses else 0.0
+    score -= 0.01 * len(outcome["result"]["actions"])
+    score -= 0.001 * outcome["duration"]
+    return score
+
+
+def fastest_scorer(outcome: Dict[str, Any]) -> float:
+    return -outcome["duration"] if outcome["status"] == "completed" else float("-inf")
+
+
+def fewest_steps_scorer(outcome: Dict[str, Any]) -> float:
+    if outcome["status"] != "completed":
+        return float("-inf")
+    return -len(outcome["result"]["actions"])
+
+
+SCORERS: Dict[str, Scorer] = {
+    "default": default_scorer,
+    "fastest": fastest_scorer,
+    "fewest_steps": fewest_steps_scorer,
+}
+
+
+def load_scorer(name: str) -> Scorer:
+    """A built-in scorer name or a ``module:function`` path; server configuration only"""
+    if name in SCORERS:
+        return SCORERS[name]
+    if ":" in name:
+        module_name, _, attr = name.partition(":")
+        return getattr(importlib.import_module(module_name), attr)
+    raise ValueError(f"Unknown scorer: {name}")
+
+
+def get_scorer(name: Optional[str] = None) -> Scorer:
+    """The scorer a task asked for by built-in name, or the server default (``FANOUT_SCORER``).
+
+    Requests can only pick from ``SCORERS``; importing code by path is left to
+    the server's own configuration.
+    """
+    if name is None:
+        return load_scorer(os.getenv("FANOUT_SCORER", "default"))
+    if not isinstance(name, str) or name not in SCORERS:
+        raise ValueError(f"Unknown scorer: {name}; choose one of {', '.join(SCORERS)}")
+    return SCORERS[name]
+
+
+def fanout_models(model: str, options: Dict[str, Any], preferences: Dict[str, Any]) -> List[str]:
+    """Models to run a task on; a single model means no fan-out.
+
+    ``options["models"]`` wins. Otherwise users with ``auto_select`` turned on
+    fan out to their preferred ``auto_select_models`` (or ``FANOUT_AUTO_SELECT_MODELS``).
+    The requested model always runs first.
+    """
+    models = options.get("models")
+    if not models and preferences.get("auto_select"):
+        models = preferences.get("auto_select_models") or [
+            m.strip() for m in os.getenv(
+                "FANOUT_AUTO_SELECT_MODELS", "gpt-4o,claude-3-5-sonnet-latest,gemini-1.5-pro"
+            ).split(",") if m.strip()
+        ]
+    ordered = [model] + list(models or [])
+    return list(dict.fromkeys(ordered))
+
+
+def task_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Options to hand to each model, without the fan-out settings"""
+    return {k: v for k, v in options.items() if k not in FANOUT_OPTION_KEYS}
+
+
+async def run_fanout(
+    candidates: List[Tuple[str, Any, Any]],
+    task: str,
+    options: Dict[str, Any],
+    strategy: str = FIRST,
+    scorer: Optional[Scorer] = None,
+    timeout: Optional[float] = None,
+    profile: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Run one task on several ``(model, service, llm)`` candidates in parallel.
+
+    ``first`` returns the first successful run and cancels the others;
+    ``best`` waits for every run (up to ``timeout``) and keeps the highest
+    scoring one. Only one candidate at a time can hold the browser
+    ``profile``; the others browse in throwaway contexts. The returned dict has the winner's ``execute_task`` result
+    plus a ``fanout`` report on every candidate.
+    """
+    if strategy not in (FIRST, BEST):
+        raise ValueError(f"Unknown fan-out strategy: {strategy}")
+    scorer = scorer or get_scorer()
+    timeout = timeout if timeout is not None else float(os.getenv("FANOUT_TIMEOUT", "600"))
+    started = time.monotonic()
+    outcomes: Dict[str, Dict[str, Any]] = {
+        model: {"model": model, "status": "running", "duration": None, "result": None, "error": None}
+        for model, _, _ in candidates
+    }
+
+    async def run(model: str, service: Any, llm: Any) -> str:
+        try:
+            outcomes[model]["result"] = await service.execute_task(model, task, options, llm=llm, profile=profile)
+            outcomes[model]["status"] = "completed"
+        except asyncio.CancelledError:
+            outcomes[model]["status"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Error running fan-out candidate {model}: {str(e)}")
+            outcomes[model]["status"] = "failed"
+            outcomes[model]["error"] = str(e)
+        finally:
+            outcomes[model]["duration"] = round(time.monotonic() - started, 3)
+        return model
+
+    pending = {asyncio.create_task(run(*candidate)) for candidate in candidates}
+    winner: Optional[str] = None
+    try:
+        deadline = started + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if strategy == FIRST:
+                finished = [task.result() for task in done if outcomes[task.result()]["status"] == "completed"]
+                if finished:
+                    winner = finished[0]
+                    break
+    finally:
+        for pending_task in pending:
+            pending_task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    for outcome in outcomes.values():
+        if outcome["status"] == "running":
+            outcome["status"] = "cancelled"
+        outcome["score"] = scorer(outcome) if outcome["status"] == "completed" else None
+
+    if strategy == BEST:
+        completed = [o for o in outcomes.values() if o["status"] == "completed"]
+        if completed:
+            winner = max(completed, key=lambda o: o["score"])["model"]
+
+    report = {
+        "strategy": strategy,
+        "winner": winner,
+        "candidates": [
+            {k: outcome[k] for k in ("model", "status", "duration", "score", "error")}
+            for outcome in outcomes.values()
+        ]
+    }
+    if winner is None:
+        errors = "; ".join(f"{o['model']}: {o['error'] or o['status']}" for o in outcomes.values())
+        raise RuntimeError(f"Every model failed ({errors})")
+
+    result = dict(outcomes[winner]["result"])
+    result["fanout"] = report
+    return result
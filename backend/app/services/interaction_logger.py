@@ -0,0 +1,353 @@
+import os
+import glob
+import json
+import gzip
+import base64
+import asyncio
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+
+def compress_payload(payload: Any) -> Optional[Dict[str, Any]]:
+    """Pack a JSON payload as gzip+base64 so large step logs stay small in jsonb"""
+    if payload is None:
+        return None
+    raw = json.dumps(payload, default=str, separators=(",", ":")).encode()
+    return {
+        "encoding": "gzip+base64",
+        "size": len(raw),
+        "data": base64.b64encode(gzip.compress(raw)).decode()
+    }
+
+
+def decompress_payload(payload: Optional[Dict[str, Any]]) -> Any:
+    """Reverse ``compress_payload``; uncompressed payloads are returned unchanged"""
+    if not isinstance(payload, dict) or payload.get("encoding") != "gzip+base64":
+        return payload
+    return json.loads(gzip.decompress(base64.b64decode(payload["data"])))
+
+
+class InteractionLogger:
+    """Write-behind logger for ``interaction_logs``.
+
+    ``log`` only enqueues, so callers never wait on the database. A background
+    task flushes batches when ``batch_size`` rows are queued or every
+    ``flush_interval`` seconds, retrying with exponential backoff. Batches
+    that still fail, or rows that do not fit in the queue, are appended to a
+    spill file of this worker and replayed after the next successful flush.
+    Spill files left behind by workers that have exited are picked up at
+    start and every ``replay_interval`` seconds after that. Rows
+    PostgREST rejects as invalid are set aside in a dead-letter file instead
+    of being retried.
+
+    Rows are inserted with the access token of the request that logged them,
+    so row level security applies. Tokens stay in memory: spilled rows are
+    replayed with the service role key.
+    """
+
+    def __init__(
+        self,
+        supabase_service: Any,
+        queue_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        spill_path: Optional[str] = None,
+        replay_interval: Optional[float] = None,
+    ):
+        """Initialize the logger from arguments or environment variables"""
+        self.supabase_service = supabase_service
+        self.queue_size = queue_size if queue_size is not None else int(os.getenv("INTERACTION_LOG_QUEUE_SIZE", "10000"))
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("INTERACTION_LOG_BATCH_SIZE", "50"))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else float(os.getenv("INTERACTION_LOG_FLUSH_INTERVAL", "2"))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("INTERACTION_LOG_MAX_RETRIES", "5"))
+        self.replay_interval = (
+            replay_interval if replay_interval is not None else float(os.getenv("INTERACTION_LOG_REPLAY_INTERVAL", "60"))
+        )
+        self.spill_path = spill_path or os.getenv(
+            "INTERACTION_LOG_SPILL_PATH",
+            os.path.join(tempfile.gettempdir(), "browser-use-interaction-logs.jsonl")
+        )
+
+        # Workers share the configured location, each spilling to its own file
+        root, ext = os.path.splitext(self.spill_path)
+        self._spill_root, self._spill_ext = root, ext or ".jsonl"
+        self.dead_letter_path = f"{root}.rejected{self._spill_ext}"
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: List[Dict[str, Any]] = []
+        self._spill_lock = asyncio.Lock()
+        # Rows spilled since the last replay, and when the spill directory was last scanned
+        self._spilled = False
+        self._replayed_at = 0.0
+
+        self.logged_total = 0
+        self.flushed_total = 0
+        self.spilled_total = 0
+        self.failed_flushes_total = 0
+        self.rejected_total = 0
+
+    async def start(self) -> None:
+        """Start the background flusher"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the background flusher"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        # A batch interrupted mid-flush is sent again (delivery is at-least-once)
+        rows = self._inflight + self._drain(self._queue.qsize())
+        self._inflight = []
+        while rows:
+            await self._flush(rows[:self.batch_size], retries=1)
+            rows = rows[self.batch_size:]
+
+    def log(
+        self,
+        user_id: str,
+        model: str,
+        task: str,
+        status: str,
+        actions: Optional[Any] = None,
+        results: Optional[Any] = None,
+        token: Optional[str] = None
+    ) -> None:
+        """Queue an interaction row without waiting for the database"""
+        row = {
+            "_token": token,
+            "user_id": user_id,
+            "model": model,
+            "task": task,
+            "status": status,
+            "actions": compress_payload(actions),
+            "results": compress_payload(results)
+        }
+        self.logged_total += 1
+
+        if self._queue is None:
+            # Not started (e.g. scripts); keep the row on disk rather than lose it
+            asyncio.get_running_loop().create_task(self._spill([row]))
+            return
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            asyncio.get_running_loop().create_task(self._spill([row]))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "logged_total": self.logged_total,
+            "flushed_total": self.flushed_total,
+            "spilled_total": self.spilled_total,
+            "failed_flushes_total": self.failed_flushes_total,
+            "rejected_total": self.rejected_total,
+        }
+
+    async def _run(self) -> None:
+        # Replay anything left over from a previous outage or shutdown
+        await self._replay_spill()
+        while True:
+            try:
+                await self._flush_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the flusher alive; the batch it was sending goes to the spill file
+                print(f"Error in interaction log flusher: {str(e)}")
+                rows, self._inflight = self._inflight, []
+                await self._spill(rows)
+                await asyncio.sleep(self.flush_interval)
+
+    async def _flush_next(self) -> None:
+        first = await self._queue.get()
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._inflight = batch
+        flushed = await self._flush(batch, retries=self.max_retries)
+        self._inflight = []
+        # Only scan the spill directory when this worker spilled, or now and then for exited workers
+        if flushed and (self._spilled or time.monotonic() - self._replayed_at >= self.replay_interval):
+            await self._replay_spill()
+
+    async def _flush(self, rows: List[Dict[str, Any]], retries: int) -> bool:
+        # One insert per user token; a failed group does not resend the others
+        groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(row.get("_token"), []).append(row)
+        flushed = True
+        for token, group in groups.items():
+            flushed = await self._flush_group(group, token, retries) and flushed
+        return flushed
+
+    async def _flush_group(self, rows: List[Dict[str, Any]], token: Optional[str], retries: int) -> bool:
+        payload = [{k: v for k, v in row.items() if k != "_token"} for row in rows]
+        delay = 0.5
+        for attempt in range(retries):
+            try:
+                await self.supabase_service.log_interactions(payload, token=token)
+                self.flushed_total += len(rows)
+                return True
+            except Exception as e:
+                if _is_client_error(e):
+                    # Retrying can't help; find the offending rows by halving the batch
+                    if len(rows) == 1:
+                        print(f"Interaction log rejected, moved to {self.dead_letter_path}: {str(e)}")
+                        await self._dead_letter(rows)
+                        return True
+                    middle = len(rows) // 2
+                    first = await self._flush_group(rows[:middle], token, 1)
+                    second = await self._flush_group(rows[middle:], token, 1)
+                    return first and second
+                self.failed_flushes_total += 1
+                print(f"Error flushing {len(rows)} interaction logs (attempt {attempt + 1}): {str(e)}")
+                if attempt + 1 < retries:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+
+        await self._spill(rows)
+        return False
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        rows = []
+        while self._queue is not None and len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return rows
+
+    async def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        async with self._spill_lock:
+            try:
+                await asyncio.to_thread(self._append_lines, self._own_spill_path(), rows)
+            except OSError as e:
+                print(f"Error writing interaction log spill file, {len(rows)} rows lost: {str(e)}")
+                return
+            self.spilled_total += len(rows)
+            self._spilled = True
+
+    async def _dead_letter(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            await asyncio.to_thread(self._append_lines, self.dead_letter_path, rows)
+        except OSError as e:
+            print(f"Error writing interaction log dead-letter file: {str(e)}")
+        self.rejected_total += len(rows)
+
+    def _own_spill_path(self) -> str:
+        return f"{self._spill_root}.{os.getpid()}{self._spill_ext}"
+
+    @staticmethod
+    def _append_lines(path: str, rows: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            for row in rows:
+                # Access tokens are never written to disk
+                f.write(json.dumps({k: v for k, v in row.items() if k != "_token"}, default=str) + "\n")
+
+    def _claim_spill_files(self) -> List[str]:
+        """Rename this worker's spill file, and those of exited workers, to replay files only we hold"""
+        pid = os.getpid()
+        candidates = glob.glob(f"{glob.escape(self._spill_root)}.*{self._spill_ext}*")
+        claimed = []
+        for path in candidates:
+            owner = _owner_pid(path[len(self._spill_root) + 1:])
+            if owner is None or (owner != pid and _pid_alive(owner)):
+                continue
+            if path.endswith(".replay") and owner == pid:
+                claimed.append(path)
+                continue
+            target = f"{self._spill_root}.{pid}{self._spill_ext}.{len(claimed)}-{int(time.time() * 1000)}.replay"
+            try:
+                # Atomic: when two workers race for a file, one rename fails
+                os.replace(path, target)
+            except OSError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    async def _replay_spill(self) -> None:
+        async with self._spill_lock:
+            self._spilled = False
+            self._replayed_at = time.monotonic()
+            try:
+                claimed = await asyncio.to_thread(self._claim_spill_files)
+            except OSError as e:
+                print(f"Error claiming interaction log spill files: {str(e)}")
+                return
+
+        for replay_path in claimed:
+            try:
+                rows = await asyncio.to_thread(self._read_lines, replay_path)
+            except OSError as e:
+                print(f"Error reading interaction log spill file: {str(e)}")
+                continue
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                if not await self._flush(batch, retries=1):
+                    # Everything not yet sent goes back to the spill file
+                    await self._spill(rows[start + self.batch_size:])
+                    break
+            try:
+                os.remove(replay_path)
+            except OSError as e:
+                print(f"Error removing interaction log replay file: {str(e)}")
+
+    @staticmethod
+    def _read_lines(path: str) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return rows
+
+
+def _is_client_error(error: Exception) -> bool:
+    """A 4xx from PostgREST other than 429: the rows themselves were refused"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def _owner_pid(suffix: str) -> Optional[int]:
+    # "<pid>.jsonl" or "<pid>.jsonl.<n>.replay"
+    head = suffix.split(".", 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
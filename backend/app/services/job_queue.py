@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from app.utils import activity
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+JobRunner = Callable[[], AsyncIterator[Dict[str, Any]]]
+
+
+class JobStore:
+    """Where job state lives; the in-process store is the default"""
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        """Change a job's fields; finished jobs are left as they are"""
+        raise NotImplementedError
+
+    async def append_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        """Whether another worker asked for the job to be cancelled"""
+        job = await self.get(job_id)
+        return bool(job and job.get("cancel_requested"))
+
+
+class InMemoryJobStore(JobStore):
+    """Jobs kept in a dict, dropped ``ttl`` seconds after they finish"""
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        self._purge()
+        self.jobs[job["id"]] = job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        job = self.jobs.get(job_id)
+        if job is not None and job["status"] not in TERMINAL_STATUSES:
+            job.update(fields)
+
+    async def append_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        if job_id in self.jobs:
+            self.jobs[job_id]["results"].append(result)
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.get("finished_at") and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs persisted in a SQLite file, shareable by workers on one host and handy for tests.
+
+    Results go to their own append-only table, so a streamed event is one
+    insert rather than a rewrite of the whole job.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS job_results "
+                "(seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS job_results_job_id ON job_results (job_id, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _read_job(self, db: sqlite3.Connection, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            job = self._read_job(db, job_id)
+            if job is None:
+                return None
+            rows = db.execute("SELECT data FROM job_results WHERE job_id = ? ORDER BY seq", (job_id,)).fetchall()
+        job["results"] = [json.loads(row[0]) for row in rows]
+        return job
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        job = {k: v for k, v in job.items() if k != "results"}
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, data) VALUES (?, ?)",
+                (job["id"], json.dumps(job, default=str))
+            )
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            job = self._read_job(db, job_id)
+            if job is not None and job["status"] not in TERMINAL_STATUSES:
+                job.update(fields)
+                db.execute("UPDATE jobs SET data = ? WHERE id = ?", (json.dumps(job, default=str), job_id))
+
+    def _append(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self._connect() as db:
+            db.execute("INSERT INTO job_results (job_id, data) VALUES (?, ?)", (job_id, json.dumps(result, default=str)))
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as db:
+            job = self._read_job(db, job_id)
+        return bool(job and job.get("cancel_requested"))
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, job_id)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    async def append_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._append, job_id, result)
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        return await asyncio.to_thread(self._cancel_requested, job_id)
+
+
+class RedisJobStore(JobStore):
+    """Jobs stored as JSON strings in Redis so every worker process sees them.
+
+    Results are pushed onto a list of their own, so a streamed event is one
+    ``RPUSH`` rather than a rewrite of the whole job.
+    """
+
+    def __init__(self, url: str, ttl: int = 3600):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, job_id: str) -> str:
+        return f"agent-job:{job_id}"
+
+    def _results_key(self, job_id: str) -> str:
+        return f"agent-job:{job_id}:results"
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        job = {k: v for k, v in job.items() if k != "results"}
+        await self.redis.set(self._key(job["id"]), json.dumps(job, default=str), ex=self.ttl)
+
+    async def _get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.redis.get(self._key(job_id))
+        return json.loads(data) if data else None
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self._get_job(job_id)
+        if job is not None:
+            job["results"] = [json.loads(item) for item in await self.redis.lrange(self._results_key(job_id), 0, -1)]
+        return job
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        key = self._key(job_id)
+        async with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    data = await pipe.get(key)
+                    if not data:
+                        return
+                    job = json.loads(data)
+                    if job["status"] in TERMINAL_STATUSES:
+                        return
+                    job.update(fields)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(job, default=str), ex=self.ttl)
+                    await pipe.execute()
+                    return
+                except Exception as e:
+                    if type(e).__name__ != "WatchError":
+                        raise
+
+    async def append_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        key = self._results_key(job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, json.dumps(result, default=str))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def cancel_requested(self, job_id: str) -> bool:
+        job = await self._get_job(job_id)
+        return bool(job and job.get("cancel_requested"))
+
+
+def create_job_store() -> JobStore:
+    """Build the store selected by ``JOB_STORE`` (memory, sqlite:///path or redis://...).
+
+    Defaults to the ``SHARED_STATE`` backend so jobs are visible to every worker.
+    """
+    url = os.getenv("JOB_STORE") or os.getenv("SHARED_STATE", "memory")
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisJobStore(url)
+    return InMemoryJobStore()
+
+
+class JobManager:
+    """Run agent jobs on a bounded worker pool with per-user limits.
+
+    ``submit`` returns immediately with a job id. Workers pick the oldest
+    queued job whose user is below ``max_per_user`` running jobs, stream its
+    results into the store as they arrive, and honour cancellation. A job
+    running here is cancelled directly; one running on another worker sees
+    the request within ``cancel_poll`` seconds.
+    """
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        workers: Optional[int] = None,
+        max_per_user: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        cancel_poll: Optional[float] = None,
+    ):
+        """Initialize the manager from arguments or environment variables"""
+        self.store = store or create_job_store()
+        self.workers = workers if workers is not None else int(os.getenv("JOB_WORKERS", "4"))
+        self.max_per_user = max_per_user if max_per_user is not None else int(os.getenv("JOB_MAX_PER_USER", "2"))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("JOB_MAX_QUEUED", "1000"))
+        self.cancel_poll = cancel_poll if cancel_poll is not None else float(os.getenv("JOB_CANCEL_POLL", "1"))
+
+        self._pending: Deque[str] = deque()
+        self._runners: Dict[str, JobRunner] = {}
+        self._owners: Dict[str, str] = {}
+        self._running_per_user: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._waiting: Dict[str, int] = {}
+        self._condition = asyncio.Condition()
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def submit(self, user_id: str, model: str, task: str, options: Optional[Dict[str, Any]], runner: JobRunner) -> Dict[str, Any]:
+        """Queue a job and return its initial state"""
+        if len(self._pending) >= self.max_queued:
+            raise OverflowError("Job queue is full")
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "model": model,
+            "task": task,
+            "options": options or {},
+            "status": QUEUED,
+            "results": [],
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+        await self.store.create(job)
+
+        async with self._condition:
+            self._runners[job["id"]] = runner
+            self._owners[job["id"]] = user_id
+            self._pending.append(job["id"])
+            self._condition.notify_all()
+        return job
+
+    async def get(self, job_id: str, wait: float = 0.0, after: int = 0) -> Optional[Dict[str, Any]]:
+        """Return a job, long-polling up to ``wait`` seconds for results past index ``after``"""
+        deadline = time.monotonic() + wait
+        self._waiting[job_id] = self._waiting.get(job_id, 0) + 1
+        try:
+            while True:
+                job = await self.store.get(job_id)
+                if job is None or job["status"] in TERMINAL_STATUSES or len(job["results"]) > after:
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+
+                # Wake on local progress, and poll so jobs run by other workers are seen too
+                event = self._changed.setdefault(job_id, asyncio.Event())
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # The last waiter drops the event, including for jobs run by other workers
+            self._waiting[job_id] -= 1
+            if not self._waiting[job_id]:
+                del self._waiting[job_id]
+                self._changed.pop(job_id, None)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it already finished"""
+        job = await self.store.get(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            return False
+
+        async with self._condition:
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+                self._forget(job_id)
+                await self._finish(job_id, CANCELLED)
+                return True
+
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            return True
+
+        # Running on another worker process: record the request, that worker checks it
+        await self.store.update(job_id, cancel_requested=True)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": len(self._pending),
+            "running": len(self._tasks),
+            "running_per_user": dict(self._running_per_user),
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._condition:
+                job_id = None
+                while job_id is None:
+                    job_id = self._next_job()
+                    if job_id is None:
+                        await self._condition.wait()
+                user_id = self._owners[job_id]
+                self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+                runner = self._runners.pop(job_id)
+
+            task = asyncio.create_task(self._run(job_id, runner))
+            self._tasks[job_id] = task
+            try:
+                await asyncio.wait([task])
+                if task.cancelled():
+                    # Cancelled before _run got going, so nothing recorded the outcome
+                    await self._finish(job_id, CANCELLED)
+            finally:
+                self._tasks.pop(job_id, None)
+                async with self._condition:
+                    self._running_per_user[user_id] -= 1
+                    if not self._running_per_user[user_id]:
+                        del self._running_per_user[user_id]
+                    self._owners.pop(job_id, None)
+                    self._condition.notify_all()
+
+    def _next_job(self) -> Optional[str]:
+        # Oldest job whose user still has capacity, so one user can't starve the rest
+        for job_id in self._pending:
+            if self._running_per_user.get(self._owners[job_id], 0) < self.max_per_user:
+                self._pending.remove(job_id)
+                return job_id
+        return None
+
+    async def _run(self, job_id: str, runner: JobRunner) -> None:
+        activity.attribute(name="job", task_id=job_id)
+        stream = runner()
+        try:
+            # Inside the try, so a cancel landing during this write still finishes the job
+            await self.store.update(job_id, status=RUNNING, started_at=time.time())
+            self._notify(job_id)
+            checked_at = time.monotonic()
+            async for result in stream:
+                await self.store.append_result(job_id, result)
+                self._notify(job_id)
+                # Cancels from other workers arrive through the store; look now and then, not per event
+                if time.monotonic() - checked_at >= self.cancel_poll:
+                    checked_at = time.monotonic()
+                    if await self.store.cancel_requested(job_id):
+                        raise asyncio.CancelledError()
+            await self._finish(job_id, COMPLETED)
+        except asyncio.CancelledError:
+            await self._finish(job_id, CANCELLED)
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            await self._finish(job_id, FAILED, error=str(e))
+        finally:
+            # A cancel from another worker leaves the runner suspended; close it so its cleanup runs now
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception as e:
+                    print(f"Error closing job {job_id}: {str(e)}")
+
+    async def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        await self.store.update(job_id, status=status, error=error, finished_at=time.time())
+        self._notify(job_id)
+        self._changed.pop(job_id, None)
+
+    def _forget(self, job_id: str) -> None:
+        self._runners.pop(job_id, None)
+        self._owners.pop(job_id, None)
+
+    def _notify(self, job_id: str) -> None:
+        event = self._changed.get(job_id)
+        if event is not None:
+            event.set()
+            # Fresh event for the next long-poll
+            self._changed[job_id] = asyncio.Event()
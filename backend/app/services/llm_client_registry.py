@@ -0,0 +1,133 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import httpx
+
+from app.utils.cache import TTLCache
+
+
+class LLMClientRegistry:
+    """Bounded, time-limited registry of provider services and ready LLM clients.
+
+    Services hold the decrypted provider key and are keyed by (user, provider);
+    clients are keyed by (user, provider, key fingerprint, model, options)
+    so their HTTP connection pools stay warm across tasks. The fingerprint
+    of the encrypted key an entry was built from is part of its identity, so
+    a rotated key is never served even when the rotation happened on another
+    worker. Keys only ever live in process memory.
+
+    A client that leaves the registry has its HTTP client closed after
+    ``close_delay`` seconds, giving runs that still hold it time to finish;
+    ``aclose`` closes everything at shutdown.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None, close_delay: Optional[float] = None):
+        """Initialize the registry from arguments or environment variables"""
+        max_size = max_size if max_size is not None else int(os.getenv("LLM_CLIENT_CACHE_SIZE", "256"))
+        ttl = ttl if ttl is not None else float(os.getenv("LLM_CLIENT_CACHE_TTL", "900"))
+        self.close_delay = close_delay if close_delay is not None else float(os.getenv("LLM_CLIENT_CLOSE_DELAY", "600"))
+        self.services = TTLCache(max_size=max_size, ttl=ttl)
+        self.clients = TTLCache(max_size=max_size, ttl=ttl, on_evict=self._retire)
+        # HTTP clients of evicted LLM clients, waiting to be closed
+        self._retired: set = set()
+        self.closed_total = 0
+
+    def get_service(
+        self,
+        user_id: str,
+        provider: str,
+        encrypted_key: str,
+        factory: Callable[[], Any]
+    ) -> Any:
+        """Return the cached service for a user and provider, building it on first use"""
+        key = (user_id, provider)
+        fingerprint = self._fingerprint(encrypted_key)
+        entry = self.services.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        if entry is not None:
+            # The stored key changed since the service was built
+            self.invalidate(user_id, provider)
+
+        service = factory()
+        self.services.set(key, (fingerprint, service))
+        return service
+
+    def get_llm(
+        self,
+        user_id: str,
+        provider: str,
+        encrypted_key: str,
+        model: str,
+        options: Optional[Dict[str, Any]],
+        factory: Callable[[], Any]
+    ) -> Any:
+        """Return a ready LLM client for the user, provider key, model and options"""
+        key = (user_id, provider, self._fingerprint(encrypted_key), model, self._options_key(options))
+        llm = self.clients.get(key)
+        if llm is None:
+            llm = factory()
+            self.clients.set(key, llm)
+        return llm
+
+    def invalidate(self, user_id: str, provider: Optional[str] = None) -> None:
+        """Wipe cached services and clients for a user, optionally for one provider"""
+        for cache in (self.services, self.clients):
+            for key in cache.keys():
+                if key[0] == user_id and (provider is None or key[1] == provider):
+                    cache.delete(key)
+
+    async def aclose(self) -> None:
+        """Close the HTTP clients of every cached and evicted LLM client"""
+        self.services.clear()
+        self.clients.clear()
+        retired, self._retired = self._retired, set()
+        for client in retired:
+            await self._close(client)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "services": self.services.metrics(),
+            "clients": self.clients.metrics(),
+            "closing": len(self._retired),
+            "closed_total": self.closed_total,
+        }
+
+    def _retire(self, key: Hashable, llm: Any) -> None:
+        client = getattr(llm, "http_async_client", None)
+        if not isinstance(client, httpx.AsyncClient) or client in self._retired:
+            return
+        self._retired.add(client)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the loop; closed by aclose at shutdown
+            return
+        loop.call_later(self.close_delay, lambda: asyncio.ensure_future(self._close_retired(client)))
+
+    async def _close_retired(self, client: httpx.AsyncClient) -> None:
+        if client in self._retired:
+            self._retired.discard(client)
+            await self._close(client)
+
+    async def _close(self, client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+            self.closed_total += 1
+        except Exception as e:
+            print(f"Error closing LLM HTTP client: {str(e)}")
+
+    @staticmethod
+    def _fingerprint(encrypted_key: str) -> str:
+        return hashlib.sha256(encrypted_key.encode()).hexdigest()
+
+    @staticmethod
+    def _options_key(options: Optional[Dict[str, Any]]) -> str:
+        return json.dumps(options or {}, sort_keys=True, default=str)
+
+
+llm_client_registry = LLMClientRegistry()
@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from app.utils.cache import TTLCache
+
+
+class SQLiteMemoTier:
+    """On-disk memo entries in a SQLite file, shared by workers and restarts"""
+
+    def __init__(self, path: str, max_rows: int):
+        self.path = path
+        self.max_rows = max_rows
+        self._writes = 0
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_memo "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM llm_memo WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO llm_memo (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl)
+            )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % 100 == 0
+            if prune:
+                # Expired rows first, then the ones closest to expiring
+                db.execute("DELETE FROM llm_memo WHERE expires_at <= ?", (now,))
+                db.execute(
+                    "DELETE FROM llm_memo WHERE key IN "
+                    "(SELECT key FROM llm_memo ORDER BY expires_at LIMIT max(0, (SELECT count(*) FROM llm_memo) - ?))",
+                    (self.max_rows,)
+                )
+
+    def clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM llm_memo")
+
+
+class LLMMemo:
+    """Memoized chat model responses, keyed by a content hash of the call.
+
+    Values are opaque serialized strings. Lookups go to an in-memory LRU
+    first and then to the optional SQLite tier, promoting disk hits into
+    memory. The LangChain side lives in ``llm_memo_cache`` so importing
+    this module stays cheap.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+    ):
+        """Initialize the memo from arguments or environment variables"""
+        self.enabled = enabled if enabled is not None else os.getenv("LLM_MEMO", "false").lower() == "true"
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_MEMO_TTL", "86400"))
+        max_size = max_size if max_size is not None else int(os.getenv("LLM_MEMO_SIZE", "2000"))
+        self.memory = TTLCache(max_size=max_size, ttl=self.ttl)
+
+        path = path if path is not None else os.getenv("LLM_MEMO_PATH")
+        self.disk = SQLiteMemoTier(path, int(os.getenv("LLM_MEMO_DISK_SIZE", "100000"))) if path else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is None:
+            self.misses += 1
+            return None
+        return self._get_disk(key)
+
+    def set(self, key: str, value: str) -> None:
+        self.stores += 1
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"Error writing LLM memo: {str(e)}")
+
+    async def aget(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is None:
+            self.misses += 1
+            return None
+        return await asyncio.to_thread(self._get_disk, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        if self.disk is None:
+            self.stores += 1
+            self.memory.set(key, value)
+            return
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.memory.keys()),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "disk": self.disk.path if self.disk is not None else None,
+        }
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        value = None
+        try:
+            value = self.disk.get(key)
+        except Exception as e:
+            print(f"Error reading LLM memo: {str(e)}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+
+llm_memo = LLMMemo()
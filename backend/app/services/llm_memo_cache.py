@@ -0,0 +1,92 @@
+import json
+import hashlib
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation, LLMResult
+
+from app.services.llm_memo import LLMMemo, llm_memo
+
+
+class MemoCache(BaseCache):
+    """LangChain cache backed by ``LLMMemo`` for one chat model client.
+
+    LangChain hands over the serialized messages and a description of the
+    call (model parameters, bound tools, stop words); the key hashes both
+    with the model name, the temperature and the client's ``scope`` (user,
+    provider and key fingerprint), so an answer paid for with one user's
+    key is never replayed to another. Replayed generations are marked
+    ``memoized`` in their ``generation_info`` so metrics and traces can tell
+    them apart; LangChain answers them before asking the rate limiter.
+    """
+
+    def __init__(self, model: str, temperature: float, scope: Sequence[str], memo: Optional[LLMMemo] = None):
+        self.model = model
+        self.temperature = temperature
+        self.scope = list(scope)
+        self.memo = memo or llm_memo
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        content = json.dumps([self.scope, self.model, self.temperature, prompt, llm_string])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def _dump(generations: RETURN_VAL_TYPE) -> str:
+        return json.dumps([
+            {
+                "message": message_to_dict(generation.message) if isinstance(generation, ChatGeneration) else None,
+                "text": generation.text,
+                "generation_info": generation.generation_info,
+            }
+            for generation in generations
+        ], default=str)
+
+    @staticmethod
+    def _load(value: Optional[str]) -> Optional[RETURN_VAL_TYPE]:
+        if value is None:
+            return None
+        generations = []
+        for item in json.loads(value):
+            info = dict(item["generation_info"] or {}, memoized=True)
+            if item["message"] is not None:
+                generations.append(ChatGeneration(message=messages_from_dict([item["message"]])[0], generation_info=info))
+            else:
+                generations.append(Generation(text=item["text"], generation_info=info))
+        return generations
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self._load(self.memo.get(self._key(prompt, llm_string)))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.memo.set(self._key(prompt, llm_string), self._dump(return_val))
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self._load(await self.memo.aget(self._key(prompt, llm_string)))
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        await self.memo.aset(self._key(prompt, llm_string), self._dump(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.memo.clear()
+
+
+def is_memoized(response: LLMResult) -> bool:
+    """Whether a finished call was answered from the memo rather than the provider"""
+    generations = [generation for batch in response.generations for generation in batch]
+    return bool(generations) and all((generation.generation_info or {}).get("memoized") for generation in generations)
+
+
+def with_memoization(llm: BaseChatModel, model: str, scope: Sequence[str], memo: Optional[LLMMemo] = None) -> BaseChatModel:
+    """Attach the memo to a chat model when its calls are deterministic.
+
+    Only temperature 0 clients are memoized; anything sampled is returned
+    unchanged so repeated calls still vary. ``scope`` identifies who pays
+    for the calls (user, provider, key) and partitions the memo.
+    """
+    memo = memo or llm_memo
+    temperature = getattr(llm, "temperature", None)
+    if not memo.enabled or temperature is None or temperature != 0:
+        return llm
+    return llm.model_copy(update={"cache": MemoCache(model, temperature, scope, memo)})
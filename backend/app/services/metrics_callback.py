@@ -0,0 +1,87 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.services.callback_runs import RunRegistry
+from app.services.llm_memo_cache import is_memoized
+from app.services.rate_limit_callback import permit_granted_at
+from app.utils.metrics import ERRORS, LLM_CALLS, LLM_CALL_SECONDS, LLM_TOKENS, model_label
+
+
+def token_usage(response: LLMResult) -> Tuple[int, int]:
+    """(prompt, completion) tokens reported for a call, from the provider's usage block or the messages' usage metadata"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage_metadata.get("input_tokens") or 0
+            completion_tokens += usage_metadata.get("output_tokens") or 0
+    return prompt_tokens, completion_tokens
+
+
+class LLMMetricsCallbackHandler(AsyncCallbackHandler):
+    """LangChain callback recording chat model latency, outcome and token usage per provider and model.
+
+    Latency is timed from when the call holds its rate limit permit; the
+    wait for the permit is recorded separately by ``RateLimitCallbackHandler``.
+    Calls whose task is cancelled mid-flight are counted as ``cancelled``.
+    """
+
+    # Started from the calling task so cancelled calls are noticed when it ends
+    run_inline = True
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._started: RunRegistry[Tuple[float, str]] = RunRegistry(self._abandon)
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        invocation_params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        params = invocation_params or {}
+        model = params.get("model") or params.get("model_name") or params.get("deployment_name")
+        self._started.add(run_id, (time.perf_counter(), model_label(model)))
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id)
+        if started is None:
+            return
+        began, model = started
+
+        if is_memoized(response):
+            LLM_CALLS.labels(self.provider, model, "memoized").inc()
+            return
+
+        # The permit is taken after the call starts; time the provider call from when it was granted
+        granted_at = permit_granted_at()
+        if granted_at is not None:
+            began = max(began, granted_at)
+        LLM_CALL_SECONDS.labels(self.provider, model).observe(time.perf_counter() - began)
+        LLM_CALLS.labels(self.provider, model, "ok").inc()
+
+        prompt_tokens, completion_tokens = token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.labels(self.provider, model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(self.provider, model, "completion").inc(completion_tokens)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id)
+        if started is None:
+            return
+        LLM_CALLS.labels(self.provider, started[1], "error").inc()
+        ERRORS.labels("llm").inc()
+
+    def _abandon(self, started: Tuple[float, str]) -> None:
+        LLM_CALLS.labels(self.provider, started[1], "cancelled").inc()
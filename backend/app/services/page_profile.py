@@ -0,0 +1,160 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_BLOCKED_DOMAINS_PATH = os.path.join(os.path.dirname(__file__), "blocked_domains.txt")
+
+# Named profiles; ``options.page_profile`` picks one or overrides fields of one
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "full": {"block_types": [], "block_trackers": False, "block_images": False},
+    "light": {"block_types": ["media", "font"], "block_trackers": True, "block_images": "auto"},
+    "minimal": {"block_types": ["media", "font"], "block_trackers": True, "block_images": True},
+}
+
+# Typical transfer size per resource type, to estimate what a blocked request would have cost
+TYPICAL_BYTES = {
+    "image": 45_000,
+    "media": 750_000,
+    "font": 35_000,
+    "script": 25_000,
+    "stylesheet": 15_000,
+}
+DEFAULT_TYPICAL_BYTES = 5_000
+
+
+@lru_cache(maxsize=None)
+def blocked_domains(path: Optional[str] = None) -> FrozenSet[str]:
+    """Ad and analytics domains from the local list (``BLOCKED_DOMAINS_PATH``)"""
+    path = path or os.getenv("BLOCKED_DOMAINS_PATH", DEFAULT_BLOCKED_DOMAINS_PATH)
+    with open(path) as f:
+        return frozenset(
+            line.strip().lower() for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+
+
+class PageProfile:
+    """What a task's browser loads: blocked resource types and domains, viewport and network throttling"""
+
+    def __init__(
+        self,
+        name: str = "full",
+        block_types: Iterable[str] = (),
+        block_trackers: bool = False,
+        viewport: Optional[Dict[str, int]] = None,
+        throttle: Optional[Dict[str, float]] = None,
+    ):
+        self.name = name
+        self.block_types = frozenset(block_types)
+        self.block_trackers = block_trackers
+        self.viewport = viewport
+        self.throttle = throttle
+        self.domains = blocked_domains() if block_trackers else frozenset()
+
+    @classmethod
+    def from_options(cls, options: Optional[Dict[str, Any]], use_vision: bool = True) -> "PageProfile":
+        """Build the profile from ``options.page_profile``: a preset name, or a dict with a ``preset`` and overrides.
+
+        ``block_images: "auto"`` blocks images only when the agent doesn't look at screenshots.
+        """
+        spec = (options or {}).get("page_profile") or os.getenv("PAGE_PROFILE", "full")
+        if isinstance(spec, str):
+            spec = {"preset": spec}
+        if not isinstance(spec, dict):
+            raise ValueError("page_profile must be a preset name or an object")
+
+        name = spec.get("preset", "full")
+        if name not in PRESETS:
+            raise ValueError(f"Unknown page profile: {name}")
+        settings = dict(PRESETS[name], **{k: v for k, v in spec.items() if k != "preset"})
+
+        if not isinstance(settings["block_types"], list) or not all(isinstance(t, str) for t in settings["block_types"]):
+            raise ValueError("block_types must be a list of resource types")
+        block_types = set(settings["block_types"])
+        block_images = settings["block_images"]
+        if block_images is True or (block_images == "auto" and not use_vision):
+            block_types.add("image")
+
+        viewport = settings.get("viewport")
+        if viewport is not None and (not isinstance(viewport, dict) or not {"width", "height"} <= set(viewport)):
+            raise ValueError("viewport needs a width and a height")
+        if settings.get("throttle") is not None and not isinstance(settings["throttle"], dict):
+            raise ValueError("throttle must be an object")
+        return cls(name, block_types, bool(settings["block_trackers"]), viewport, settings.get("throttle"))
+
+    @property
+    def intercepts(self) -> bool:
+        """Whether any request has to be routed through the blocker"""
+        return bool(self.block_types or self.domains)
+
+    def block_reason(self, resource_type: str, url: str) -> Optional[str]:
+        """Why a request is blocked (its resource type or ``tracker``), or None to let it through"""
+        if resource_type in self.block_types:
+            return resource_type
+        if self.domains:
+            labels = (urlsplit(url).hostname or "").split(".")
+            for i in range(len(labels)):
+                if ".".join(labels[i:]) in self.domains:
+                    return "tracker"
+        return None
+
+
+class PageLoadStats:
+    """Requests loaded and blocked during one task"""
+
+    def __init__(self, profile: str = "full"):
+        self.profile = profile
+        self.requests = 0
+        self.bytes_loaded = 0
+        self.blocked: Dict[str, int] = {}
+        self.estimated_bytes_saved = 0
+
+    def record_blocked(self, reason: str, resource_type: str) -> None:
+        self.blocked[reason] = self.blocked.get(reason, 0) + 1
+        self.estimated_bytes_saved += TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+
+    def record_loaded(self, size: int) -> None:
+        self.requests += 1
+        self.bytes_loaded += size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "profile": self.profile,
+            "requests": self.requests,
+            "bytes_loaded": self.bytes_loaded,
+            "blocked": dict(self.blocked),
+            "blocked_total": sum(self.blocked.values()),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+        }
+
+
+class PageLoadMetrics:
+    """Totals of every task's page load stats in this process"""
+
+    def __init__(self):
+        self.tasks = 0
+        self.requests = 0
+        self.bytes_loaded = 0
+        self.blocked: Dict[str, int] = {}
+        self.estimated_bytes_saved = 0
+
+    def record(self, stats: PageLoadStats) -> None:
+        self.tasks += 1
+        self.requests += stats.requests
+        self.bytes_loaded += stats.bytes_loaded
+        self.estimated_bytes_saved += stats.estimated_bytes_saved
+        for reason, count in stats.blocked.items():
+            self.blocked[reason] = self.blocked.get(reason, 0) + count
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "tasks": self.tasks,
+            "requests": self.requests,
+            "bytes_loaded": self.bytes_loaded,
+            "blocked": dict(self.blocked),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+        }
+
+
+page_load_metrics = PageLoadMetrics()
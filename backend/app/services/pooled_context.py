@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, Optional
+
+from browser_use import Browser
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from playwright.async_api import Browser as PlaywrightBrowser, Page, Response, Route
+
+from app.services.page_profile import PageProfile, PageLoadStats
+
+# Launch flags for profile browsers, matching the pooled browsers' stealth settings
+PROFILE_BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--disable-background-timer-throttling",
+    "--disable-popup-blocking",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
+
+class _ProfileLauncher:
+    """Stands in for the pooled Playwright browser so ``new_context`` opens a profile instead"""
+
+    def __init__(self, browser: Browser, user_data_dir: str):
+        self.browser = browser
+        self.user_data_dir = user_data_dir
+
+    async def new_context(self, **kwargs: Any) -> Any:
+        return await self.browser.playwright.chromium.launch_persistent_context(
+            self.user_data_dir,
+            headless=self.browser.config.headless,
+            args=PROFILE_BROWSER_ARGS + self.browser.disable_security_args + self.browser.config.extra_chromium_args,
+            proxy=self.browser.config.proxy,
+            **kwargs
+        )
+
+
+class PooledBrowserContext(BrowserContext):
+    """Browser context leased from the pool.
+
+    With a ``user_data_dir`` the context is a persistent Chromium profile
+    started through the pooled browser's Playwright driver, so cookies,
+    localStorage and the HTTP disk cache are kept on disk between runs.
+    Without one it is the usual throwaway context. A ``page_profile``
+    blocks resource types and tracker domains through request routing and
+    throttles the network; what was loaded and blocked goes to ``stats``.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        config: Optional[BrowserContextConfig] = None,
+        user_data_dir: Optional[str] = None,
+        page_profile: Optional[PageProfile] = None,
+    ):
+        super().__init__(browser=browser, config=config or BrowserContextConfig())
+        self.user_data_dir = user_data_dir
+        self.page_profile = page_profile or PageProfile()
+        self.stats = PageLoadStats(self.page_profile.name)
+
+    async def _create_context(self, browser: PlaywrightBrowser):
+        if self.user_data_dir is None:
+            context = await super()._create_context(browser)
+        else:
+            # browser_use only calls new_context() on what it is given; the rest of its setup applies unchanged
+            context = await super()._create_context(_ProfileLauncher(self.browser, self.user_data_dir))
+
+        context.on("response", self._on_response)
+        # Routing bypasses Chromium's HTTP cache, so only route when something is blocked
+        if self.page_profile.intercepts:
+            await context.route("**/*", self._route)
+        if self.page_profile.throttle:
+            context.on("page", lambda page: asyncio.ensure_future(self._throttle(page)))
+            for page in context.pages:
+                await self._throttle(page)
+        return context
+
+    def _on_response(self, response: Response) -> None:
+        length = response.headers.get("content-length", "")
+        self.stats.record_loaded(int(length) if length.isdigit() else 0)
+
+    async def _route(self, route: Route) -> None:
+        request = route.request
+        reason = self.page_profile.block_reason(request.resource_type, request.url)
+        if reason is None:
+            await route.continue_()
+            return
+        self.stats.record_blocked(reason, request.resource_type)
+        await route.abort("blockedbyclient")
+
+    async def _throttle(self, page: Page) -> None:
+        throttle = self.page_profile.throttle
+        try:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Network.enable")
+            await session.send("Network.emulateNetworkConditions", {
+                "offline": False,
+                "latency": throttle.get("latency_ms", 0),
+                # -1 leaves a direction unthrottled
+                "downloadThroughput": throttle["download_kbps"] * 1024 / 8 if throttle.get("download_kbps") else -1,
+                "uploadThroughput": throttle["upload_kbps"] * 1024 / 8 if throttle.get("upload_kbps") else -1,
+            })
+        except Exception as e:
+            print(f"Error throttling page: {str(e)}")
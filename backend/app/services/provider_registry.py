@@ -0,0 +1,122 @@
+import os
+import json
+import importlib
+import threading
+from typing import Any, Dict, List, Optional
+
+# Provider name -> "module:Class" of its adapter; modules are imported on first use
+DEFAULT_ADAPTERS = {
+    "openai": "app.services.openai_service:OpenAIService",
+    "anthropic": "app.services.anthropic_service:AnthropicService",
+    "azure-openai": "app.services.azure_openai_service:AzureOpenAIService",
+    "gemini": "app.services.gemini_service:GeminiService",
+    "deepseek": "app.services.deepseek_service:DeepSeekService",
+}
+
+# Model name prefix -> provider, used for models not listed explicitly
+DEFAULT_PREFIXES = {
+    "gpt": "openai",
+    "text-davinci": "openai",
+    "claude": "anthropic",
+    "gemini": "gemini",
+    "deepseek": "deepseek",
+    "azure-": "azure-openai",
+}
+
+# Exact model name -> provider
+DEFAULT_MODELS = {
+    "gpt-4o": "openai",
+    "gpt-4o-mini": "openai",
+    "claude-3.5": "anthropic",
+    "deepseek-v3": "deepseek",
+    "deepseek-r1": "deepseek",
+}
+
+
+class ProviderRegistry:
+    """Maps model names to providers and providers to lazily imported adapters.
+
+    Exact model names resolve with one dict lookup. Unknown names fall back to
+    the longest matching prefix and the answer is remembered, so every model
+    costs a prefix scan at most once. Adapter modules (and the LLM SDKs they
+    pull in) are only imported when a provider is first used.
+
+    ``MODEL_PROVIDERS_PATH`` may point at a JSON file with ``models``,
+    ``prefixes`` and ``adapters`` objects that extend or override the defaults.
+    """
+
+    def __init__(self, config_path: Optional[str] = None, max_models: int = 4096):
+        """Initialize the registry from the defaults plus an optional JSON file"""
+        self.adapters = dict(DEFAULT_ADAPTERS)
+        self.prefixes = dict(DEFAULT_PREFIXES)
+        self.models = dict(DEFAULT_MODELS)
+        self.max_models = max_models
+        self._classes: Dict[str, Any] = {}
+        self._sorted_prefixes: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+        config_path = config_path or os.getenv("MODEL_PROVIDERS_PATH")
+        if config_path:
+            self.load(config_path)
+
+    def load(self, path: str) -> None:
+        """Merge a JSON mapping file into the registry"""
+        with open(path, "r") as f:
+            config = json.load(f)
+
+        self.adapters.update(config.get("adapters", {}))
+        self.prefixes.update(config.get("prefixes", {}))
+        self.models.update(config.get("models", {}))
+        self._sorted_prefixes = None
+        self._classes.clear()
+
+    def providers(self) -> List[str]:
+        return list(self.adapters)
+
+    def resolve(self, model: str) -> Optional[str]:
+        """Return the provider serving ``model``, or None when no mapping applies"""
+        provider = self.models.get(model)
+        if provider is not None:
+            return provider
+
+        for prefix in self._prefixes_longest_first():
+            if model.startswith(prefix):
+                provider = self.prefixes[prefix]
+                # Remember the answer; the cap keeps arbitrary client input from growing it forever
+                if len(self.models) < self.max_models:
+                    self.models[model] = provider
+                return provider
+        return None
+
+    def adapter_class(self, provider: str) -> Optional[Any]:
+        """Import and return the adapter class for a provider"""
+        cls = self._classes.get(provider)
+        if cls is not None:
+            return cls
+
+        path = self.adapters.get(provider)
+        if path is None:
+            return None
+
+        with self._lock:
+            cls = self._classes.get(provider)
+            if cls is None:
+                module_name, _, class_name = path.partition(":")
+                cls = getattr(importlib.import_module(module_name), class_name)
+                self._classes[provider] = cls
+        return cls
+
+    def create_service(self, provider: str, api_key: str) -> Optional[Any]:
+        """Build the provider service for an API key"""
+        cls = self.adapter_class(provider)
+        if cls is None:
+            return None
+        return cls(api_key)
+
+    def _prefixes_longest_first(self) -> List[str]:
+        if self._sorted_prefixes is None:
+            self._sorted_prefixes = sorted(self.prefixes, key=len, reverse=True)
+        return self._sorted_prefixes
+
+
+provider_registry = ProviderRegistry()
@@ -0,0 +1,140 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.services.callback_runs import RunRegistry
+from app.services.rate_limiter import RateLimiter, RateLimitPermit
+from app.utils.metrics import LLM_RATE_LIMIT_WAIT_SECONDS
+
+
+class _LimitedCall:
+    """A started chat model call: its estimated cost and the permits it holds"""
+
+    __slots__ = ("handler", "tokens", "permits", "granted_at", "closed")
+
+    def __init__(self, handler: "RateLimitCallbackHandler", tokens: int):
+        self.handler = handler
+        self.tokens = tokens
+        self.permits: List[RateLimitPermit] = []
+        self.granted_at: Optional[float] = None
+        self.closed = False
+
+
+# The call the current task started last; read by PermitGate when LangChain asks for a permit
+_current_call: ContextVar[Optional[_LimitedCall]] = ContextVar("rate_limited_call", default=None)
+
+
+def permit_granted_at() -> Optional[float]:
+    """``perf_counter`` time the current task's last chat model call got its permit, if it needed one"""
+    call = _current_call.get()
+    return call.granted_at if call is not None else None
+
+
+class RateLimitCallbackHandler(AsyncCallbackHandler):
+    """LangChain callback that holds a rate limit permit for each chat model call.
+
+    The permit itself is taken by ``PermitGate``, which LangChain consults
+    after its cache lookup, so memoized answers never wait for provider
+    capacity. Permits of calls whose task is cancelled are given back.
+    """
+
+    # Awaited in the calling task, so the call is visible to PermitGate and tied to that task
+    run_inline = True
+
+    def __init__(self, limiter: RateLimiter, provider: str, key_id: str):
+        self.limiter = limiter
+        self.provider = provider
+        self.key_id = key_id
+        self._calls: RunRegistry[_LimitedCall] = RunRegistry(self._abandon)
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        # Rough prompt size; settled against the real usage when the call ends
+        characters = sum(len(str(message.content)) for batch in messages for message in batch)
+        call = _LimitedCall(self, characters // 4)
+        self._calls.add(run_id, call)
+        _current_call.set(call)
+
+    async def acquire(self, call: _LimitedCall) -> None:
+        """Wait for the permit of a call that missed the cache"""
+        started = time.perf_counter()
+        permit = await self.limiter.acquire(self.provider, self.key_id, call.tokens)
+        call.granted_at = time.perf_counter()
+        LLM_RATE_LIMIT_WAIT_SECONDS.labels(self.provider).observe(call.granted_at - started)
+        if call.closed:
+            await self.limiter.release(permit, cancelled=True)
+            return
+        call.permits.append(permit)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id)
+        if call is None:
+            return
+        call.closed = True
+        if not call.permits:
+            return
+
+        headers = None
+        tokens_used = None
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            tokens_used = usage["total_tokens"]
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "response_metadata", None) or {}
+                headers = headers or metadata.get("headers")
+                usage_metadata = getattr(message, "usage_metadata", None)
+                if tokens_used is None and usage_metadata:
+                    tokens_used = usage_metadata.get("total_tokens")
+
+        for permit in call.permits:
+            await self.limiter.release(permit, headers=headers, tokens_used=tokens_used)
+            tokens_used = None
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id)
+        if call is None:
+            return
+        call.closed = True
+        if not call.permits:
+            return
+
+        response = getattr(error, "response", None)
+        status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        headers = dict(getattr(response, "headers", None) or {})
+        for permit in call.permits:
+            await self.limiter.release(permit, headers=headers, rate_limited=status_code == 429)
+
+    def _abandon(self, call: _LimitedCall) -> None:
+        # The calling task ended without the call finishing (cancelled mid-flight)
+        call.closed = True
+        for permit in call.permits:
+            asyncio.get_running_loop().create_task(self.limiter.release(permit, cancelled=True))
+        call.permits = []
+
+
+class PermitGate(BaseRateLimiter):
+    """LangChain ``rate_limiter`` hook that takes the permit for the call in progress.
+
+    LangChain asks it right before a request goes to the provider, after the
+    cache lookup, so only calls that reach the provider use its capacity.
+    """
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        # Agents only make async calls; synchronous ones are not limited
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        call = _current_call.get()
+        if call is not None and not call.closed:
+            await call.handler.acquire(call)
+        return True
+
+
+permit_gate = PermitGate()
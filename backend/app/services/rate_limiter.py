@@ -0,0 +1,329 @@
+import os
+import re
+import math
+import time
+import asyncio
+import hashlib
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from app.services.shared_state import SharedState, shared_state
+
+# Requests per minute, tokens per minute and concurrent calls per provider
+DEFAULT_LIMITS = {
+    "openai": (500, 200000, 16),
+    "azure-openai": (300, 120000, 12),
+    "anthropic": (50, 80000, 8),
+    "gemini": (300, 1000000, 12),
+    "deepseek": (300, 300000, 12),
+}
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible id for an API key so budgets can be tracked per key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse reset headers like ``1.5``, ``6m0s``, ``20ms`` or an RFC 3339 timestamp"""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if parts:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return None
+
+
+class _Bucket:
+    """Request/token budgets plus an AIMD-controlled concurrency limit"""
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_concurrency: int):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.request_budget = float(rpm)
+        self.token_budget = float(tpm)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.pause_synced_at = 0.0
+        self.waiters: Deque[object] = deque()
+
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.acquired_total = 0
+        self.throttled_total = 0
+        self.cancelled_total = 0
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.request_budget = min(self.rpm, self.request_budget + elapsed * self.rpm / 60)
+        self.token_budget = min(self.tpm, self.token_budget + elapsed * self.tpm / 60)
+
+    def wait_time(self, tokens: int, now: float) -> Optional[float]:
+        """Seconds until a call costing ``tokens`` fits, or None when only a release can free room"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+        # A single call larger than the whole minute budget is let through once the budget is full
+        tokens = min(tokens, self.tpm)
+        waits = [0.0]
+        if self.request_budget < 1:
+            waits.append((1 - self.request_budget) * 60 / self.rpm)
+        if self.token_budget < tokens:
+            waits.append((tokens - self.token_budget) * 60 / self.tpm)
+        return max(waits)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "acquired_total": self.acquired_total,
+            "throttled_total": self.throttled_total,
+            "cancelled_total": self.cancelled_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+        }
+
+
+class _Ticket:
+    """A queued call: the key bucket it needs and the tokens it will spend"""
+
+    __slots__ = ("key_bucket", "tokens")
+
+    def __init__(self, key_bucket: _Bucket, tokens: int):
+        self.key_bucket = key_bucket
+        self.tokens = tokens
+
+
+class RateLimitPermit:
+    def __init__(self, buckets: List[_Bucket], tokens: int):
+        self.buckets = buckets
+        self.tokens = tokens
+
+
+class RateLimiter:
+    """Shared limiter for LLM calls across providers and API keys.
+
+    Every call needs room in its provider bucket and its API key bucket.
+    Callers queue in arrival order instead of failing; a call whose key is
+    out of budget or paused lets calls on other keys pass it. Concurrency
+    adapts AIMD-style per key: it grows by roughly one slot per round of
+    successful calls and halves on a 429, pausing that key until the
+    provider's reset time. Quotas are per key, so one key's 429 or rate
+    limit headers never throttle the others.
+
+    With several worker processes each one gets an equal share of the
+    budgets, and a 429 pause is published through the shared state so every
+    worker backs off, not just the one that was throttled.
+    """
+
+    def __init__(self, state: Optional[SharedState] = None, workers: Optional[int] = None):
+        self.state = state or shared_state
+        self.workers = max(1, workers if workers is not None else int(os.getenv("WEB_CONCURRENCY", "1")))
+        self._buckets: Dict[str, _Bucket] = {}
+        self._condition = asyncio.Condition()
+        self._pruned_at = time.monotonic()
+
+    def _limits(self, provider: str) -> tuple:
+        rpm, tpm, concurrency = DEFAULT_LIMITS.get(provider, (60, 100000, 4))
+        prefix = f"RATE_LIMIT_{provider.upper().replace('-', '_')}"
+        return (
+            max(1, int(os.getenv(f"{prefix}_RPM", rpm)) // self.workers),
+            max(1, int(os.getenv(f"{prefix}_TPM", tpm)) // self.workers),
+            max(1, math.ceil(int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)) / self.workers)),
+        )
+
+    def _bucket(self, name: str, provider: str) -> _Bucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = _Bucket(name, *self._limits(provider))
+            self._buckets[name] = bucket
+        return bucket
+
+    async def acquire(self, provider: str, key_id: str, tokens: int = 0) -> RateLimitPermit:
+        """Wait in line until the provider and key budgets allow another call"""
+        self._prune(time.monotonic())
+        provider_bucket = self._bucket(provider, provider)
+        key_bucket = self._bucket(f"{provider}:{key_id}", provider)
+        buckets = [provider_bucket, key_bucket]
+        ticket = _Ticket(key_bucket, tokens)
+        started = time.monotonic()
+        await self._sync_pauses(buckets, started)
+
+        async with self._condition:
+            for bucket in buckets:
+                bucket.waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    provider_bucket.refill(now)
+                    key_bucket.refill(now)
+                    key_wait = key_bucket.wait_time(tokens, now) if key_bucket.waiters[0] is ticket else None
+                    provider_wait = None
+                    if key_wait == 0 and self._next_ready(provider_bucket, now) is ticket:
+                        provider_wait = provider_bucket.wait_time(tokens, now)
+
+                    if key_wait == 0 and provider_wait == 0:
+                        break
+
+                    # Sleep until a budget refills or a release/arrival changes the picture
+                    timeouts = [wait for wait in (key_wait, provider_wait) if wait]
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), min(timeouts) if timeouts else None)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                for bucket in buckets:
+                    bucket.waiters.remove(ticket)
+                self._condition.notify_all()
+
+            waited = time.monotonic() - started
+            for bucket in buckets:
+                bucket.in_flight += 1
+                bucket.request_budget -= 1
+                bucket.token_budget -= tokens
+                bucket.acquired_total += 1
+                bucket.wait_seconds_total += waited
+                bucket.wait_seconds_max = max(bucket.wait_seconds_max, waited)
+
+        return RateLimitPermit(buckets, tokens)
+
+    @staticmethod
+    def _next_ready(provider_bucket: _Bucket, now: float) -> Optional[_Ticket]:
+        """The earliest caller whose own key could go now; callers on blocked keys are passed over"""
+        for ticket in provider_bucket.waiters:
+            key_bucket = ticket.key_bucket
+            if key_bucket.waiters[0] is not ticket:
+                continue
+            key_bucket.refill(now)
+            if key_bucket.wait_time(ticket.tokens, now) == 0:
+                return ticket
+        return None
+
+    def _prune(self, now: float) -> None:
+        # Drop key buckets that are idle with full budgets; a new one starts the same way
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        for name, bucket in list(self._buckets.items()):
+            if ":" not in name or bucket.in_flight or bucket.waiters or bucket.paused_until > now:
+                continue
+            bucket.refill(now)
+            if bucket.request_budget >= bucket.rpm and bucket.token_budget >= bucket.tpm:
+                del self._buckets[name]
+
+    async def release(
+        self,
+        permit: RateLimitPermit,
+        headers: Optional[Dict[str, str]] = None,
+        tokens_used: Optional[int] = None,
+        rate_limited: bool = False,
+        cancelled: bool = False
+    ) -> None:
+        """Return a permit and adapt the limits from the response.
+
+        A ``cancelled`` call never got a response, so it only frees its slot
+        and leaves the budgets and limits alone.
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.monotonic()
+        pauses = {}
+
+        async with self._condition:
+            for bucket in permit.buckets:
+                bucket.in_flight -= 1
+                if cancelled:
+                    bucket.cancelled_total += 1
+                    continue
+                if tokens_used is not None:
+                    # Settle the estimate against what the provider actually billed
+                    bucket.token_budget += permit.tokens - tokens_used
+                if rate_limited:
+                    bucket.throttled_total += 1
+
+            # 429s and rate limit headers describe the key's quota, so only its bucket adapts
+            key_bucket = permit.buckets[-1]
+            if rate_limited and not cancelled:
+                key_bucket.concurrency_limit = max(1.0, key_bucket.concurrency_limit / 2)
+                key_bucket.paused_until = max(key_bucket.paused_until, now + self._retry_after(headers, 1.0))
+                pauses[key_bucket.name] = key_bucket.paused_until - now
+            elif not cancelled:
+                key_bucket.concurrency_limit = min(
+                    float(key_bucket.max_concurrency),
+                    key_bucket.concurrency_limit + 1 / key_bucket.concurrency_limit
+                )
+                self._apply_remaining(key_bucket, headers, now)
+            self._condition.notify_all()
+
+        for name, seconds in pauses.items():
+            try:
+                await self.state.set(f"rate-limit-pause:{name}", time.time() + seconds, ttl=seconds)
+            except Exception as e:
+                print(f"Error publishing rate limit pause: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: bucket.metrics() for name, bucket in self._buckets.items() if ":" not in name}
+
+    async def _sync_pauses(self, buckets: List[_Bucket], now: float) -> None:
+        # Pick up pauses published by other workers, at most once a second per bucket
+        for bucket in buckets:
+            if now - bucket.pause_synced_at < 1.0:
+                continue
+            bucket.pause_synced_at = now
+            try:
+                paused_until = await self.state.get(f"rate-limit-pause:{bucket.name}")
+            except Exception as e:
+                print(f"Error reading rate limit pause: {str(e)}")
+                continue
+            if paused_until:
+                bucket.paused_until = max(bucket.paused_until, now + paused_until - time.time())
+
+    @staticmethod
+    def _retry_after(headers: Dict[str, str], default: float) -> float:
+        for name in ("retry-after", "x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset"):
+            if name in headers:
+                seconds = _parse_duration(headers[name])
+                if seconds is not None:
+                    return seconds
+        return default
+
+    @staticmethod
+    def _apply_remaining(bucket: _Bucket, headers: Dict[str, str], now: float) -> None:
+        # Trust the provider's view of the remaining budget when it reports one
+        for remaining_name, reset_name, attr in (
+            ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests", "request_budget"),
+            ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset", "request_budget"),
+            ("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens", "token_budget"),
+            ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset", "token_budget"),
+        ):
+            if remaining_name not in headers:
+                continue
+            try:
+                remaining = float(headers[remaining_name])
+            except ValueError:
+                continue
+            setattr(bucket, attr, min(getattr(bucket, attr), remaining))
+            if remaining <= 0 and reset_name in headers:
+                reset = _parse_duration(headers[reset_name])
+                if reset:
+                    bucket.paused_until = max(bucket.paused_until, now + reset)
+
+
+rate_limiter = RateLimiter()
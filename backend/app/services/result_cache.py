@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+BYPASS = "bypass"
+PREFER = "prefer"
+ONLY = "only"
+CACHE_MODES = (BYPASS, PREFER, ONLY)
+
+# Option keys read by the cache and not passed to the models
+CACHE_OPTION_KEYS = ("cache", "cache_ttl")
+
+Embedder = Callable[[str], List[float]]
+
+
+def normalize_task(task: str) -> str:
+    """Lowercase, drop surrounding punctuation and collapse whitespace"""
+    task = re.sub(r"\s+", " ", task.lower()).strip()
+    return task.strip(" .!?;,")
+
+
+def numeric_tokens(normalized: str) -> frozenset:
+    """Words with digits (versions, dates, prices) that a similar task must share exactly"""
+    return frozenset(word for word in normalized.split() if any(c.isdigit() for c in word))
+
+
+def hashing_embedder(text: str, dimensions: int = 256) -> List[float]:
+    """Local embedding with no model: hashed word and character-trigram counts, L2-normalized"""
+    vector = [0.0] * dimensions
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def load_embedder(name: Optional[str]) -> Optional[Embedder]:
+    """``hashing`` for the built-in embedder, a ``module:function`` path, or None to disable"""
+    if not name or name == "none":
+        return None
+    if name == "hashing":
+        return hashing_embedder
+    module_name, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class _Entry:
+    __slots__ = ("results", "size", "expires_at", "scope", "vector", "numbers")
+
+    def __init__(
+        self,
+        results: List[Dict[str, Any]],
+        size: int,
+        expires_at: float,
+        scope: str,
+        vector: Optional[List[float]],
+        numbers: frozenset,
+    ):
+        self.results = results
+        self.size = size
+        self.expires_at = expires_at
+        self.scope = scope
+        self.vector = vector
+        self.numbers = numbers
+
+
+class ResultCache:
+    """Opt-in cache of finished agent runs keyed by normalized task text and model.
+
+    Lookups try the exact key first. With an embedder configured they then
+    scan the stored vectors of the same user and model for the most similar
+    task above ``similarity_threshold`` that mentions the same numbers, so
+    "iPhone 15" never answers "iPhone 16". Entries expire after their own TTL
+    and the least recently used ones are evicted once ``max_entries`` or
+    ``max_bytes`` is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        embedder: Optional[Embedder] = None,
+        similarity_threshold: Optional[float] = None,
+    ):
+        """Initialize the cache from arguments or environment variables"""
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RESULT_CACHE_SIZE", "1000"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESULT_CACHE_TTL", "3600"))
+        self.embedder = embedder if embedder is not None else load_embedder(os.getenv("RESULT_CACHE_EMBEDDER"))
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else float(os.getenv("RESULT_CACHE_SIMILARITY", "0.88"))
+        )
+        self.default_mode = os.getenv("RESULT_CACHE_DEFAULT_MODE", BYPASS)
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def mode(self, options: Optional[Dict[str, Any]]) -> str:
+        mode = (options or {}).get("cache", self.default_mode)
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        return mode
+
+    def get(self, user_id: str, model: str, task: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached results for a task, or None on a miss"""
+        normalized = normalize_task(task)
+        key = self._key(user_id, model, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.results
+
+        if self.embedder is not None:
+            vector = self.embedder(normalized)
+            scope = self._scope(user_id, model)
+            numbers = numeric_tokens(normalized)
+            with self._lock:
+                best_key, best_score = None, self.similarity_threshold
+                for candidate_key, entry in list(self._entries.items()):
+                    if entry.scope != scope or entry.vector is None or entry.numbers != numbers:
+                        continue
+                    if self._live(candidate_key, now) is None:
+                        continue
+                    score = sum(a * b for a, b in zip(vector, entry.vector))
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.similar_hits += 1
+                    return self._entries[best_key].results
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, user_id: str, model: str, task: str, results: List[Dict[str, Any]], ttl: Optional[float] = None) -> None:
+        """Store the results of a finished run"""
+        ttl = self.ttl if ttl is None else ttl
+        size = len(json.dumps(results, default=str))
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        normalized = normalize_task(task)
+        key = self._key(user_id, model, normalized)
+        vector = self.embedder(normalized) if self.embedder is not None else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(
+                results, size, time.time() + ttl, self._scope(user_id, model), vector, numeric_tokens(normalized)
+            )
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    @staticmethod
+    def _scope(user_id: str, model: str) -> str:
+        return f"{user_id}\x00{model}"
+
+    def _key(self, user_id: str, model: str, normalized: str) -> str:
+        return hashlib.sha256(f"{self._scope(user_id, model)}\x00{normalized}".encode()).hexdigest()
+
+    def _live(self, key: str, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+result_cache = ResultCache()
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+
+class SharedState:
+    """Key-value state shared by every worker process.
+
+    Values are JSON-serializable and may expire after ``ttl`` seconds. The
+    in-process backend is the default for a single worker; the SQLite backend
+    is a stand-in for several workers on one host and for tests; Redis covers
+    several hosts.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add ``amount`` to an integer counter and return the new value"""
+        raise NotImplementedError
+
+    async def scan(self, prefix: str) -> Dict[str, Any]:
+        """Return every live key starting with ``prefix`` and its value"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySharedState(SharedState):
+    """State kept in a dict, visible to this process only.
+
+    Expired keys are swept every ``purge_interval`` seconds on write, and
+    once more than ``max_size`` keys are held the oldest keys with a TTL
+    are dropped, so keys that are written once and never read again do
+    not pile up.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, purge_interval: Optional[float] = None):
+        self.values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self.max_size = max_size if max_size is not None else int(os.getenv("SHARED_STATE_MAX_KEYS", "100000"))
+        self.purge_interval = purge_interval if purge_interval is not None else float(os.getenv("SHARED_STATE_PURGE_INTERVAL", "60"))
+        self._purged_at = time.time()
+
+    def _purge(self) -> None:
+        now = time.time()
+        if now - self._purged_at >= self.purge_interval:
+            self._purged_at = now
+            for key in [key for key, entry in self.values.items() if entry[1] is not None and entry[1] <= now]:
+                del self.values[key]
+        if len(self.values) > self.max_size:
+            # Dicts keep insertion order, so this drops the oldest expiring keys first
+            excess = len(self.values) - self.max_size
+            for key in [key for key, entry in self.values.items() if entry[1] is not None][:excess]:
+                del self.values[key]
+
+    def _live(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self.values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.values[key]
+            return None
+        return entry
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # Re-insert so the key counts as the newest when the size cap evicts
+        self.values.pop(key, None)
+        self.values[key] = (value, time.time() + ttl if ttl else None)
+        self._purge()
+
+    async def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._live(key)
+        value = (entry[0] if entry else 0) + amount
+        expires_at = entry[1] if entry else (time.time() + ttl if ttl else None)
+        self.values[key] = (value, expires_at)
+        self._purge()
+        return value
+
+    async def scan(self, prefix: str) -> Dict[str, Any]:
+        return {
+            key: entry[0] for key in list(self.values)
+            if key.startswith(prefix) and (entry := self._live(key)) is not None
+        }
+
+
+class SQLiteSharedState(SharedState):
+    """State in a SQLite file, shared by workers on one host"""
+
+    def __init__(self, path: str, purge_interval: Optional[float] = None):
+        self.path = path
+        self.purge_interval = purge_interval if purge_interval is not None else float(os.getenv("SHARED_STATE_PURGE_INTERVAL", "60"))
+        self._purged_at = time.time()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, default=str), now + ttl if ttl else None)
+            )
+            # Keys written once and never read again would otherwise stay forever
+            if now - self._purged_at >= self.purge_interval:
+                self._purged_at = now
+                db.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def _delete(self, key: str) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def _incr(self, key: str, amount: int, ttl: Optional[float]) -> int:
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT value, expires_at FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now)
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            expires_at = row[1] if row else (now + ttl if ttl else None)
+            db.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+        return value
+
+    def _scan(self, prefix: str) -> Dict[str, Any]:
+        now = time.time()
+        with self._connect() as db:
+            # Expired rows are only ever filtered on read, so sweep them here
+            db.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            rows = db.execute(
+                "SELECT key, value FROM shared_state WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await asyncio.to_thread(self._incr, key, amount, ttl)
+
+    async def scan(self, prefix: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._scan, prefix)
+
+
+class RedisSharedState(SharedState):
+    """State in Redis, shared by workers on any host"""
+
+    def __init__(self, url: str, namespace: str = "browser-use:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = await self.redis.get(self.namespace + key)
+        return json.loads(data) if data else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.redis.set(
+            self.namespace + key,
+            json.dumps(value, default=str),
+            px=int(ttl * 1000) if ttl else None
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.redis.delete(self.namespace + key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        name = self.namespace + key
+        value = await self.redis.incrby(name, amount)
+        if ttl and value == amount:
+            # First increment created the key
+            await self.redis.pexpire(name, int(ttl * 1000))
+        return value
+
+    async def scan(self, prefix: str) -> Dict[str, Any]:
+        values = {}
+        async for name in self.redis.scan_iter(match=f"{self.namespace}{prefix}*"):
+            data = await self.redis.get(name)
+            if data:
+                key = name.decode() if isinstance(name, bytes) else name
+                values[key[len(self.namespace):]] = json.loads(data)
+        return values
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_shared_state(url: Optional[str] = None) -> SharedState:
+    """Build the backend selected by ``SHARED_STATE`` (memory, sqlite:///path or redis://...)"""
+    url = url or os.getenv("SHARED_STATE", "memory")
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisSharedState(url)
+    return MemorySharedState()
+
+
+shared_state = create_shared_state()
@@ -0,0 +1,38 @@
+from typing import Any, Dict, List, Optional
+
+
+def serialize_action(action: Any) -> Dict[str, Any]:
+    """Convert an agent action into a JSON-safe dict"""
+    return {
+        "type": action.type,
+        "description": action.description,
+        "result": action.result,
+        "timestamp": action.timestamp.isoformat() if action.timestamp else None
+    }
+
+
+def serialize_step(step: Any, step_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Convert one agent step into the events sent to clients"""
+    events = [{
+        "type": "response",
+        "content": step.response
+    }]
+
+    if step.action:
+        action_data = serialize_action(step.action)
+        events.append({
+            "type": "action",
+            "content": f"Action: {step.action.description}",
+            "action_type": step.action.type,
+            "action_data": action_data
+        })
+
+    if step_id is not None:
+        for event in events:
+            event["step_id"] = step_id
+    return events
+
+
+def collect_actions(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pull the action payloads out of a list of serialized events"""
+    return [event["action_data"] for event in events if event.get("action_data")]
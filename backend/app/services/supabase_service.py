@@ -1,144 +1,302 @@
 import os
+import time
+import hashlib
+import httpx
 from typing import Dict, Any, Optional, List
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from app.services.shared_state import SharedState, shared_state
+from app.services.token_verifier import TokenVerifier, InvalidTokenError, decode_unverified
+from app.services.user_settings_cache import UserSettingsCache
+from app.utils.cache import TTLCache
+from app.utils.metrics import ERRORS, SUPABASE_REQUEST_SECONDS
+from app.utils.tracing import span
 
 load_dotenv()
 
+DEFAULT_PREFERENCES = {
+    "theme": "dark",
+    "default_model": "gpt-4o",
+    "auto_select": False
+}
+
 class SupabaseService:
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        state: Optional[SharedState] = None
+    ):
+        """Initialize a pooled async client for the Supabase Auth and PostgREST APIs"""
         supabase_url = os.getenv("VITE_SUPABASE_URL")
         supabase_key = os.getenv("VITE_SUPABASE_ANON_KEY")
         
         if not supabase_url or not supabase_key:
             raise ValueError("Supabase URL and anon key must be provided in .env file")
         
-        self.client: Client = create_client(supabase_url, supabase_key)
+        self.anon_key = supabase_key
+        # Table access runs as the calling user so row level security applies; the
+        # service role key is only for writes made outside a request (background logs)
+        self.service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        
+        # One keep-alive connection pool shared by every request in this process
+        self.client = httpx.AsyncClient(
+            base_url=supabase_url.rstrip("/"),
+            headers={"apikey": self.anon_key},
+            timeout=httpx.Timeout(
+                float(os.getenv("SUPABASE_TIMEOUT", "10")),
+                connect=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50")),
+                max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "60"))
+            ),
+            transport=transport
+        )
+        
+        # Resolved users keyed by token hash, expiring no later than the token itself;
+        # kept in memory and in the shared state so other workers skip the lookup too
+        self.state = state or shared_state
+        self.token_verifier = TokenVerifier()
+        self.token_cache = TTLCache(
+            max_size=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("TOKEN_CACHE_TTL", "300"))
+        )
+        
+        # Settings rows are fetched once per user and served from memory
+        self.settings_cache = UserSettingsCache(self._fetch_user_settings, state=self.state)
+    
+    async def close(self) -> None:
+        await self.client.aclose()
+    
+    async def _request(self, api: str, target: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request, timing it per API, path and method"""
+        started = time.perf_counter()
+        try:
+            with span(f"supabase.{api}", **{"supabase.target": target, "http.request.method": method}):
+                response = await self.client.request(method, url, **kwargs)
+                response.raise_for_status()
+            return response
+        except Exception:
+            ERRORS.labels("supabase").inc()
+            raise
+        finally:
+            SUPABASE_REQUEST_SECONDS.labels(api, target, method).observe(time.perf_counter() - started)
+    
+    async def _auth(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, str]] = None,
+        token: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Call the Supabase Auth (GoTrue) API"""
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        response = await self._request(
+            "auth", path, method, f"/auth/v1/{path}", json=json, params=params, headers=headers, **kwargs
+        )
+        return response.json()
+    
+    async def _rest(
+        self,
+        method: str,
+        table: str,
+        params: Optional[Dict[str, str]] = None,
+        json: Optional[Any] = None,
+        prefer: Optional[str] = None,
+        timeout: Optional[float] = None,
+        token: Optional[str] = None
+    ) -> Any:
+        """Call the PostgREST API for a table as the user holding ``token``.
+
+        Without a token the call falls back to the service role key, or to the
+        anon key when none is configured.
+        """
+        if token:
+            headers = {"Authorization": f"Bearer {token}"}
+        else:
+            key = self.service_key or self.anon_key
+            headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        if prefer:
+            headers["Prefer"] = prefer
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        response = await self._request(
+            "rest", table, method, f"/rest/v1/{table}", params=params, json=json, headers=headers, **kwargs
+        )
+        return response.json() if response.content else None
     
     async def create_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         try:
-            response = self.client.auth.sign_up({
+            response = await self._auth("POST", "signup", json={
                 "email": email,
                 "password": password
             })
             
-            # Create user settings record
-            if response.user:
-                self.client.table("user_settings").insert({
-                    "user_id": response.user.id,
+            # Auth returns the user directly, or wrapped in a session when auto-confirm is on
+            user = response.get("user") or (response if response.get("id") else None)
+            
+            # Create user settings record as the new user when signup returned a session;
+            # otherwise it is created with the first API key
+            if user and (response.get("access_token") or self.service_key):
+                await self._rest("POST", "user_settings", json={
+                    "user_id": user["id"],
                     "api_keys": {},
-                    "preferences": {
-                        "theme": "dark",
-                        "default_model": "gpt-4o",
-                        "auto_select": False
-                    }
-                }).execute()
+                    "preferences": DEFAULT_PREFERENCES
+                }, prefer="return=minimal", token=response.get("access_token"))
             
-            return response.user
+            return user
         except Exception as e:
             print(f"Error creating user: {str(e)}")
             return None
     
     async def authenticate_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         try:
-            response = self.client.auth.sign_in_with_password({
+            response = await self._auth("POST", "token", params={"grant_type": "password"}, json={
                 "email": email,
                 "password": password
             })
             
             return {
-                "user": response.user,
-                "access_token": response.session.access_token
+                "user": response["user"],
+                "access_token": response["access_token"]
             }
         except Exception as e:
             print(f"Error authenticating user: {str(e)}")
             return None
     
     async def get_user_by_token(self, token: str) -> Optional[Dict[str, Any]]:
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        user = self.token_cache.get(cache_key)
+        if user is not None:
+            return user
+        
         try:
-            # Set the auth token
-            self.client.auth.set_session(token)
+            shared = await self.state.get(f"auth-token:{cache_key}")
+            if shared is not None:
+                self.token_cache.set(cache_key, shared["user"], ttl=shared["expires_at"] - time.time())
+                return shared["user"]
             
-            # Get the user
-            user = self.client.auth.get_user()
+            # Verify signature and expiry locally when a secret or JWKS is configured
+            claims = self.token_verifier.verify(token)
+            if claims is not None:
+                user = self._user_from_claims(claims)
+            else:
+                # Fall back to Supabase Auth with the token scoped to this request
+                user = await self._auth("GET", "user", token=token)
+                if not user or not user.get("id"):
+                    return None
+                claims = decode_unverified(token)
             
-            if user and user.user:
-                return user.user
+            ttl = min(self.token_cache.ttl, claims.get("exp", 0) - time.time())
+            self.token_cache.set(cache_key, user, ttl=ttl)
+            if ttl > 0:
+                await self.state.set(
+                    f"auth-token:{cache_key}",
+                    {"user": user, "expires_at": time.time() + ttl},
+                    ttl=ttl
+                )
+            return user
+        except InvalidTokenError as e:
+            print(f"Rejected token: {str(e)}")
             return None
         except Exception as e:
             print(f"Error getting user by token: {str(e)}")
             return None
     
-    async def update_user_api_key(self, user_id: str, provider: str, encrypted_key: str) -> bool:
+    @staticmethod
+    def _user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the user payload Supabase Auth would return from verified JWT claims"""
+        return {
+            "id": claims["sub"],
+            "aud": claims.get("aud"),
+            "role": claims.get("role"),
+            "email": claims.get("email"),
+            "phone": claims.get("phone"),
+            "app_metadata": claims.get("app_metadata", {}),
+            "user_metadata": claims.get("user_metadata", {}),
+            "is_anonymous": claims.get("is_anonymous", False)
+        }
+    
+    async def update_user_api_key(self, user_id: str, provider: str, encrypted_key: str, token: Optional[str] = None) -> bool:
         try:
             # Get existing settings
-            settings = self.client.table("user_settings").select("*").eq("user_id", user_id).execute()
+            settings = await self._fetch_user_settings(user_id, token)
             
-            if not settings.data:
+            if not settings:
                 # Create settings if they don't exist
-                self.client.table("user_settings").insert({
+                await self._rest("POST", "user_settings", json={
                     "user_id": user_id,
                     "api_keys": {provider: encrypted_key},
-                    "preferences": {
-                        "theme": "dark",
-                        "default_model": "gpt-4o",
-                        "auto_select": False
-                    }
-                }).execute()
+                    "preferences": DEFAULT_PREFERENCES
+                }, prefer="return=minimal", token=token)
             else:
                 # Update existing settings
-                current_settings = settings.data[0]
-                api_keys = current_settings.get("api_keys", {})
+                api_keys = settings.get("api_keys") or {}
                 api_keys[provider] = encrypted_key
                 
-                self.client.table("user_settings").update({
+                await self._rest("PATCH", "user_settings", params={
+                    "user_id": f"eq.{user_id}"
+                }, json={
                     "api_keys": api_keys
-                }).eq("user_id", user_id).execute()
+                }, prefer="return=minimal", token=token)
             
+            await self.settings_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error updating user API key: {str(e)}")
             return False
     
-    async def check_user_api_key(self, user_id: str, provider: str) -> bool:
+    async def _fetch_user_settings(self, user_id: str, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        rows = await self._rest("GET", "user_settings", params={
+            "select": "*",
+            "user_id": f"eq.{user_id}",
+            "limit": "1"
+        }, token=token)
+        return rows[0] if rows else None
+    
+    async def check_user_api_key(self, user_id: str, provider: str, token: Optional[str] = None) -> bool:
         try:
-            settings = self.client.table("user_settings").select("api_keys").eq("user_id", user_id).execute()
-            
-            if not settings.data:
-                return False
-            
-            api_keys = settings.data[0].get("api_keys", {})
+            api_keys = await self.settings_cache.get_api_keys(user_id, token)
             return provider in api_keys and api_keys[provider] != ""
         except Exception as e:
             print(f"Error checking user API key: {str(e)}")
             return False
     
-    async def get_user_api_key(self, user_id: str, provider: str) -> Optional[str]:
+    async def get_user_api_key(self, user_id: str, provider: str, token: Optional[str] = None) -> Optional[str]:
         try:
-            settings = self.client.table("user_settings").select("api_keys").eq("user_id", user_id).execute()
-            
-            if not settings.data:
-                return None
-            
-            api_keys = settings.data[0].get("api_keys", {})
+            api_keys = await self.settings_cache.get_api_keys(user_id, token)
             return api_keys.get(provider)
         except Exception as e:
             print(f"Error getting user API key: {str(e)}")
             return None
     
-    async def log_interaction(self, user_id: str, model: str, task: str, status: str, 
+    async def get_user_preferences(self, user_id: str, token: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            return await self.settings_cache.get_preferences(user_id, token)
+        except Exception as e:
+            print(f"Error getting user preferences: {str(e)}")
+            return {}
+    
+    async def log_interaction(self, user_id: str, model: str, task: str, status: str,
                              actions: Optional[Dict[str, Any]] = None,
-                             results: Optional[Dict[str, Any]] = None) -> bool:
+                             results: Optional[Dict[str, Any]] = None,
+                             token: Optional[str] = None) -> bool:
         try:
-            self.client.table("interaction_logs").insert({
+            await self._rest("POST", "interaction_logs", json={
                 "user_id": user_id,
                 "model": model,
                 "task": task,
                 "status": status,
                 "actions": actions,
                 "results": results
-            }).execute()
+            }, prefer="return=minimal", token=token)
             return True
         except Exception as e:
             print(f"Error logging interaction: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
+    
+    async def log_interactions(self, rows: List[Dict[str, Any]], token: Optional[str] = None) -> None:
+        """Bulk insert interaction rows as the user holding ``token``, raising on failure so the caller can retry"""
+        await self._rest("POST", "interaction_logs", json=rows, prefer="return=minimal", token=token)
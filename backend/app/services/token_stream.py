@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+
+
+class TokenStreamHandler(AsyncCallbackHandler):
+    """LangChain callback that forwards streamed LLM tokens as ``delta`` events.
+
+    Deltas carry the id of the agent step being generated, which advances
+    through the agent's new-step callback or as the caller sees steps complete. Tokens produced on another thread (agents
+    driven by ``AgentRunner``'s thread pool) are handed back to the loop the
+    handler was created on.
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None]):
+        self.emit = emit
+        self.step_id = 1
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+
+    async def on_agent_step(self, state: Any, model_output: Any, step_number: int) -> None:
+        """``register_new_step_callback`` hook: later tokens belong to the next step"""
+        self.step_id = step_number
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        # Tool-call chunks stream with empty text; only forward visible output
+        if not token:
+            return
+        event = {
+            "type": "delta",
+            "step_id": self.step_id,
+            "content": token
+        }
+        if threading.get_ident() == self.loop_thread:
+            self.emit(event)
+        else:
+            self.loop.call_soon_threadsafe(self.emit, event)
+
+
+def with_token_streaming(llm: BaseChatModel, handler: TokenStreamHandler) -> BaseChatModel:
+    """Per-task copy of a pooled client that streams tokens to ``handler``.
+
+    The copy shares the pooled client's HTTP connections; only its callbacks
+    and streaming flag differ, so the pooled instance is left untouched.
+    Clients without a ``streaming`` flag keep their normal calls and only
+    send the step summaries.
+    """
+    update: Dict[str, Any] = {"callbacks": [*(llm.callbacks or []), handler]}
+    if "streaming" in type(llm).model_fields:
+        update["streaming"] = True
+    return llm.model_copy(update=update)
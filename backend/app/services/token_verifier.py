@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hmac
+import base64
+import hashlib
+from typing import Any, Dict, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+
+class InvalidTokenError(Exception):
+    """Raised when a token is definitely invalid (bad signature, expired, malformed)"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64_int(segment: str) -> int:
+    return int.from_bytes(_b64decode(segment), "big")
+
+
+def decode_unverified(token: str) -> Dict[str, Any]:
+    """Decode the JWT claims without checking the signature"""
+    try:
+        return json.loads(_b64decode(token.split(".")[1]))
+    except Exception as e:
+        raise InvalidTokenError(f"Malformed token: {str(e)}")
+
+
+class TokenVerifier:
+    """Verify Supabase access tokens locally from their JWT claims.
+
+    HS256 tokens are checked against ``SUPABASE_JWT_SECRET``; RS256/ES256
+    tokens against the keys in the JWKS file at ``SUPABASE_JWKS_PATH``.
+    ``verify`` returns ``None`` when no local key can check the token so the
+    caller can fall back to asking Supabase Auth.
+    """
+
+    _HASHES = {
+        "256": hashes.SHA256,
+        "384": hashes.SHA384,
+        "512": hashes.SHA512,
+    }
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        jwks_path: Optional[str] = None,
+        audience: Optional[str] = None,
+        leeway: Optional[float] = None,
+    ):
+        """Initialize the verifier from arguments or environment variables"""
+        secret = secret if secret is not None else os.getenv("SUPABASE_JWT_SECRET")
+        jwks_path = jwks_path if jwks_path is not None else os.getenv("SUPABASE_JWKS_PATH")
+
+        self.secret = secret.encode() if secret else None
+        self.audience = audience if audience is not None else os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+        self.leeway = leeway if leeway is not None else float(os.getenv("SUPABASE_JWT_LEEWAY", "5"))
+        self.public_keys: Dict[str, Any] = self._load_jwks(jwks_path) if jwks_path else {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.secret is not None or bool(self.public_keys)
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the verified claims, or ``None`` if no local key applies"""
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            signature = _b64decode(signature_segment)
+        except Exception as e:
+            raise InvalidTokenError(f"Malformed token: {str(e)}")
+
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        alg = header.get("alg", "")
+
+        if alg.startswith("HS"):
+            if self.secret is None or alg[2:] not in self._HASHES:
+                return None
+            digest = getattr(hashlib, f"sha{alg[2:]}")
+            expected = hmac.new(self.secret, signing_input, digest).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise InvalidTokenError("Invalid token signature")
+        elif alg[:2] in ("RS", "ES"):
+            key = self.public_keys.get(header.get("kid"))
+            if key is None or alg[2:] not in self._HASHES:
+                return None
+            self._verify_asymmetric(alg, key, signing_input, signature)
+        else:
+            return None
+
+        claims = decode_unverified(token)
+        self._check_claims(claims)
+        return claims
+
+    def _check_claims(self, claims: Dict[str, Any]) -> None:
+        now = time.time()
+        if "exp" not in claims or claims["exp"] + self.leeway < now:
+            raise InvalidTokenError("Token has expired")
+        if "nbf" in claims and claims["nbf"] - self.leeway > now:
+            raise InvalidTokenError("Token is not yet valid")
+        if not claims.get("sub"):
+            raise InvalidTokenError("Token has no subject")
+
+        if self.audience:
+            audience = claims.get("aud")
+            audiences = audience if isinstance(audience, list) else [audience]
+            if self.audience not in audiences:
+                raise InvalidTokenError("Token audience mismatch")
+
+    def _verify_asymmetric(self, alg: str, key: Any, signing_input: bytes, signature: bytes) -> None:
+        algorithm = self._HASHES[alg[2:]]()
+        try:
+            if alg.startswith("RS"):
+                key.verify(signature, signing_input, padding.PKCS1v15(), algorithm)
+            else:
+                # JWS carries raw r||s, cryptography expects DER
+                half = len(signature) // 2
+                der = encode_dss_signature(
+                    int.from_bytes(signature[:half], "big"),
+                    int.from_bytes(signature[half:], "big")
+                )
+                key.verify(der, signing_input, ec.ECDSA(algorithm))
+        except InvalidSignature:
+            raise InvalidTokenError("Invalid token signature")
+
+    @staticmethod
+    def _load_jwks(path: str) -> Dict[str, Any]:
+        curves = {"P-256": ec.SECP256R1(), "P-384": ec.SECP384R1(), "P-521": ec.SECP521R1()}
+        keys = {}
+        try:
+            with open(path, "r") as f:
+                jwks = json.load(f)
+        except Exception as e:
+            print(f"Error loading JWKS from {path}: {str(e)}")
+            return keys
+
+        for jwk in jwks.get("keys", []):
+            try:
+                if jwk.get("kty") == "RSA":
+                    key = rsa.RSAPublicNumbers(_b64_int(jwk["e"]), _b64_int(jwk["n"])).public_key()
+                elif jwk.get("kty") == "EC":
+                    key = ec.EllipticCurvePublicNumbers(
+                        _b64_int(jwk["x"]), _b64_int(jwk["y"]), curves[jwk["crv"]]
+                    ).public_key()
+                else:
+                    continue
+                keys[jwk.get("kid")] = key
+            except Exception as e:
+                print(f"Skipping unusable JWK {jwk.get('kid')}: {str(e)}")
+        return keys
@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.services.callback_runs import RunRegistry
+from app.services.llm_memo_cache import is_memoized
+from app.services.metrics_callback import token_usage
+from app.utils.tracing import record_error, start_span
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """LangChain callback opening a span per chat model call, under the agent step that makes it.
+
+    Spans of calls whose task is cancelled mid-flight are ended as cancelled.
+    """
+
+    # Started from the calling task so cancelled calls are noticed when it ends
+    run_inline = True
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._spans: RunRegistry[Any] = RunRegistry(self._abandon)
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        invocation_params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        params = invocation_params or {}
+        span = start_span("llm.chat", **{
+            "gen_ai.system": self.provider,
+            "gen_ai.request.model": params.get("model") or params.get("model_name") or params.get("deployment_name"),
+            "gen_ai.request.temperature": params.get("temperature"),
+        })
+        if span is not None:
+            self._spans.add(run_id, span)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id)
+        if span is None:
+            return
+        prompt_tokens, completion_tokens = token_usage(response)
+        span.set_attribute("gen_ai.usage.input_tokens", prompt_tokens)
+        span.set_attribute("gen_ai.usage.output_tokens", completion_tokens)
+        span.set_attribute("llm.memoized", is_memoized(response))
+        span.end()
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id)
+        if span is None:
+            return
+        record_error(span, error)
+        span.end()
+
+    @staticmethod
+    def _abandon(span: Any) -> None:
+        span.set_attribute("llm.cancelled", True)
+        span.end()
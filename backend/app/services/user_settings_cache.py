@@ -0,0 +1,102 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.shared_state import SharedState, shared_state
+from app.utils.cache import TTLCache
+
+
+class UserSettingsCache:
+    """Serve a user's ``user_settings`` row from memory after a single fetch.
+
+    Rows are loaded once per user and reused for key checks, key lookups and
+    preferences. ``invalidate`` drops the local copy and bumps a per-user
+    version in the shared state so other workers reload on their next
+    lookup; the TTL bounds staleness for changes made outside the API.
+    Loads run with the caller's token so row level security applies.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, Optional[str]], Awaitable[Optional[Dict[str, Any]]]],
+        ttl: Optional[float] = None,
+        max_size: Optional[int] = None,
+        state: Optional[SharedState] = None,
+    ):
+        """Initialize the cache with a coroutine that loads one settings row"""
+        self.loader = loader
+        self.cache = TTLCache(
+            max_size=max_size if max_size is not None else int(os.getenv("SETTINGS_CACHE_SIZE", "10000")),
+            ttl=ttl if ttl is not None else float(os.getenv("SETTINGS_CACHE_TTL", "300"))
+        )
+        self.state = state or shared_state
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.loads = 0
+
+    async def get(self, user_id: str, token: Optional[str] = None) -> Dict[str, Any]:
+        """Return the settings row for a user, or an empty dict if there is none"""
+        version = await self._version(user_id)
+        entry = self.cache.get(user_id)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+
+        # Share one in-flight load between concurrent callers for the same user
+        future = self._inflight.get(user_id)
+        if future is not None:
+            await asyncio.wait([future])
+            if not future.cancelled():
+                return future.result()
+            # The caller doing the load was cancelled; load it here instead
+            return await self.get(user_id, token)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            self.loads += 1
+            row = await self.loader(user_id, token) or {}
+            self.cache.set(user_id, (row, version))
+            future.set_result(row)
+            return row
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            # A cancelled load leaves the future pending; cancel it so waiters retry
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(user_id, None)
+
+    async def get_api_keys(self, user_id: str, token: Optional[str] = None) -> Dict[str, str]:
+        settings = await self.get(user_id, token)
+        return settings.get("api_keys") or {}
+
+    async def get_preferences(self, user_id: str, token: Optional[str] = None) -> Dict[str, Any]:
+        settings = await self.get(user_id, token)
+        return settings.get("preferences") or {}
+
+    async def invalidate(self, user_id: str, broadcast: bool = True) -> None:
+        """Drop the cached row locally and, by default, for every other worker"""
+        self.cache.delete(user_id)
+        if broadcast:
+            try:
+                await self.state.incr(self._version_key(user_id))
+            except Exception as e:
+                print(f"Error broadcasting settings invalidation: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = self.cache.metrics()
+        metrics["loads"] = self.loads
+        return metrics
+
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return f"settings-version:{user_id}"
+
+    async def _version(self, user_id: str) -> int:
+        try:
+            return await self.state.get(self._version_key(user_id)) or 0
+        except Exception as e:
+            print(f"Error reading settings version: {str(e)}")
+            return 0
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from starlette.websockets import WebSocketDisconnect
+
+from app.utils.tracing import current_trace_id
+
+# Event types merged with the previous queued event of the same step
+COALESCE_TYPES = ("delta",)
+# Event types where only the latest one matters, so a lagging client may skip some
+LOSSY_TYPES = ("thinking",)
+
+
+class WebSocketSendMetrics:
+    """Queue depth and send latency across every WebSocket in this process"""
+
+    def __init__(self, samples: int = 1000):
+        self.connections = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.sent_total = 0
+        self.coalesced_total = 0
+        self.summarized_total = 0
+        self.dropped_total = 0
+        self.slow_consumers_total = 0
+        self._latencies: Deque[float] = deque(maxlen=samples)
+
+    def record_send(self, latency: float) -> None:
+        self.sent_total += 1
+        self._latencies.append(latency)
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))] * 1000, 2)
+
+        return {
+            "connections": self.connections,
+            "queued": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "sent_total": self.sent_total,
+            "coalesced_total": self.coalesced_total,
+            "summarized_total": self.summarized_total,
+            "dropped_total": self.dropped_total,
+            "slow_consumers_total": self.slow_consumers_total,
+            "send_latency_ms_p50": percentile(50),
+            "send_latency_ms_p95": percentile(95),
+            "send_latency_ms_max": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+
+
+ws_send_metrics = WebSocketSendMetrics()
+
+
+class _Outbound:
+    __slots__ = ("event", "queued_at")
+
+    def __init__(self, event: Dict[str, Any], queued_at: float):
+        self.event = event
+        self.queued_at = queued_at
+
+
+class WebSocketSender:
+    """Bounded outbound queue drained by one writer task per connection.
+
+    Producers enqueue instead of writing to the socket, so a slow client
+    no longer stalls the agent loop until the queue fills. Consecutive
+    ``delta`` events for the same step are merged within ``coalesce_window``
+    seconds into one frame. Only the newest queued ``thinking`` event is
+    kept, and once the client lags behind by ``lag_threshold`` events new
+    ones are dropped. Other events wait for room and give up after
+    ``send_timeout`` seconds, which closes the connection.
+    """
+
+    def __init__(
+        self,
+        websocket: Any,
+        max_queue: Optional[int] = None,
+        coalesce_window: Optional[float] = None,
+        send_timeout: Optional[float] = None,
+        metrics: Optional[WebSocketSendMetrics] = None,
+    ):
+        """Initialize the sender from arguments or environment variables"""
+        self.websocket = websocket
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.coalesce_window = (
+            coalesce_window if coalesce_window is not None else float(os.getenv("WS_COALESCE_WINDOW_MS", "25")) / 1000
+        )
+        self.send_timeout = send_timeout if send_timeout is not None else float(os.getenv("WS_SEND_TIMEOUT", "30"))
+        self.lag_threshold = max(1, self.max_queue // 2)
+        self.metrics = metrics or ws_send_metrics
+
+        self._queue: Deque[_Outbound] = deque()
+        self._condition = asyncio.Condition()
+        self._writer: Optional[asyncio.Task] = None
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+    def start(self) -> None:
+        if self._writer is None:
+            self.metrics.connections += 1
+            self._writer = asyncio.create_task(self._run())
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        """Queue an event for the client, waiting only when the queue is full"""
+        if self._error is not None or self._closed:
+            raise WebSocketDisconnect()
+
+        # Frames carry the trace of the task (or connection) that sent them
+        trace_id = current_trace_id()
+        if trace_id is not None and "trace_id" not in event:
+            event = dict(event, trace_id=trace_id)
+
+        async with self._condition:
+            if self._merge(event):
+                return
+
+            if event.get("type") in LOSSY_TYPES and len(self._queue) >= self.lag_threshold:
+                self.metrics.dropped_total += 1
+                return
+
+            if len(self._queue) >= self.max_queue:
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: len(self._queue) < self.max_queue or self._error is not None),
+                        self.send_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.metrics.slow_consumers_total += 1
+                    self._error = TimeoutError("WebSocket client is not reading")
+                    # Drop the client for real, so the connection's receive loop ends too
+                    try:
+                        await self.websocket.close(code=1008)
+                    except Exception as e:
+                        print(f"Error closing slow WebSocket: {str(e)}")
+                    raise WebSocketDisconnect(code=1008)
+                if self._error is not None:
+                    raise WebSocketDisconnect()
+
+            self._queue.append(_Outbound(event, time.monotonic()))
+            self._set_depth(1)
+            self._condition.notify_all()
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Flush what is queued, within ``timeout`` seconds, and stop the writer"""
+        if self._writer is None:
+            return
+        self._closed = True
+        async with self._condition:
+            self._condition.notify_all()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._writer), timeout)
+        except Exception:
+            self._writer.cancel()
+        self._set_depth(-len(self._queue))
+        self._queue.clear()
+        self._writer = None
+        self.metrics.connections -= 1
+
+    def _merge(self, event: Dict[str, Any]) -> bool:
+        """Fold ``event`` into a queued one when the policy allows it"""
+        event_type = event.get("type")
+        if event_type in COALESCE_TYPES and self._queue:
+            tail = self._queue[-1]
+            if (
+                tail.event.get("type") == event_type
+                and self._same_stream(tail.event, event)
+                and time.monotonic() - tail.queued_at <= self.coalesce_window
+            ):
+                tail.event = dict(tail.event, content=tail.event.get("content", "") + event.get("content", ""))
+                self.metrics.coalesced_total += 1
+                return True
+
+        if event_type in LOSSY_TYPES:
+            for item in self._queue:
+                if item.event.get("type") == event_type and self._same_stream(item.event, event):
+                    skipped = item.event.get("skipped", 0) + 1
+                    item.event = dict(event, skipped=skipped)
+                    self.metrics.summarized_total += 1
+                    return True
+        return False
+
+    @staticmethod
+    def _same_stream(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        return a.get("task_id") == b.get("task_id") and a.get("step_id") == b.get("step_id")
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: self._queue or self._closed)
+                    if not self._queue:
+                        return
+                    head = self._queue[0]
+
+                # Give a fresh delta a moment to absorb the ones right behind it
+                if head.event.get("type") in COALESCE_TYPES and not self._closed:
+                    wait = self.coalesce_window - (time.monotonic() - head.queued_at)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+
+                async with self._condition:
+                    item = self._queue.popleft()
+                    self._set_depth(-1)
+                    self._condition.notify_all()
+
+                await self.websocket.send_text(json.dumps(item.event, default=str))
+                self.metrics.record_send(time.monotonic() - item.queued_at)
+        except Exception as e:
+            self._error = e
+            async with self._condition:
+                self._condition.notify_all()
+
+    def _set_depth(self, change: int) -> None:
+        self.metrics.queued += change
+        if change > 0:
+            self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, len(self._queue))
@@ -0,0 +1,152 @@
+"""Which route and task the event loop is working for.
+
+Diagnostics read this from their own threads, where the request's context
+variables are out of reach, so the activity is also kept per asyncio task.
+A task factory installed by ``enable`` copies the creating task's activity
+to every new task, so work spawned by a request or an agent run (queues,
+drivers, fan-out) is attributed to it as well. Work handed to a thread pool
+is attributed per thread with ``in_thread``. Nothing is recorded until a
+diagnostic calls ``enable``.
+"""
+import asyncio
+import weakref
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from app.utils.metrics import route_template
+
+
+class Activity:
+    """The request (by route template) and task id work is done for"""
+
+    __slots__ = ("scope", "name", "task_id")
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None, name: Optional[str] = None, task_id: Optional[str] = None):
+        self.scope = scope
+        self.name = name
+        self.task_id = task_id
+
+    @property
+    def route(self) -> str:
+        """``METHOD /route/{template}``, or the name given to work outside a request"""
+        if self.name is not None:
+            return self.name
+        if self.scope is None:
+            return "unknown"
+        method = self.scope.get("method", "WS")
+        # Resolved when read: the route is only known once the router has run
+        return f"{method} {route_template(self.scope) or 'unmatched'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"route": self.route, "task_id": self.task_id}
+
+
+current_activity: ContextVar[Optional[Activity]] = ContextVar("current_activity", default=None)
+
+_enabled = False
+_tasks: "weakref.WeakKeyDictionary[asyncio.Task, Activity]" = weakref.WeakKeyDictionary()
+_threads: Dict[int, Activity] = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """Start recording activities on ``loop`` (the running loop by default)"""
+    global _enabled
+
+    loop = loop or asyncio.get_running_loop()
+    if getattr(loop.get_task_factory(), "records_activity", False):
+        _enabled = True
+        return
+    previous = loop.get_task_factory()
+
+    def task_factory(loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> asyncio.Task:
+        task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+        activity = kwargs["context"].get(current_activity) if kwargs.get("context") else current_activity.get()
+        if activity is not None:
+            _tasks[task] = activity
+        return task
+
+    task_factory.records_activity = True
+    loop.set_task_factory(task_factory)
+    _enabled = True
+
+
+def attribute(name: Optional[str] = None, task_id: Optional[str] = None, scope: Optional[Dict[str, Any]] = None) -> None:
+    """Attribute the current task, and the tasks it starts, to a request, a named job or a task id.
+
+    Fields not given are inherited from the current activity.
+    """
+    if not _enabled:
+        return
+    parent = current_activity.get()
+    _set(Activity(
+        scope if scope is not None else (parent.scope if parent else None),
+        name if name is not None else (parent.name if parent else None),
+        task_id if task_id is not None else (parent.task_id if parent else None),
+    ))
+
+
+def _set(activity: Activity) -> None:
+    current_activity.set(activity)
+    task = asyncio.current_task()
+    if task is not None:
+        _tasks[task] = activity
+
+
+def for_task(task: Optional[asyncio.Task]) -> Optional[Activity]:
+    """The activity of a task; safe to call from another thread"""
+    if task is None:
+        return None
+    try:
+        return _tasks.get(task)
+    except (RuntimeError, TypeError):
+        return None
+
+
+@contextmanager
+def in_thread(activity: Optional[Activity]) -> Iterator[None]:
+    """Attribute the calling thread to ``activity`` for the block; executors don't carry context variables"""
+    if not _enabled or activity is None:
+        yield
+        return
+    ident = threading.get_ident()
+    _threads[ident] = activity
+    try:
+        yield
+    finally:
+        _threads.pop(ident, None)
+
+
+def for_thread(ident: int) -> Optional[Activity]:
+    """The activity a worker thread is running, by thread id"""
+    return _threads.get(ident)
+
+
+def threads() -> Dict[int, Activity]:
+    """A copy of every worker thread's activity; takes no locks, so signal handlers may call it"""
+    return dict(_threads)
+
+
+def running_task(loop: asyncio.AbstractEventLoop) -> Optional[asyncio.Task]:
+    """The task ``loop`` is running right now, read from another thread"""
+    try:
+        return asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+
+
+class ActivityMiddleware:
+    """ASGI middleware attributing each HTTP request and WebSocket connection to its route"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if _enabled and scope["type"] in ("http", "websocket"):
+            _set(Activity(scope))
+        await self.app(scope, receive, send)
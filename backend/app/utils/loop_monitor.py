@@ -0,0 +1,171 @@
+"""Event-loop lag sampling and blocking-call detection.
+
+A heartbeat coroutine wakes every ``interval`` seconds and records how late
+it ran. A watchdog thread checks the heartbeat; once it is more than
+``threshold`` seconds overdue, the loop is stuck in one callback, and the
+watchdog captures the loop thread's stack right then, while the blocking
+code is still on it. The stall is attributed to the route and task id of
+the task the loop was running (``app.utils.activity``). When the loop comes
+back, the heartbeat records how long the stall lasted.
+
+Off unless ``LOOP_DIAGNOSTICS=true``; read the results from
+``GET /api/admin/loop``.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.utils import activity
+
+
+class LoopMonitor:
+    """Samples event-loop lag and records callbacks that block the loop"""
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        threshold: Optional[float] = None,
+        max_events: Optional[int] = None,
+        stack_depth: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        """Initialize the monitor from arguments or environment variables"""
+        self.interval = interval if interval is not None else float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50")) / 1000
+        self.threshold = threshold if threshold is not None else float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+        self.stack_depth = stack_depth if stack_depth is not None else int(os.getenv("LOOP_STACK_DEPTH", "40"))
+        self.enabled = enabled if enabled is not None else os.getenv("LOOP_DIAGNOSTICS", "false").lower() == "true"
+
+        self._lags: Deque[float] = deque(maxlen=1000)
+        self._events: Deque[Dict[str, Any]] = deque(
+            maxlen=max_events if max_events is not None else int(os.getenv("LOOP_MONITOR_EVENTS", "100"))
+        )
+        self._by_route: Dict[str, Dict[str, float]] = {}
+        self._blocked_total = 0
+        self._blocked_seconds_total = 0.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._beat = 0.0
+        # Captured by the watchdog during a stall, completed by the heartbeat after it
+        self._pending: Optional[Dict[str, Any]] = None
+        self._captured_beat = 0.0
+
+    async def start(self) -> None:
+        if not self.enabled or self._heartbeat is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        activity.enable(self._loop)
+        self._beat = time.perf_counter()
+        self._stopping.clear()
+        self._heartbeat = asyncio.create_task(self._run_heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._heartbeat is None:
+            return
+        self._stopping.set()
+        self._heartbeat.cancel()
+        await asyncio.gather(self._heartbeat, return_exceptions=True)
+        self._heartbeat = None
+        self._watchdog.join(timeout=1)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Lag percentiles over the recent samples and stall counts by route"""
+        lags = sorted(self._lags)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(pct / 100 * len(lags)))] * 1000, 2)
+
+        return {
+            "enabled": self.enabled,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms_p50": percentile(50),
+            "lag_ms_p99": percentile(99),
+            "lag_ms_max": round(lags[-1] * 1000, 2) if lags else None,
+            "blocked_total": self._blocked_total,
+            "blocked_seconds_total": round(self._blocked_seconds_total, 3),
+            "by_route": {route: dict(stats) for route, stats in self._by_route.items()},
+        }
+
+    def events(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The most recent stalls, newest first"""
+        events = list(reversed(self._events))
+        return events[:limit] if limit is not None else events
+
+    def clear(self) -> None:
+        self._lags.clear()
+        self._events.clear()
+        self._by_route.clear()
+        self._blocked_total = 0
+        self._blocked_seconds_total = 0.0
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self._lags.append(lag)
+            previous, self._beat = self._beat, now
+
+            pending, self._pending = self._pending, None
+            # A stack captured just as the loop resumed belongs to the stall before this one
+            if pending is not None and pending.pop("beat") != previous:
+                pending = None
+            if lag < self.threshold and pending is None:
+                continue
+            # The watchdog missed stalls that ended between its checks; record them without a stack
+            self._record(pending or {"at": time.time() - lag, **self._describe(None), "stack": None}, lag)
+
+    def _record(self, event: Dict[str, Any], lag: float) -> None:
+        event["duration_ms"] = round(lag * 1000, 2)
+        self._events.append(event)
+        self._blocked_total += 1
+        self._blocked_seconds_total += lag
+
+        stats = self._by_route.setdefault(event["route"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] = round(stats["total_ms"] + lag * 1000, 2)
+        stats["max_ms"] = max(stats["max_ms"], event["duration_ms"])
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.threshold / 4):
+            beat = self._beat
+            # Overdue by the threshold: the loop has been inside one callback at least that long
+            if beat == self._captured_beat or time.perf_counter() - beat - self.interval < self.threshold:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame)[-self.stack_depth:] if frame is not None else []
+            task = activity.running_task(self._loop)
+            self._pending = {
+                "beat": beat,
+                "at": time.time() - (time.perf_counter() - beat),
+                **self._describe(task),
+                "stack": [line.rstrip() for line in stack],
+            }
+
+    @staticmethod
+    def _describe(task: Optional[asyncio.Task]) -> Dict[str, Any]:
+        current = activity.for_task(task)
+        return {
+            "route": current.route if current else "unknown",
+            "task_id": current.task_id if current else None,
+            "asyncio_task": task.get_name() if task is not None else None,
+        }
+
+
+loop_monitor = LoopMonitor()
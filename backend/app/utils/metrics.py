@@ -0,0 +1,263 @@
+"""Prometheus instrumentation.
+
+Hot paths only touch pre-registered metrics with a handful of bounded
+labels. Everything the services already count in their ``metrics()``
+dicts is read by ``ServiceCollector`` when ``/metrics`` is scraped, so it
+costs nothing between scrapes.
+
+With gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to a writable directory so
+the histograms and counters of every worker are merged on scrape. Values
+read from the services then come from the worker that serves the scrape.
+"""
+import os
+import time
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Request and call latencies, from a cached auth lookup to a slow agent step
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+OTHER = "other"
+
+# Keys of service metrics dicts that hold per-user values and would blow up label cardinality
+SKIPPED_KEYS = ("running_per_user", "by_route")
+
+
+class LabelLimiter:
+    """Caps how many distinct values a label takes; later values become ``other``"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._seen: set = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: Optional[str]) -> str:
+        value = value or "unknown"
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.limit:
+                self._seen.add(value)
+                return value
+        return OTHER
+
+
+model_label = LabelLimiter(int(os.getenv("METRICS_MAX_MODELS", "32")))
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open WebSocket connections",
+    multiprocess_mode="livesum",
+)
+AGENT_RUNS_IN_FLIGHT = Gauge(
+    "agent_runs_in_flight",
+    "Agent runs holding a browser context",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds",
+    "Chat model call latency per agent step",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time a chat model call waited for a rate limit permit",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_CALLS = Counter(
+    "llm_calls_total",
+    "Chat model calls by outcome (ok, error, memoized, cancelled)",
+    ["provider", "model", "outcome"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens billed by the provider",
+    ["provider", "model", "kind"],
+)
+BROWSER_LAUNCH_SECONDS = Histogram(
+    "browser_launch_duration_seconds",
+    "Time to launch a pooled browser",
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+SUPABASE_REQUEST_SECONDS = Histogram(
+    "supabase_request_duration_seconds",
+    "Supabase API call latency",
+    ["api", "target", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+DECRYPT_SECONDS = Histogram(
+    "api_key_decrypt_duration_seconds",
+    "Time to decrypt a stored provider API key",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+ERRORS = Counter(
+    "errors_total",
+    "Handled errors by component",
+    ["component"],
+)
+
+
+def route_template(scope: Dict[str, Any]) -> Optional[str]:
+    """Template of the route that matched, with its router prefix; None before routing or when nothing matched"""
+    # Recent FastAPI versions keep included routes unprefixed and put the full path here
+    effective = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(effective, "path", None) or getattr(scope.get("route"), "path", None)
+
+
+class PrometheusMiddleware:
+    """ASGI middleware timing HTTP requests by route template.
+
+    The route template (``/api/agent/jobs/{job_id}``) keeps the label
+    bounded; requests that match no route are labelled ``unmatched``.
+    WebSocket and lifespan traffic passes straight through.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                route_template(scope) or "unmatched",
+                str(status[0]),
+            ).observe(time.perf_counter() - started)
+
+
+def _flatten(prefix: str, value: Any) -> Iterable[tuple]:
+    """(name, number) pairs for the numeric leaves of a nested metrics dict"""
+    if isinstance(value, bool):
+        yield prefix, float(value)
+    elif isinstance(value, (int, float)):
+        yield prefix, float(value)
+    elif isinstance(value, dict):
+        for key, child in value.items():
+            if key not in SKIPPED_KEYS:
+                yield from _flatten(f"{prefix}_{key}", child)
+
+
+class ServiceCollector:
+    """Exposes the services' own ``metrics()`` counters at scrape time.
+
+    Names are ``browser_use_<section>_<key>``; totals become counters and
+    everything else gauges. Per-item lists (browsers, candidates) are skipped
+    to keep the series count fixed.
+    """
+
+    def _sections(self) -> Dict[str, Any]:
+        from app.services.agent_runner import agent_runner
+        from app.services.browser_pool import browser_pool
+        from app.services.browser_profiles import browser_profiles
+        from app.services.container import services
+        from app.services.llm_client_registry import llm_client_registry
+        from app.services.llm_memo import llm_memo
+        from app.services.page_profile import page_load_metrics
+        from app.services.result_cache import result_cache
+        from app.services.ws_sender import ws_send_metrics
+        from app.utils.loop_monitor import loop_monitor
+        from app.utils.profiler import profiler
+
+        sections = {
+            "agent_runner": agent_runner.metrics(),
+            "browser_pool": browser_pool.metrics(),
+            "browser_profiles": browser_profiles.metrics(),
+            "llm_clients": llm_client_registry.metrics(),
+            "llm_memo": llm_memo.metrics(),
+            "result_cache": result_cache.metrics(),
+            "websocket": ws_send_metrics.metrics(),
+            "page_loads": page_load_metrics.metrics(),
+            "event_loop": loop_monitor.metrics(),
+            "profiler": profiler.metrics(),
+        }
+        # Reading the container's services must not create them
+        if services._job_manager is not None:
+            sections["jobs"] = services.job_manager.metrics()
+        if services._interaction_logger is not None:
+            sections["interaction_logs"] = services.interaction_logger.metrics()
+        return sections
+
+    def describe(self) -> Iterable[Any]:
+        # Names depend on the services' dicts; nothing to check at registration
+        return []
+
+    def collect(self) -> Iterable[Any]:
+        try:
+            sections = self._sections()
+        except Exception as e:
+            print(f"Error collecting service metrics: {str(e)}")
+            return
+        for section, values in sections.items():
+            for name, value in _flatten(f"browser_use_{section}", values):
+                if name.endswith("_total"):
+                    family = CounterMetricFamily(name[:-len("_total")], f"{section} counter")
+                else:
+                    family = GaugeMetricFamily(name, f"{section} gauge")
+                family.add_metric([], value)
+                yield family
+
+        from app.services.rate_limiter import rate_limiter
+        queued = GaugeMetricFamily("browser_use_rate_limit_queued", "Calls waiting for rate limit budget", labels=["bucket"])
+        in_flight = GaugeMetricFamily("browser_use_rate_limit_in_flight", "Calls holding a rate limit permit", labels=["bucket"])
+        # Only the provider-wide buckets; per-key buckets would put key fingerprints in labels
+        for bucket, values in rate_limiter.metrics().items():
+            if ":" in bucket:
+                continue
+            queued.add_metric([bucket], values["queued"])
+            in_flight.add_metric([bucket], values["in_flight"])
+        yield queued
+        yield in_flight
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry a scrape reads: merged across workers in multiprocess mode"""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(ServiceCollector())
+    return registry
+
+
+def render_metrics() -> tuple:
+    """Body and content type for a ``/metrics`` response"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    REGISTRY.register(ServiceCollector())
@@ -0,0 +1,258 @@
+"""On-demand sampling profiler for the live worker process.
+
+At a fixed interval every thread's Python stack is read with
+``sys._current_frames()`` and identical stacks are counted, so the cost is
+one stack walk per interval and nothing is traced in between. It covers
+the event loop and the ``agent-step`` worker threads alike. When the loop
+runs on the main thread, as under uvicorn and gunicorn, samples are taken
+by a ``setitimer`` signal handler on the loop itself; otherwise by a
+sampler thread. With a task id, only samples taken while the loop, or a
+worker thread, was running that task are kept (``app.utils.activity``).
+
+Threads that are only waiting (selector, locks, queues) are left out
+unless ``idle`` is set, so the result reads as a CPU profile. Output is a
+collapsed-stack file (``flamegraph.pl``, speedscope) or a speedscope JSON
+document with one profile per thread.
+
+Off unless ``PROFILER_ENABLED=true``; run it with
+``GET /api/admin/profile``.
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import functools
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.utils import activity
+
+COLLAPSED = "collapsed"
+SPEEDSCOPE = "speedscope"
+FORMATS = (COLLAPSED, SPEEDSCOPE)
+
+# (function, file, first line)
+Frame = Tuple[str, str, int]
+# What one sample captures: every thread's frame, the loop's running task and the worker threads' activities
+Sample = Tuple[Dict[int, Any], Optional[asyncio.Task], Dict[int, activity.Activity]]
+
+# Leaf frames of threads blocked in C: waiting for work, a lock or I/O
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+class Profile:
+    """Stack counts collected by one profiling run"""
+
+    def __init__(self, interval: float, task_id: Optional[str] = None):
+        self.interval = interval
+        self.task_id = task_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def collapsed(self) -> str:
+        """``thread;outer;...;inner count`` lines, one per distinct stack"""
+        lines = []
+        for (thread, stack), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            frames = ";".join(_frame_name(frame) for frame in stack)
+            lines.append(f"{thread.replace(';', ',')};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """The speedscope file format, one sampled profile per thread"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+
+        for (thread, stack), count in self.stacks.items():
+            profile = profiles.setdefault(thread, {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration, 6),
+                "samples": [],
+                "weights": [],
+            })
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(index[frame])
+            profile["samples"].append(sample)
+            profile["weights"].append(round(count * self.interval, 6))
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"pid {os.getpid()}" + (f" task {self.task_id}" if self.task_id else ""),
+            "exporter": "browser-use-backend",
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda profile: profile["name"]),
+        }
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread in the process on demand"""
+
+    def __init__(self, interval: Optional[float] = None, max_seconds: Optional[float] = None, enabled: Optional[bool] = None):
+        """Initialize the profiler from arguments or environment variables"""
+        self.interval = interval if interval is not None else float(os.getenv("PROFILER_INTERVAL_MS", "10")) / 1000
+        self.max_seconds = max_seconds if max_seconds is not None else float(os.getenv("PROFILER_MAX_SECONDS", "120"))
+        self.enabled = enabled if enabled is not None else os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._running = threading.Lock()
+        self._stopping = threading.Event()
+        self._profiles = 0
+
+    async def start(self) -> None:
+        """Remember the serving loop and start recording which task it runs"""
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopping.clear()
+        activity.enable(self._loop)
+
+    async def stop(self) -> None:
+        """End a profile in progress early"""
+        self._stopping.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self._running.locked(),
+            "profiles_total": self._profiles,
+        }
+
+    async def profile(self, seconds: float, task_id: Optional[str] = None, idle: bool = False) -> Profile:
+        """Sample for ``seconds``; raises ProfilerBusy if a profile is already running"""
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            profile = Profile(self.interval, task_id)
+            seconds = min(seconds, self.max_seconds)
+            if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+                await self._sample_on_timer(profile, seconds, idle)
+            else:
+                await asyncio.to_thread(self._sample_on_thread, profile, seconds, idle)
+            return profile
+        finally:
+            self._profiles += 1
+            self._running.release()
+
+    async def _sample_on_timer(self, profile: Profile, seconds: float, idle: bool) -> None:
+        # The handler runs on the loop thread between two bytecodes, so the
+        # loop's own frame and running task are exactly what it was doing.
+        # It may interrupt code holding threading's internal locks, so it
+        # only takes snapshots; the loop aggregates them between sleeps.
+        # CPU time drives the timer; wall time when idle threads are wanted.
+        which, signum = (signal.ITIMER_REAL, signal.SIGALRM) if idle else (signal.ITIMER_PROF, signal.SIGPROF)
+        samples: Deque[Sample] = deque()
+
+        def handler(signum: int, frame: Any) -> None:
+            frames = sys._current_frames()
+            frames[threading.get_ident()] = frame
+            samples.append((frames, activity.running_task(self._loop), activity.threads()))
+
+        previous = signal.signal(signum, handler)
+        started = time.perf_counter()
+        signal.setitimer(which, self.interval, self.interval)
+        try:
+            while not self._stopping.is_set() and time.perf_counter() - started < seconds:
+                await asyncio.sleep(min(0.25, seconds - (time.perf_counter() - started)))
+                self._aggregate(profile, samples, idle)
+        finally:
+            signal.setitimer(which, 0)
+            signal.signal(signum, previous)
+            profile.duration = time.perf_counter() - started
+            self._aggregate(profile, samples, idle)
+
+    def _sample_on_thread(self, profile: Profile, seconds: float, idle: bool) -> None:
+        # Without a main-thread loop to signal, a thread reads the stacks. It
+        # only gets the GIL when the loop gives it up, mostly in select, so
+        # the loop's share of the samples is understated.
+        me = threading.get_ident()
+        started = time.perf_counter()
+        samples: Deque[Sample] = deque()
+
+        while not self._stopping.is_set():
+            tick = time.perf_counter()
+            if tick - started >= seconds:
+                break
+            frames = sys._current_frames()
+            frames.pop(me, None)
+            samples.append((frames, activity.running_task(self._loop), activity.threads()))
+            self._aggregate(profile, samples, idle)
+            # Keep the rate steady however long the stack walk took
+            self._stopping.wait(max(0.0, self.interval - (time.perf_counter() - tick)))
+
+        profile.duration = time.perf_counter() - started
+
+    def _aggregate(self, profile: Profile, samples: Deque[Sample], idle: bool) -> None:
+        """Fold the pending samples into the profile's stack counts"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while samples:
+            frames, task, threads = samples.popleft()
+            for ident, frame in frames.items():
+                if profile.task_id is not None and not self._runs_task(ident, task, threads, profile.task_id):
+                    continue
+                stack = _stack(frame)
+                if not idle and _is_idle(stack):
+                    continue
+                profile.stacks[(names.get(ident, f"thread-{ident}"), stack)] += 1
+                profile.samples += 1
+
+    def _runs_task(self, ident: int, task: Optional[asyncio.Task], threads: Dict[int, activity.Activity], task_id: str) -> bool:
+        current = activity.for_task(task) if ident == self._loop_thread else threads.get(ident)
+        return current is not None and current.task_id == task_id
+
+
+def _stack(frame: Any) -> Tuple[Frame, ...]:
+    """The frames from the thread's entry point to the running function"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((getattr(code, "co_qualname", code.co_name), _short_path(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _is_idle(stack: Tuple[Frame, ...]) -> bool:
+    if not stack:
+        return True
+    function, path, _ = stack[-1]
+    return (os.path.basename(path), function.rsplit(".", 1)[-1]) in IDLE_FRAMES
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(path: str) -> str:
+    # Library paths from the package root, application paths from the working directory
+    marker = path.rfind("site-packages" + os.sep)
+    if marker != -1:
+        return path[marker + len("site-packages" + os.sep):]
+    cwd = os.getcwd() + os.sep
+    return path[len(cwd):] if path.startswith(cwd) else path
+
+
+def _frame_name(frame: Frame) -> str:
+    # ';' separates frames in the collapsed format
+    return f"{frame[0]} ({frame[1]}:{frame[2]})".replace(";", ",")
+
+profiler = SamplingProfiler()
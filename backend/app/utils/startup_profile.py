@@ -0,0 +1,78 @@
+"""Import-time breakdown for the API process.
+
+Imports a module (``app.main`` by default) in a fresh interpreter with
+``-X importtime`` and reports where the time went, grouped by top-level
+package and by the slowest individual modules.
+
+Usage:
+    python -m app.utils.startup_profile [--module app.main] [--top 15]
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str = "app.main") -> List[Tuple[str, int, int, int]]:
+    """Return ``(module, self_us, cumulative_us, depth)`` for every import made by ``module``"""
+    env = dict(os.environ)
+    # Keep the profiled import free of side effects such as the browser pre-warm
+    env.setdefault("BROWSER_POOL_PREWARM", "false")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "import failed")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int, int]], top: int) -> Dict[str, List[Tuple[str, float]]]:
+    """Group self time by top-level package and list the slowest modules by cumulative time"""
+    packages: Dict[str, int] = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    by_package = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    by_module = sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+    return {
+        "packages": [(name, us / 1000) for name, us in by_package],
+        "modules": [(name, cumulative_us / 1000) for name, _, cumulative_us, _ in by_module],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total_ms = sum(self_us for _, self_us, _, _ in rows) / 1000
+    summary = summarize(rows, args.top)
+
+    print(f"import {args.module}: {total_ms:.1f} ms across {len(rows)} modules\n")
+    print(f"{'package':<40} {'self ms':>10}")
+    for name, ms in summary["packages"]:
+        print(f"{name:<40} {ms:>10.1f}")
+    print(f"\n{'module':<60} {'cumulative ms':>14}")
+    for name, ms in summary["modules"]:
+        print(f"{name:<60} {ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
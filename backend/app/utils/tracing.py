@@ -0,0 +1,242 @@
+"""OpenTelemetry tracing.
+
+Tracing is off unless ``TRACING_EXPORTER`` names an exporter and the
+``opentelemetry-sdk`` package is installed; until then ``span`` only checks
+one module global, so call sites don't need guards. Spans cover the route
+phases, each agent step, its browser work and every chat model call.
+
+Exporters:
+
+- ``otlp`` - OTLP over HTTP (``opentelemetry-exporter-otlp-proto-http``),
+  configured with the standard ``OTEL_EXPORTER_OTLP_*`` variables
+- ``file`` - one JSON span per line appended to ``TRACING_FILE``
+- ``console`` - JSON spans on stdout
+- ``memory`` - kept in ``memory_exporter()`` for tests and benchmarks
+"""
+import os
+import sys
+import functools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+EXPORTERS = ("otlp", "file", "console", "memory")
+
+# Set by setup_tracing() once an exporter is configured
+_tracer: Any = None
+_provider: Any = None
+_memory_exporter: Any = None
+
+
+def _create_exporter(name: str) -> Any:
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    if name == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        return InMemorySpanExporter()
+    out = open(os.getenv("TRACING_FILE", "/tmp/traces.jsonl"), "a", buffering=1) if name == "file" else sys.stdout
+    return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def setup_tracing(exporter: Optional[str] = None, sample_ratio: Optional[float] = None) -> bool:
+    """Install a tracer provider for ``exporter`` (``TRACING_EXPORTER``); returns whether tracing is on.
+
+    ``sample_ratio`` (``TRACING_SAMPLE_RATIO``, default 1) is the share of
+    new traces recorded; child spans follow their parent's decision, so a
+    trace continued from an incoming ``traceparent`` header keeps the
+    caller's choice.
+    """
+    global _tracer, _provider, _memory_exporter
+
+    if _tracer is not None:
+        return True
+    exporter = (exporter if exporter is not None else os.getenv("TRACING_EXPORTER", "")).lower()
+    if not exporter or exporter == "none":
+        return False
+    if exporter not in EXPORTERS:
+        print(f"Unknown TRACING_EXPORTER {exporter}; tracing disabled")
+        return False
+    if sample_ratio is None:
+        sample_ratio = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+        span_exporter = _create_exporter(exporter)
+    except ImportError as e:
+        print(f"Tracing disabled, OpenTelemetry is not installed: {str(e)}")
+        return False
+
+    resource = Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "browser-use-backend")})
+    provider = TracerProvider(resource=resource, sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    # Tests read spans as soon as they end; remote exporters send in batches off the request path
+    if exporter == "otlp":
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    else:
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+
+    _provider = provider
+    _memory_exporter = span_exporter if exporter == "memory" else None
+    _tracer = provider.get_tracer("app")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans and turn tracing off"""
+    global _tracer, _provider, _memory_exporter
+
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = _memory_exporter = None
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def memory_exporter() -> Any:
+    """The ``InMemorySpanExporter`` when ``TRACING_EXPORTER=memory``, else None"""
+    return _memory_exporter
+
+
+@contextmanager
+def span(name: str, context: Any = None, links: Any = None, **attributes: Any) -> Iterator[Any]:
+    """Run the block in a child span of the current (or given) context; yields None when tracing is off"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(
+        name,
+        context=context,
+        links=links,
+        attributes={k: v for k, v in attributes.items() if v is not None}
+    ) as current:
+        yield current
+
+
+def start_span(name: str, **attributes: Any) -> Any:
+    """A child span of the current context that the caller ends; None when tracing is off"""
+    if _tracer is None:
+        return None
+    return _tracer.start_span(name, attributes={k: v for k, v in attributes.items() if v is not None})
+
+
+def current_context() -> Any:
+    """The active context, to parent spans started later from another task"""
+    if _tracer is None:
+        return None
+    from opentelemetry import context
+
+    return context.get_current()
+
+
+def empty_context() -> Any:
+    """A context without a parent, so a span under it starts a new trace"""
+    if _tracer is None:
+        return None
+    from opentelemetry import context
+
+    return context.Context()
+
+
+def link_to_current() -> Any:
+    """A link to the current span, to relate a new trace to the one that started it"""
+    if _tracer is None:
+        return None
+    from opentelemetry import trace
+
+    span_context = trace.get_current_span().get_span_context()
+    return [trace.Link(span_context)] if span_context.is_valid else None
+
+
+def extract_context(headers: Dict[str, str]) -> Any:
+    """The caller's context from W3C ``traceparent`` headers"""
+    if _tracer is None:
+        return None
+    from opentelemetry import propagate
+
+    return propagate.extract(headers)
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex id of the trace the current span belongs to"""
+    if _tracer is None:
+        return None
+    from opentelemetry import trace
+
+    span_context = trace.get_current_span().get_span_context()
+    return format(span_context.trace_id, "032x") if span_context.is_valid else None
+
+
+def record_error(current: Any, error: BaseException) -> None:
+    if current is not None:
+        from opentelemetry.trace import Status, StatusCode
+
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+
+
+def trace_method(obj: Any, method: str, name: str, attributes: Optional[Callable[[Any], Dict[str, Any]]] = None) -> None:
+    """Wrap one instance's coroutine method so every call runs in a span"""
+    if _tracer is None:
+        return
+    original = getattr(obj, method)
+
+    @functools.wraps(original)
+    async def traced(*args: Any, **kwargs: Any) -> Any:
+        with span(name, **(attributes(obj) if attributes else {})):
+            return await original(*args, **kwargs)
+
+    setattr(obj, method, traced)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per HTTP request and WebSocket connection.
+
+    The span continues an incoming ``traceparent`` and is renamed to the
+    matched route template once routing is done.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if _tracer is None or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        from opentelemetry.trace import SpanKind
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        method = scope.get("method", "WS")
+        status = [None]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        with _tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            context=extract_context(headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope["path"]}
+        ) as current:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                from app.utils.metrics import route_template
+
+                route = route_template(scope)
+                if route is not None:
+                    current.update_name(f"{method} {route}")
+                    current.set_attribute("http.route", route)
+                if status[0] is not None:
+                    current.set_attribute("http.response.status_code", status[0])
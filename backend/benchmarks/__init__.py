@@ -0,0 +1 @@
+# Benchmarks for Browser Use backend
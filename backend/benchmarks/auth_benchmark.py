@@ -0,0 +1,55 @@
+"""Auth overhead benchmark for SupabaseService.get_user_by_token.
+
+Compares three resolution paths for the same access token against the
+in-memory Supabase stand-in with a simulated round trip:
+
+- ``remote``: every call goes to Supabase Auth
+- ``local``: signature and expiry verified locally, cache disabled
+- ``cached``: local verification plus the token cache
+
+Usage:
+    python -m benchmarks.auth_benchmark --calls 200 --rtt-ms 40
+"""
+import os
+import time
+import argparse
+import asyncio
+
+os.environ.setdefault("VITE_SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("VITE_SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.services.supabase_service import SupabaseService
+from app.services.token_verifier import TokenVerifier
+from benchmarks.stub_supabase import StubSupabase
+
+
+async def measure(mode: str, calls: int, rtt_seconds: float) -> float:
+    stub = StubSupabase(latency=rtt_seconds)
+    service = SupabaseService(transport=stub.transport())
+    service.token_verifier = TokenVerifier(secret=stub.jwt_secret if mode != "remote" else "")
+    token = stub.issue_token(stub.add_user("bench@example.com", "benchmark"))
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        if mode != "cached":
+            service.token_cache.clear()
+        user = await service.get_user_by_token(token)
+        assert user is not None
+    elapsed = time.perf_counter() - started
+    await service.close()
+    return elapsed / calls * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    for mode in ("remote", "local", "cached"):
+        per_call = asyncio.run(measure(mode, args.calls, args.rtt_ms / 1000))
+        print(f"{mode:>6}: {per_call:.4f} ms per get_user_by_token")
+
+
+if __name__ == "__main__":
+    main()
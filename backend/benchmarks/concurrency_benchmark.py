@@ -0,0 +1,104 @@
+"""Concurrency benchmark for the agent execution engine.
+
+Runs N fake browsing sessions whose steps block like a synchronous browser
+driver, while a probe coroutine measures how late the event loop serves an
+unrelated request. Compares driving steps inline (the old ``for step in
+agent.run()`` loop) with driving them through ``AgentRunner``.
+
+Usage:
+    python -m benchmarks.concurrency_benchmark --sessions 8 --steps 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from app.services.agent_runner import AgentRunner
+
+
+class FakeAgent:
+    """Agent stand-in whose steps block the calling thread"""
+
+    def __init__(self, steps: int, step_seconds: float):
+        self.steps = steps
+        self.step_seconds = step_seconds
+
+    def run(self):
+        for i in range(self.steps):
+            time.sleep(self.step_seconds)
+            yield {"step": i}
+
+
+async def run_inline(agent: FakeAgent) -> int:
+    count = 0
+    for _ in agent.run():
+        count += 1
+        await asyncio.sleep(0)
+    return count
+
+
+async def run_with_runner(runner: AgentRunner, agent: FakeAgent) -> int:
+    count = 0
+    async for _ in runner.iterate(agent):
+        count += 1
+    return count
+
+
+async def probe(stop: asyncio.Event, interval: float, samples: List[float]) -> None:
+    """Simulate an unrelated endpoint and record how late each tick is served"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure(mode: str, sessions: int, steps: int, step_seconds: float) -> Dict[str, float]:
+    runner = AgentRunner(max_workers=sessions)
+    samples: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, 0.01, samples))
+
+    started = time.perf_counter()
+    agents = [FakeAgent(steps, step_seconds) for _ in range(sessions)]
+    if mode == "inline":
+        await asyncio.gather(*(run_inline(agent) for agent in agents))
+    else:
+        await asyncio.gather(*(run_with_runner(runner, agent) for agent in agents))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    runner.shutdown()
+
+    return {
+        "wall_seconds": round(elapsed, 3),
+        "probe_p50_ms": round(percentile(samples, 50), 2),
+        "probe_p99_ms": round(percentile(samples, 99), 2),
+        "probe_max_ms": round(max(samples) if samples else 0.0, 2),
+        "probe_mean_ms": round(statistics.fmean(samples) if samples else 0.0, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--step-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for mode in ("inline", "runner"):
+        result = asyncio.run(measure(mode, args.sessions, args.steps, args.step_seconds))
+        print(f"{mode:>6}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Deterministic chat model that drives browser_use through a fixed script.
+
+``ScriptedChatModel`` answers every agent step with the ``AgentOutput`` tool
+call browser_use expects: open the first URL in the task, scroll down
+``scroll_steps`` times, then finish with ``done``. The step is worked out
+from the model outputs already in the conversation, so one client serves
+any number of concurrent agents and every run takes the same path.
+
+``FakeProviderService`` is the provider adapter for it; ``register()`` maps
+the ``fake-browser`` model to it in the provider registry.
+"""
+import re
+import time
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.services.base_provider_service import BaseProviderService
+
+MODEL = "fake-browser"
+PROVIDER = "fake"
+
+TASK_PATTERN = re.compile(r'ultimate task is: """(.*?)"""', re.DOTALL)
+URL_PATTERN = re.compile(r"https?://[^\s\"'<>]+")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model replaying a go_to_url, scroll_down..., done script"""
+
+    model_name: str = MODEL
+    latency: float = 0.0
+    scroll_steps: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        # Answers are always the AgentOutput tool call, whatever tools are offered
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        # browser_use seeds the conversation with one example tool call
+        step = max(0, sum(1 for m in messages if isinstance(m, AIMessage) and m.tool_calls) - 1)
+        url = self._task_url(messages)
+
+        if step == 0:
+            action = {"go_to_url": {"url": url}}
+        elif step <= self.scroll_steps:
+            action = {"scroll_down": {}}
+        else:
+            action = {"done": {"text": f"Visited {url}", "success": True}}
+
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return AIMessage(
+            content="",
+            tool_calls=[{
+                "name": "AgentOutput",
+                "args": {
+                    "current_state": {
+                        "evaluation_previous_goal": "Success" if step else "Unknown",
+                        "memory": f"Step {step + 1} of {self.scroll_steps + 2}",
+                        "next_goal": next(iter(action)),
+                    },
+                    "action": [action],
+                },
+                "id": f"call_{step}",
+                "type": "tool_call",
+            }],
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": 40, "total_tokens": prompt_tokens + 40},
+        )
+
+    @staticmethod
+    def _task_url(messages: List[BaseMessage]) -> str:
+        for message in messages:
+            task = TASK_PATTERN.search(str(message.content))
+            if task:
+                url = URL_PATTERN.search(task.group(1))
+                if url:
+                    return url.group(0)
+        return "about:blank"
+
+
+class FakeProviderService(BaseProviderService):
+    """Provider adapter serving ``ScriptedChatModel``; the API key is ignored"""
+
+    provider = PROVIDER
+    display_name = "Scripted benchmark model"
+
+    def build_llm(self, model: str, options: Dict[str, Any] = None) -> BaseChatModel:
+        if options is None:
+            options = {}
+
+        return ScriptedChatModel(
+            model_name=model,
+            latency=float(options.get("llm_latency_ms", 0)) / 1000,
+            scroll_steps=int(options.get("scroll_steps", 1)),
+            callbacks=self.llm_callbacks(),
+        )
+
+
+def register() -> None:
+    """Route the ``fake-browser`` model to ``FakeProviderService``"""
+    from app.services.provider_registry import provider_registry
+
+    provider_registry.adapters[PROVIDER] = f"{__name__}:FakeProviderService"
+    provider_registry.models[MODEL] = PROVIDER
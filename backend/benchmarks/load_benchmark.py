@@ -0,0 +1,335 @@
+"""Load benchmark for the task endpoints, with no network access.
+
+The app is served in-process by uvicorn on its own thread and event loop.
+Supabase is the in-memory stand-in, the model is the scripted
+``fake-browser`` chat model (``benchmarks.fake_llm``), and the browser
+drives the static site from ``page_load_benchmark``. Each of
+``--concurrency`` virtual users has its own account and runs ``--tasks``
+tasks one after another through ``POST /api/agent/execute`` (submit, then
+long-poll the job) and through ``/api/agent/ws``.
+
+For each endpoint the report has latency percentiles, throughput, the
+event-loop lag of the server loop (how late a 10 ms timer fires), and RSS of
+the process and its browsers above the idle baseline, divided by the
+concurrency to give memory per agent. Results are written as JSON, and
+``--compare`` prints the change against an earlier results file.
+
+Usage:
+    python -m benchmarks.load_benchmark --concurrency 4 --tasks 5 --output load.json
+    python -m benchmarks.load_benchmark --concurrency 4 --tasks 5 --compare load.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional
+
+from cryptography.fernet import Fernet
+
+from benchmarks.stub_supabase import StubSupabase
+
+os.environ.setdefault("VITE_SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("VITE_SUPABASE_ANON_KEY", "benchmark-anon-key")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+# Tokens from the stand-in verify locally, as with a configured JWT secret in production
+os.environ.setdefault("SUPABASE_JWT_SECRET", StubSupabase().jwt_secret)
+# The scripted model shouldn't be throttled like a real provider
+os.environ.setdefault("RATE_LIMIT_FAKE_RPM", "1000000")
+os.environ.setdefault("RATE_LIMIT_FAKE_TPM", "1000000000")
+os.environ.setdefault("RATE_LIMIT_FAKE_CONCURRENCY", "1000")
+
+import httpx
+import psutil
+import uvicorn
+import websockets
+
+from app.main import app
+from app.services.container import services
+from app.services.supabase_service import SupabaseService
+from benchmarks import fake_llm
+from benchmarks.concurrency_benchmark import percentile
+from benchmarks.page_load_benchmark import StaticSite
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# Metrics shown by --compare; lower is better for all of them except throughput
+COMPARED = ("latency_ms_p50", "latency_ms_p95", "latency_ms_p99", "throughput_per_s", "loop_lag_ms_p99", "rss_per_agent_mb")
+
+
+class AppServer:
+    """The app served by uvicorn on a background thread, with a loop-lag probe on the server loop"""
+
+    def __init__(self, probe_interval: float = 0.01):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        self.probe_interval = probe_interval
+        self.lag_ms: List[float] = []
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+    @property
+    def port(self) -> int:
+        return self.server.servers[0].sockets[0].getsockname()[1]
+
+    def take_lag(self) -> List[float]:
+        samples, self.lag_ms = self.lag_ms, []
+        return samples
+
+    async def _serve(self) -> None:
+        probe = asyncio.create_task(self._probe())
+        try:
+            await self.server.serve()
+        finally:
+            probe.cancel()
+
+    async def _probe(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.probe_interval)
+            self.lag_ms.append((time.perf_counter() - started - self.probe_interval) * 1000)
+
+
+class RSSSampler:
+    """Peak resident memory of this process and its children (the browsers)"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+
+    def sample(self) -> int:
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, total)
+        return total
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+def task_text(site_url: str, n: int) -> str:
+    return f"Open {site_url}/page/{n % 64} and report the heading"
+
+
+async def execute_user(base_url: str, token: str, site_url: str, tasks: int, options: Dict[str, Any], samples: Dict[str, List]) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120) as client:
+        for n in range(tasks):
+            started = time.perf_counter()
+            response = await client.post("/api/agent/execute", json={
+                "model": fake_llm.MODEL,
+                "task": task_text(site_url, n),
+                "options": options
+            })
+            if response.status_code != 202:
+                samples["errors"].append(response.text)
+                continue
+            samples["submit_ms"].append((time.perf_counter() - started) * 1000)
+
+            job_id = response.json()["job_id"]
+            after = 0
+            while True:
+                job = (await client.get(f"/api/agent/jobs/{job_id}", params={"wait": 30, "after": after})).json()
+                after = job["result_count"]
+                if job["status"] in TERMINAL_STATUSES:
+                    break
+            samples["latency_ms"].append((time.perf_counter() - started) * 1000)
+            if job["status"] != "completed":
+                samples["errors"].append(job["error"] or job["status"])
+
+
+async def ws_user(ws_url: str, token: str, site_url: str, tasks: int, options: Dict[str, Any], samples: Dict[str, List]) -> None:
+    async with websockets.connect(ws_url, max_size=None) as websocket:
+        await websocket.send(json.dumps({"token": token}))
+        await websocket.recv()
+        for n in range(tasks):
+            started = time.perf_counter()
+            first_event = None
+            await websocket.send(json.dumps({
+                "model": fake_llm.MODEL,
+                "task": task_text(site_url, n),
+                "task_id": str(n),
+                "options": options
+            }))
+            while True:
+                event = json.loads(await websocket.recv())
+                if first_event is None:
+                    first_event = time.perf_counter() - started
+                if event["type"] == "done":
+                    break
+            samples["latency_ms"].append((time.perf_counter() - started) * 1000)
+            samples["first_event_ms"].append(first_event * 1000)
+            if event["status"] != "completed":
+                samples["errors"].append(event["status"])
+
+
+def summarize(samples: Dict[str, List], elapsed: float, lag_ms: List[float], rss: RSSSampler, baseline_rss: int, concurrency: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "tasks": len(samples["latency_ms"]),
+        "errors": len(samples["errors"]),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(samples["latency_ms"]) / elapsed, 3) if elapsed else 0.0,
+    }
+    for name in ("latency_ms", "submit_ms", "first_event_ms"):
+        values = samples.get(name)
+        if values:
+            for pct in (50, 95, 99):
+                report[f"{name}_p{pct}"] = round(percentile(values, pct), 2)
+            report[f"{name}_max"] = round(max(values), 2)
+    report["loop_lag_ms_p50"] = round(percentile(lag_ms, 50), 2)
+    report["loop_lag_ms_p99"] = round(percentile(lag_ms, 99), 2)
+    report["loop_lag_ms_max"] = round(max(lag_ms), 2) if lag_ms else 0.0
+    report["rss_baseline_mb"] = round(baseline_rss / 2**20, 1)
+    report["rss_peak_mb"] = round(rss.peak / 2**20, 1)
+    report["rss_per_agent_mb"] = round(max(0, rss.peak - baseline_rss) / 2**20 / concurrency, 1)
+    if samples["errors"]:
+        report["first_errors"] = samples["errors"][:5]
+    return report
+
+
+async def measure(mode: str, server: AppServer, tokens: List[str], site_url: str, tasks: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    base_url = f"http://127.0.0.1:{server.port}"
+    samples: Dict[str, List] = {"latency_ms": [], "submit_ms": [], "first_event_ms": [], "errors": []}
+    rss = RSSSampler()
+    baseline_rss = rss.sample()
+    rss.peak = 0
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(rss.run(stop))
+    server.take_lag()
+
+    started = time.perf_counter()
+    if mode == "execute":
+        users = [execute_user(base_url, token, site_url, tasks, options, samples) for token in tokens]
+    else:
+        ws_url = f"ws://127.0.0.1:{server.port}/api/agent/ws"
+        users = [ws_user(ws_url, token, site_url, tasks, options, samples) for token in tokens]
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await sampler
+    return summarize(samples, elapsed, server.take_lag(), rss, baseline_rss, len(tokens))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\nChange against {baseline.get('commit') or 'baseline'}:")
+    for mode, report in results["results"].items():
+        previous = baseline.get("results", {}).get(mode)
+        if not previous:
+            continue
+        for name in COMPARED:
+            if name in report and previous.get(name):
+                change = (report[name] - previous[name]) / previous[name] * 100
+                print(f"{mode:>8} {name:>18} {previous[name]:>10} -> {report[name]:>10} ({change:+.1f}%)")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_llm.register()
+    stub = StubSupabase(latency=args.supabase_rtt_ms / 1000)
+    services._supabase_service = SupabaseService(transport=stub.transport())
+
+    tokens = []
+    settings = stub.tables.setdefault("user_settings", [])
+    for i in range(args.concurrency):
+        user = stub.add_user(f"bench{i}@example.com", "benchmark")
+        settings.append({
+            "user_id": user["id"],
+            "api_keys": {fake_llm.PROVIDER: services.encryption_service.encrypt("fake-key")},
+            "preferences": {}
+        })
+        tokens.append(stub.issue_token(user))
+
+    site = StaticSite(args.images, args.site_latency_ms / 1000)
+    site_url = f"http://127.0.0.1:{site.port}"
+    options = {
+        "llm_latency_ms": args.llm_latency_ms,
+        "scroll_steps": args.scroll_steps,
+        "page_profile": args.page_profile
+    }
+
+    server = AppServer()
+    server.start()
+    results: Dict[str, Any] = {}
+    try:
+        for mode in args.modes.split(","):
+            results[mode] = await measure(mode, server, tokens, site_url, args.tasks, options)
+    finally:
+        server.stop()
+        site.server.shutdown()
+
+    return {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="virtual users, each with its own account")
+    parser.add_argument("--tasks", type=int, default=5, help="tasks per virtual user")
+    parser.add_argument("--modes", default="execute,ws", help="comma-separated: execute, ws")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="simulated model time per step")
+    parser.add_argument("--scroll-steps", type=int, default=1, help="scroll steps between opening the page and done")
+    parser.add_argument("--supabase-rtt-ms", type=float, default=20.0)
+    parser.add_argument("--site-latency-ms", type=float, default=10.0)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--page-profile", default="full")
+    parser.add_argument("--output", default="load_benchmark.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Read the baseline first; it may be the file being overwritten
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for mode, report in results["results"].items():
+        print(f"{mode}: {json.dumps({k: v for k, v in report.items() if k != 'first_errors'})}")
+        for error in report.get("first_errors", []):
+            print(f"  error: {error}")
+    print(f"Wrote {args.output}")
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
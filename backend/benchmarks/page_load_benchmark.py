@@ -0,0 +1,147 @@
+"""Page-load benchmark for the page profiles.
+
+Serves generated static pages from a local server: each page has images,
+web fonts, a video and tracker scripts, and trackers are served from
+``localhost`` while the page itself is on ``127.0.0.1`` so the domain list
+can tell them apart. Every page is loaded through ``BrowserPool`` leases
+with each page profile. The report shows load time and the bytes the server
+actually sent, next to the bytes saved that the per-task stats estimated.
+
+Usage:
+    python -m benchmarks.page_load_benchmark --pages 5 --latency-ms 30
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+PROFILES = ("full", "light", "minimal")
+
+
+def build_site(images: int) -> Dict[str, Tuple[str, bytes]]:
+    """Path -> (content type, body) for every page and asset"""
+    site = {
+        "/img.png": ("image/png", os.urandom(50_000)),
+        "/font.woff2": ("font/woff2", os.urandom(40_000)),
+        "/video.mp4": ("video/mp4", os.urandom(1_000_000)),
+        "/tracker.js": ("application/javascript", b"/*" + b"x" * 20_000 + b"*/"),
+    }
+    for page in range(64):
+        body = f"""<!doctype html><html><head>
+<style>@font-face {{ font-family: bench; src: url(/font.woff2?p={page}); }} body {{ font-family: bench; }}</style>
+<script src="http://localhost:{{port}}/tracker.js?p={page}&n=1"></script>
+<script src="http://localhost:{{port}}/tracker.js?p={page}&n=2"></script>
+</head><body><h1>Page {page}</h1><p>Static benchmark page.</p>
+{''.join(f'<img src="/img.png?p={page}&n={n}" width="100" height="100">' for n in range(images))}
+<video src="/video.mp4?p={page}" preload="auto" muted></video>
+</body></html>"""
+        site[f"/page/{page}"] = ("text/html", body.encode())
+    return site
+
+
+class StaticSite:
+    """Threaded local HTTP server that counts the bytes it sends"""
+
+    def __init__(self, images: int, latency: float):
+        self.site = build_site(images)
+        self.latency = latency
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(site.latency)
+                path = self.path.split("?")[0]
+                content_type, body = site.site.get(path, ("text/plain", b"not found"))
+                if path.startswith("/page/"):
+                    body = body.replace(b"{port}", str(site.port).encode())
+                self.send_response(200 if path in site.site else 404)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                with site._lock:
+                    site.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def take_bytes(self) -> int:
+        with self._lock:
+            sent, self.bytes_sent = self.bytes_sent, 0
+        return sent
+
+
+async def run(pages: int, images: int, latency_ms: float) -> None:
+    # Trackers come from localhost, so block that host instead of the real ad domains
+    domains_file = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+    domains_file.write("localhost\n")
+    domains_file.close()
+    os.environ["BLOCKED_DOMAINS_PATH"] = domains_file.name
+
+    from app.services.browser_pool import BrowserPool
+    from app.services.page_profile import PageProfile
+
+    site = StaticSite(images, latency_ms / 1000)
+    pool = BrowserPool(size=1, max_contexts_per_browser=1, max_uses=10_000)
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        await pool.start()
+        for name in PROFILES:
+            profile = PageProfile.from_options({"page_profile": name})
+            load_ms: List[float] = []
+            estimated = 0
+            site.take_bytes()
+            for page in range(pages):
+                async with pool.lease(page_profile=profile) as lease:
+                    browser_page = await lease.context.get_current_page()
+                    started = time.perf_counter()
+                    await browser_page.goto(f"http://127.0.0.1:{site.port}/page/{page}", wait_until="load")
+                    load_ms.append((time.perf_counter() - started) * 1000)
+                estimated += lease.stats.estimated_bytes_saved
+            results[name] = {
+                "median_ms": statistics.median(load_ms),
+                "max_ms": max(load_ms),
+                "kb_sent": site.take_bytes() / 1024,
+                "kb_saved_estimate": estimated / 1024,
+            }
+    finally:
+        await pool.close()
+        site.server.shutdown()
+        os.unlink(domains_file.name)
+
+    baseline = results["full"]
+    print(f"{pages} pages, {images} images each, {latency_ms:.0f} ms server latency")
+    print(f"{'profile':>10} {'median ms':>10} {'max ms':>10} {'KB sent':>10} {'KB saved':>10} {'est. saved':>10}")
+    for name, row in results.items():
+        print(
+            f"{name:>10} {row['median_ms']:>10.1f} {row['max_ms']:>10.1f} {row['kb_sent']:>10.0f} "
+            f"{baseline['kb_sent'] - row['kb_sent']:>10.0f} {row['kb_saved_estimate']:>10.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    args = parser.parse_args()
+    asyncio.run(run(min(args.pages, 64), args.images, args.latency_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time-to-first-request benchmark for the API process.
+
+Starts ``uvicorn app.main:app`` in a fresh process and measures how long it
+takes until ``GET /`` answers, the cost a container cold start or a
+``--reload`` cycle pays. Supabase and the encryption key get throwaway
+values and the browser pre-warm is off, so only Python start-up is timed.
+
+Usage:
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+from typing import List
+
+import httpx
+from cryptography.fernet import Fernet
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(timeout: float) -> float:
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("VITE_SUPABASE_URL", "http://127.0.0.1:54321")
+    env.setdefault("VITE_SUPABASE_ANON_KEY", "benchmark-anon-key")
+    env.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    env["BROWSER_POOL_PREWARM"] = "false"
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(process.stderr.read().decode().strip() or "server exited")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                time.sleep(0.01)
+        raise TimeoutError(f"no response within {timeout} seconds")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    samples: List[float] = [time_to_first_request(args.timeout) * 1000 for _ in range(args.runs)]
+    print(f"time to first request over {args.runs} runs (ms)")
+    print(f"{'min':>10} {'median':>10} {'max':>10}")
+    print(f"{min(samples):>10.1f} {statistics.median(samples):>10.1f} {max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
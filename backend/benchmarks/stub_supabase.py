@@ -0,0 +1,118 @@
+"""In-memory stand-in for the Supabase Auth and PostgREST APIs.
+
+Plugs into ``SupabaseService(transport=...)`` through an httpx mock
+transport, so the data layer can be exercised without a network or a
+Supabase project. Supports the subset of the API the backend uses:
+signup, password grant, ``GET /auth/v1/user`` and ``eq.`` filtered
+select/insert/update on any table.
+"""
+import json
+import time
+import hmac
+import uuid
+import base64
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class StubSupabase:
+    """Supabase stand-in with optional simulated round-trip latency"""
+
+    def __init__(self, jwt_secret: str = "stub-jwt-secret", latency: float = 0.0):
+        self.jwt_secret = jwt_secret
+        self.latency = latency
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.passwords: Dict[str, str] = {}
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def issue_token(self, user: Dict[str, Any], lifetime: int = 3600) -> str:
+        """Sign an HS256 access token the way Supabase Auth does"""
+        header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+        payload = _b64(json.dumps({
+            "sub": user["id"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": user.get("email"),
+            "exp": int(time.time()) + lifetime,
+        }).encode())
+        signature = hmac.new(self.jwt_secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return f"{header}.{payload}.{_b64(signature)}"
+
+    def add_user(self, email: str, password: str) -> Dict[str, Any]:
+        user = {"id": str(uuid.uuid4()), "email": email, "aud": "authenticated", "role": "authenticated"}
+        self.users[user["id"]] = user
+        self.passwords[email] = password
+        return user
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        path = request.url.path
+        body = json.loads(request.content) if request.content else None
+        if path.startswith("/auth/v1/"):
+            return self._handle_auth(request, path[len("/auth/v1/"):], body)
+        if path.startswith("/rest/v1/"):
+            return self._handle_rest(request, path[len("/rest/v1/"):], body)
+        return httpx.Response(404, json={"message": "Not found"})
+
+    def _handle_auth(self, request: httpx.Request, path: str, body: Optional[Dict[str, Any]]) -> httpx.Response:
+        if path == "signup":
+            if body["email"] in self.passwords:
+                return httpx.Response(422, json={"msg": "User already registered"})
+            return httpx.Response(200, json=self.add_user(body["email"], body["password"]))
+
+        if path == "token":
+            user = next((u for u in self.users.values() if u["email"] == body.get("email")), None)
+            if user is None or self.passwords.get(user["email"]) != body.get("password"):
+                return httpx.Response(400, json={"error": "invalid_grant"})
+            return httpx.Response(200, json={"access_token": self.issue_token(user), "user": user})
+
+        if path == "user":
+            token = request.headers.get("Authorization", "").replace("Bearer ", "")
+            try:
+                claims = json.loads(base64.urlsafe_b64decode(token.split(".")[1] + "=="))
+                return httpx.Response(200, json=self.users[claims["sub"]])
+            except Exception:
+                return httpx.Response(401, json={"msg": "Invalid token"})
+
+        return httpx.Response(404, json={"msg": "Not found"})
+
+    def _handle_rest(self, request: httpx.Request, table: str, body: Any) -> httpx.Response:
+        rows = self.tables.setdefault(table, [])
+        filters = {
+            key: value[3:] for key, value in request.url.params.items()
+            if value.startswith("eq.")
+        }
+        matches = [row for row in rows if all(str(row.get(k)) == v for k, v in filters.items())]
+        return_rows = "return=representation" in request.headers.get("Prefer", "")
+
+        if request.method == "GET":
+            limit = request.url.params.get("limit")
+            return httpx.Response(200, json=matches[:int(limit)] if limit else matches)
+
+        if request.method == "POST":
+            new_rows = body if isinstance(body, list) else [body]
+            for row in new_rows:
+                row.setdefault("id", str(uuid.uuid4()))
+            rows.extend(new_rows)
+            return httpx.Response(201, json=new_rows) if return_rows else httpx.Response(201)
+
+        if request.method == "PATCH":
+            for row in matches:
+                row.update(body)
+            return httpx.Response(200, json=matches) if return_rows else httpx.Response(204)
+
+        return httpx.Response(405)
@@ -0,0 +1,57 @@
+"""Production server profile: gunicorn managing uvicorn worker processes.
+
+Usage:
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Every worker runs its own browser pool, so the worker count is capped both
+by CPU cores and by how many pools fit in memory. Set ``WEB_CONCURRENCY`` to
+override it. With more than one worker, shared state defaults to a SQLite
+file so auth caches, jobs, connections and rate limit pauses are seen by
+every worker; point ``SHARED_STATE`` at Redis when running several hosts.
+"""
+import os
+import multiprocessing
+
+import psutil
+
+
+def default_workers() -> int:
+    cores = multiprocessing.cpu_count()
+    browsers = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+    browser_mb = int(os.getenv("BROWSER_POOL_MAX_MEMORY_MB", "1024"))
+    # Python process, loaded SDKs and connection pools on top of the browsers
+    worker_mb = browsers * browser_mb + int(os.getenv("WORKER_BASE_MEMORY_MB", "300"))
+    available_mb = psutil.virtual_memory().available // (1024 * 1024)
+    return max(1, min(cores, available_mb // worker_mb))
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Agent tasks and WebSocket sessions run for minutes; don't kill busy workers
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+# Off by default: a recycled worker cancels the agent jobs and WebSocket
+# tasks it is running. Set it to return memory held by long-lived SDK
+# clients when jobs are short enough to finish within graceful_timeout.
+max_requests = int(os.getenv("WORKER_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "200"))
+
+accesslog = "-"
+errorlog = "-"
+
+# Workers read these at import, so set them before they are forked
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if workers > 1:
+    os.environ.setdefault("SHARED_STATE", "sqlite:////tmp/browser-use-state.db")
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that exited from the merged metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
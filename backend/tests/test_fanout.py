@@ -0,0 +1,33 @@
+import pytest
+
+from app.services.fanout import SCORERS, default_scorer, get_scorer, load_scorer
+
+
+def custom_scorer(outcome):
+    return 42.0
+
+
+def test_builtin_scorers_by_name():
+    for name, scorer in SCORERS.items():
+        assert get_scorer(name) is scorer
+
+
+@pytest.mark.parametrize("name", ["nope", "os:system", "tests.test_fanout:custom_scorer", 3, ["default"]])
+def test_requests_cannot_pick_unknown_or_imported_scorers(name):
+    with pytest.raises(ValueError):
+        get_scorer(name)
+
+
+def test_default_scorer_without_configuration(monkeypatch):
+    monkeypatch.delenv("FANOUT_SCORER", raising=False)
+    assert get_scorer() is default_scorer
+
+
+def test_server_configures_a_custom_scorer(monkeypatch):
+    monkeypatch.setenv("FANOUT_SCORER", "tests.test_fanout:custom_scorer")
+    assert get_scorer()({}) == 42.0
+
+
+def test_load_scorer_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        load_scorer("nope")
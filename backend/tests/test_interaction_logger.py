@@ -0,0 +1,218 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+from app.services.interaction_logger import InteractionLogger, decompress_payload
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+class FakeSupabase:
+    """Records inserted rows; can be switched off, or refuse rows by task text"""
+
+    def __init__(self):
+        self.rows = []
+        self.tokens = []
+        self.down = False
+        self.crash = False
+
+    async def log_interactions(self, rows, token=None):
+        if self.crash:
+            self.crash = False
+            raise RuntimeError("unexpected")
+        if self.down:
+            raise HTTPError(503)
+        if any(row["task"] == "bad" for row in rows):
+            raise HTTPError(400)
+        self.rows.extend(rows)
+        self.tokens.append(token)
+
+
+@pytest.fixture
+def supabase():
+    return FakeSupabase()
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return str(tmp_path / "logs.jsonl")
+
+
+def make_logger(supabase, spill_path, **kwargs):
+    options = dict(batch_size=10, flush_interval=0.02, max_retries=1, spill_path=spill_path)
+    options.update(kwargs)
+    return InteractionLogger(supabase, **options)
+
+
+async def settle(seconds=0.2):
+    await asyncio.sleep(seconds)
+
+
+def test_rows_are_flushed_with_their_token(supabase, spill_path):
+    async def scenario():
+        logger = make_logger(supabase, spill_path)
+        await logger.start()
+        logger.log("u1", "m", "a", "completed", actions=[{"click": 1}], token="t1")
+        logger.log("u2", "m", "b", "completed", token="t2")
+        await settle()
+        await logger.stop()
+
+        assert sorted(row["task"] for row in supabase.rows) == ["a", "b"]
+        assert sorted(supabase.tokens) == ["t1", "t2"]
+        assert all("_token" not in row for row in supabase.rows)
+        row = next(row for row in supabase.rows if row["task"] == "a")
+        assert decompress_payload(row["actions"]) == [{"click": 1}]
+
+    asyncio.run(scenario())
+
+
+def test_failed_batches_spill_and_replay(supabase, spill_path):
+    async def scenario():
+        logger = make_logger(supabase, spill_path)
+        await logger.start()
+        supabase.down = True
+        logger.log("u1", "m", "a", "completed", token="secret-token")
+        await settle()
+
+        own_spill = logger._own_spill_path()
+        assert os.path.exists(own_spill)
+        with open(own_spill) as f:
+            assert "secret-token" not in f.read()
+        assert logger.metrics()["spilled_total"] == 1
+
+        # The next successful flush replays the spill file
+        supabase.down = False
+        logger.log("u1", "m", "b", "completed")
+        await settle()
+        await logger.stop()
+
+        assert sorted(row["task"] for row in supabase.rows) == ["a", "b"]
+        assert not [name for name in os.listdir(os.path.dirname(spill_path)) if name.startswith("logs.")]
+
+    asyncio.run(scenario())
+
+
+def test_spill_files_of_exited_workers_are_replayed(supabase, spill_path):
+    async def scenario():
+        root, ext = os.path.splitext(spill_path)
+        dead = f"{root}.999999999{ext}"
+        live = f"{root}.1{ext}"
+        for path, task in ((dead, "from-dead"), (live, "from-live")):
+            with open(path, "w") as f:
+                f.write(json.dumps({"user_id": "u", "model": "m", "task": task, "status": "completed"}) + "\n")
+
+        logger = make_logger(supabase, spill_path)
+        await logger.start()
+        await settle()
+        await logger.stop()
+
+        # pid 1 is alive, so its file is left to its owner
+        assert [row["task"] for row in supabase.rows] == ["from-dead"]
+        assert not os.path.exists(dead)
+        assert os.path.exists(live)
+
+    asyncio.run(scenario())
+
+
+def test_rejected_rows_go_to_the_dead_letter_file(supabase, spill_path):
+    async def scenario():
+        logger = make_logger(supabase, spill_path)
+        await logger.start()
+        for task in ("a", "bad", "c", "d"):
+            logger.log("u1", "m", task, "completed", token="t1")
+        await settle()
+        await logger.stop()
+
+        assert sorted(row["task"] for row in supabase.rows) == ["a", "c", "d"]
+        assert logger.metrics()["rejected_total"] == 1
+        with open(logger.dead_letter_path) as f:
+            assert [json.loads(line)["task"] for line in f] == ["bad"]
+        assert not os.path.exists(logger._own_spill_path())
+
+    asyncio.run(scenario())
+
+
+def test_flusher_survives_unexpected_errors(supabase, spill_path, monkeypatch):
+    async def scenario():
+        logger = make_logger(supabase, spill_path)
+        original = logger._flush
+        failures = {"left": 1}
+
+        async def flaky(rows, retries):
+            if failures["left"]:
+                failures["left"] -= 1
+                raise RuntimeError("unexpected")
+            return await original(rows, retries)
+
+        monkeypatch.setattr(logger, "_flush", flaky)
+        await logger.start()
+        logger.log("u1", "m", "a", "completed")
+        await settle()
+        assert not logger._worker.done()
+
+        # The interrupted batch was spilled and comes back with the next flush
+        logger.log("u1", "m", "b", "completed")
+        await settle()
+        await logger.stop()
+        assert sorted(row["task"] for row in supabase.rows) == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_missing_replay_file_does_not_stop_the_flusher(supabase, spill_path, monkeypatch):
+    async def scenario():
+        logger = make_logger(supabase, spill_path)
+        await logger.start()
+
+        def vanished(path):
+            raise FileNotFoundError(path)
+
+        monkeypatch.setattr(os, "remove", vanished)
+        supabase.down = True
+        logger.log("u1", "m", "a", "completed")
+        await settle()
+        supabase.down = False
+        logger.log("u1", "m", "b", "completed")
+        await settle()
+        assert not logger._worker.done()
+        await logger.stop()
+        assert {"a", "b"} <= {row["task"] for row in supabase.rows}
+
+    asyncio.run(scenario())
+
+
+def test_spill_directory_is_only_scanned_when_needed(supabase, spill_path, monkeypatch):
+    async def scenario():
+        import app.services.interaction_logger as interaction_logger
+
+        scans = []
+        original = interaction_logger.glob.glob
+        monkeypatch.setattr(interaction_logger.glob, "glob", lambda pattern: scans.append(pattern) or original(pattern))
+
+        logger = make_logger(supabase, spill_path, replay_interval=60)
+        await logger.start()
+        for task in ("a", "b", "c"):
+            logger.log("u1", "m", task, "completed")
+            await settle(0.05)
+        # Only the scan at start
+        assert len(scans) == 1
+
+        supabase.down = True
+        logger.log("u1", "m", "d", "completed")
+        await settle()
+        supabase.down = False
+        logger.log("u1", "m", "e", "completed")
+        await settle()
+        await logger.stop()
+
+        # The spill brings one replay scan with it
+        assert len(scans) == 2
+        assert sorted(row["task"] for row in supabase.rows) == ["a", "b", "c", "d", "e"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,226 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import (
+    CANCELLED,
+    COMPLETED,
+    RUNNING,
+    InMemoryJobStore,
+    JobManager,
+    SQLiteJobStore,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobStore(str(tmp_path / "jobs.db"))
+    return InMemoryJobStore()
+
+
+def steps(count, delay=0.02):
+    async def runner():
+        for step in range(count):
+            await asyncio.sleep(delay)
+            yield {"type": "step", "step_id": step}
+    return runner
+
+
+async def wait_for_status(manager, job_id, status, timeout=2.0):
+    async def poll():
+        while (await manager.get(job_id))["status"] != status:
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_results_are_streamed_in_order(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=1)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, steps(3))
+        await wait_for_status(manager, job["id"], COMPLETED)
+        results = (await manager.get(job["id"]))["results"]
+        assert [result["step_id"] for result in results] == [0, 1, 2]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_long_poll_wakes_on_the_next_result(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=1)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, steps(3, delay=0.1))
+
+        seen = len((await manager.get(job["id"], wait=2, after=0))["results"])
+        assert seen >= 1
+        assert len((await manager.get(job["id"], wait=2, after=seen))["results"]) > seen
+
+        # Without new results the poll returns when the wait is over
+        await wait_for_status(manager, job["id"], COMPLETED)
+        done = await manager.get(job["id"], wait=0.2, after=10)
+        assert done["status"] == COMPLETED
+
+        # The last waiter leaves no change event behind
+        assert job["id"] not in manager._changed
+        assert job["id"] not in manager._waiting
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_queued_job(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=1)
+        await manager.start()
+        running = await manager.submit("u1", "m", "t", {}, steps(50))
+        queued = await manager.submit("u1", "m", "t", {}, steps(1))
+        assert await manager.cancel(queued["id"])
+        assert (await manager.get(queued["id"]))["status"] == CANCELLED
+        assert await manager.cancel(running["id"])
+        await wait_for_status(manager, running["id"], CANCELLED)
+        # Finished jobs can't be cancelled again
+        assert not await manager.cancel(running["id"])
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_requested_by_another_worker(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=1, cancel_poll=0)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, steps(100))
+        await wait_for_status(manager, job["id"], RUNNING)
+        # What JobManager.cancel records when the job runs in another process
+        await store.update(job["id"], cancel_requested=True)
+        await wait_for_status(manager, job["id"], CANCELLED)
+        assert len((await manager.get(job["id"]))["results"]) < 100
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_per_user_limit_lets_other_users_run(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=2, max_per_user=1)
+        await manager.start()
+        first = await manager.submit("u1", "m", "t", {}, steps(20))
+        second = await manager.submit("u1", "m", "t", {}, steps(1))
+        other = await manager.submit("u2", "m", "t", {}, steps(1))
+
+        await wait_for_status(manager, other["id"], COMPLETED)
+        assert (await manager.get(second["id"]))["status"] != COMPLETED
+        assert manager.metrics()["running_per_user"] == {"u1": 1}
+
+        await wait_for_status(manager, second["id"], COMPLETED)
+        assert (await manager.get(first["id"]))["status"] == COMPLETED
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected(store):
+    async def scenario():
+        manager = JobManager(store=store, workers=1, max_queued=1)
+        # Not started, so submitted jobs stay queued
+        await manager.submit("u1", "m", "t", {}, steps(1))
+        with pytest.raises(OverflowError):
+            await manager.submit("u1", "m", "t", {}, steps(1))
+
+    asyncio.run(scenario())
+
+
+def test_failed_runner_marks_the_job_failed(store):
+    async def scenario():
+        async def broken():
+            yield {"type": "step", "step_id": 0}
+            raise RuntimeError("boom")
+
+        manager = JobManager(store=store, workers=1)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, broken)
+        await wait_for_status(manager, job["id"], "failed")
+        failed = await manager.get(job["id"])
+        assert failed["error"] == "boom"
+        assert len(failed["results"]) == 1
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_keep_their_status(store):
+    async def scenario():
+        job = {"id": "j1", "status": "queued", "results": [], "finished_at": None}
+        await store.create(job)
+        await store.update("j1", status=CANCELLED, finished_at=1.0)
+        # A late write from a run that was cancelled as it started
+        await store.update("j1", status=RUNNING, started_at=2.0)
+        stored = await store.get("j1")
+        assert stored["status"] == CANCELLED
+        assert stored.get("started_at") is None
+
+    asyncio.run(scenario())
+
+
+class SlowStartStore:
+    """Wraps a store so the RUNNING write is still in flight, and lands, after the run is cancelled"""
+
+    def __init__(self, store):
+        self.store = store
+        self.writing = asyncio.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    async def update(self, job_id, **fields):
+        if fields.get("status") != RUNNING:
+            return await self.store.update(job_id, **fields)
+
+        async def write():
+            await asyncio.sleep(0.05)
+            await self.store.update(job_id, **fields)
+
+        self.writing.set()
+        await asyncio.shield(write())
+
+
+def test_job_cancelled_as_it_starts_is_not_left_running(store):
+    async def scenario():
+        slow = SlowStartStore(store)
+        manager = JobManager(store=slow, workers=1)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, steps(5))
+        await asyncio.wait_for(slow.writing.wait(), 1)
+        assert await manager.cancel(job["id"])
+        await wait_for_status(manager, job["id"], CANCELLED)
+        await asyncio.sleep(0.1)
+        assert (await manager.get(job["id"]))["status"] == CANCELLED
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_runner_cleanup_runs_when_cancelled_by_another_worker(store):
+    async def scenario():
+        closed = asyncio.Event()
+
+        async def runner():
+            try:
+                for step in range(100):
+                    await asyncio.sleep(0.02)
+                    yield {"type": "step", "step_id": step}
+            finally:
+                closed.set()
+
+        manager = JobManager(store=store, workers=1, cancel_poll=0)
+        await manager.start()
+        job = await manager.submit("u1", "m", "t", {}, runner)
+        await wait_for_status(manager, job["id"], RUNNING)
+        await store.update(job["id"], cancel_requested=True)
+        await wait_for_status(manager, job["id"], CANCELLED)
+        await asyncio.wait_for(closed.wait(), 1)
+        await manager.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.services.llm_memo import LLMMemo
+from app.services.llm_memo_cache import MemoCache
+from app.services.metrics_callback import LLMMetricsCallbackHandler
+from app.services.rate_limit_callback import RateLimitCallbackHandler, permit_gate
+from app.services.rate_limiter import RateLimiter
+from app.services.shared_state import MemorySharedState
+
+
+class SlowChatModel(BaseChatModel):
+    """Answers after ``delay`` seconds"""
+
+    delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ANTHROPIC_CONCURRENCY", "2")
+    return RateLimiter(state=MemorySharedState(), workers=1)
+
+
+def in_flight(limiter):
+    return {name: bucket.in_flight for name, bucket in limiter._buckets.items()}
+
+
+def test_cancelled_calls_give_their_permit_back(limiter):
+    async def scenario():
+        handlers = [RateLimitCallbackHandler(limiter, "anthropic", "k"), LLMMetricsCallbackHandler("anthropic")]
+        llm = SlowChatModel(delay=10, callbacks=handlers, rate_limiter=permit_gate)
+
+        calls = [asyncio.create_task(llm.ainvoke([HumanMessage(content="hi")])) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+        assert in_flight(limiter) == {"anthropic": 0, "anthropic:k": 0}
+        assert len(handlers[0]._calls) == 0
+        assert len(handlers[1]._started) == 0
+
+        # Later calls are not stuck behind the leaked permits
+        fast = llm.model_copy(update={"delay": 0})
+        for _ in range(3):
+            await asyncio.wait_for(fast.ainvoke([HumanMessage(content="hi")]), 1)
+
+    asyncio.run(scenario())
+
+
+def test_finished_calls_release_their_permit(limiter):
+    async def scenario():
+        handler = RateLimitCallbackHandler(limiter, "anthropic", "k")
+        llm = SlowChatModel(callbacks=[handler], rate_limiter=permit_gate)
+        await llm.ainvoke([HumanMessage(content="hi")])
+        assert in_flight(limiter) == {"anthropic": 0, "anthropic:k": 0}
+        assert limiter._buckets["anthropic:k"].acquired_total == 1
+        assert limiter._buckets["anthropic:k"].cancelled_total == 0
+
+    asyncio.run(scenario())
+
+
+def test_memoized_answers_skip_the_limiter(limiter):
+    async def scenario():
+        handler = RateLimitCallbackHandler(limiter, "anthropic", "k")
+        memo = LLMMemo(max_size=10, ttl=60, enabled=True)
+        llm = SlowChatModel(callbacks=[handler], rate_limiter=permit_gate, cache=MemoCache("slow", 0, ["u1"], memo))
+        await llm.ainvoke([HumanMessage(content="hi")])
+        assert limiter._buckets["anthropic:k"].acquired_total == 1
+
+        # With the key at its concurrency limit, a memo hit still answers straight away
+        held = [await limiter.acquire("anthropic", "k") for _ in range(2)]
+        answer = await asyncio.wait_for(llm.ainvoke([HumanMessage(content="hi")]), 0.5)
+        assert answer.content == "ok"
+        assert limiter._buckets["anthropic:k"].acquired_total == 3
+        for permit in held:
+            await limiter.release(permit)
+
+    asyncio.run(scenario())
@@ -0,0 +1,148 @@
+import time
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import RateLimiter
+from app.services.shared_state import MemorySharedState
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_OPENAI_RPM", "600")
+    monkeypatch.setenv("RATE_LIMIT_OPENAI_TPM", "1000000")
+    monkeypatch.setenv("RATE_LIMIT_OPENAI_CONCURRENCY", "4")
+    return RateLimiter(state=MemorySharedState(), workers=1)
+
+
+def test_429_pauses_only_the_throttled_key(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1")
+        await limiter.release(permit, headers={"retry-after": "5"}, rate_limited=True)
+
+        provider = limiter._buckets["openai"]
+        key = limiter._buckets["openai:k1"]
+        assert key.paused_until > time.monotonic()
+        assert key.concurrency_limit == 2
+        assert provider.paused_until == 0
+        assert provider.concurrency_limit == 4
+
+        # Another key goes straight through
+        other = await asyncio.wait_for(limiter.acquire("openai", "k2"), 0.5)
+        await limiter.release(other)
+
+        # The throttled key waits out its pause
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire("openai", "k1"), 0.2)
+
+    asyncio.run(scenario())
+
+
+def test_429_pause_is_published_for_other_workers(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1")
+        await limiter.release(permit, headers={"retry-after": "5"}, rate_limited=True)
+        assert await limiter.state.get("rate-limit-pause:openai:k1")
+        assert await limiter.state.get("rate-limit-pause:openai") is None
+
+    asyncio.run(scenario())
+
+
+def test_remaining_headers_only_apply_to_the_key(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1")
+        await limiter.release(permit, headers={
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "10s",
+        })
+        assert limiter._buckets["openai:k1"].paused_until > time.monotonic()
+        assert limiter._buckets["openai"].paused_until == 0
+
+    asyncio.run(scenario())
+
+
+def test_key_at_its_limit_does_not_hold_up_other_keys(limiter):
+    async def scenario():
+        held = await limiter.acquire("openai", "k1")
+        limiter._buckets["openai:k1"].concurrency_limit = 1
+        blocked = asyncio.create_task(limiter.acquire("openai", "k1"))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+
+        # k2 arrived later but is not queued behind k1's waiter
+        other = await asyncio.wait_for(limiter.acquire("openai", "k2"), 0.5)
+        assert not blocked.done()
+
+        await limiter.release(held)
+        await limiter.release(await asyncio.wait_for(blocked, 0.5))
+        await limiter.release(other)
+
+    asyncio.run(scenario())
+
+
+def test_paused_key_lets_other_keys_pass(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1")
+        await limiter.release(permit, headers={"retry-after": "5"}, rate_limited=True)
+        stuck = asyncio.create_task(limiter.acquire("openai", "k1"))
+        await asyncio.sleep(0.05)
+
+        # k2 arrived after k1's waiter but is not queued behind it
+        started = time.monotonic()
+        other = await asyncio.wait_for(limiter.acquire("openai", "k2"), 0.5)
+        assert time.monotonic() - started < 0.5
+        assert not stuck.done()
+        await limiter.release(other)
+        stuck.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_callers_on_one_key_are_served_in_arrival_order(limiter):
+    async def scenario():
+        order = []
+        held = await limiter.acquire("openai", "k1")
+        limiter._buckets["openai:k1"].concurrency_limit = 1
+
+        async def call(name):
+            permit = await limiter.acquire("openai", "k1")
+            order.append(name)
+            await limiter.release(permit)
+
+        tasks = []
+        for name in ("a", "b", "c"):
+            tasks.append(asyncio.create_task(call(name)))
+            await asyncio.sleep(0.01)
+        await limiter.release(held)
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+        assert order == ["a", "b", "c"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_calls_only_free_their_slot(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1", tokens=500)
+        key = limiter._buckets["openai:k1"]
+        budget = key.token_budget
+        limit = key.concurrency_limit
+        await limiter.release(permit, cancelled=True)
+        assert key.in_flight == 0
+        assert key.token_budget == pytest.approx(budget, abs=1)
+        assert key.concurrency_limit == limit
+        assert key.cancelled_total == 1
+
+    asyncio.run(scenario())
+
+
+def test_idle_key_buckets_are_pruned(limiter):
+    async def scenario():
+        permit = await limiter.acquire("openai", "k1")
+        await limiter.release(permit)
+        limiter._buckets["openai:k1"].updated_at -= 120
+        limiter._pruned_at -= 61
+        limiter._prune(time.monotonic())
+        assert "openai:k1" not in limiter._buckets
+        assert "openai" in limiter._buckets
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+import json
+import hmac
+import time
+import base64
+import hashlib
+
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from app.services.token_verifier import InvalidTokenError, TokenVerifier
+
+SECRET = "test-secret"
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64_int(value: int) -> str:
+    return b64(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def claims(**overrides):
+    return dict({"sub": "user-1", "aud": "authenticated", "exp": time.time() + 60}, **overrides)
+
+
+def hs256(payload, secret=SECRET.encode(), header=None):
+    header = header or {"alg": "HS256", "typ": "JWT"}
+    signing_input = f"{b64(json.dumps(header).encode())}.{b64(json.dumps(payload).encode())}"
+    signature = hmac.new(secret, signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{b64(signature)}"
+
+
+@pytest.fixture
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def jwks_path(tmp_path, rsa_key):
+    numbers = rsa_key.public_key().public_numbers()
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{"kty": "RSA", "kid": "k1", "n": b64_int(numbers.n), "e": b64_int(numbers.e)}]}))
+    return str(path)
+
+
+def rs256(payload, key, kid="k1"):
+    header = {"alg": "RS256", "typ": "JWT", "kid": kid}
+    signing_input = f"{b64(json.dumps(header).encode())}.{b64(json.dumps(payload).encode())}"
+    signature = key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{signing_input}.{b64(signature)}"
+
+
+def test_valid_hs256_token():
+    assert TokenVerifier(secret=SECRET, jwks_path="").verify(hs256(claims()))["sub"] == "user-1"
+
+
+def test_expired_token():
+    with pytest.raises(InvalidTokenError, match="expired"):
+        TokenVerifier(secret=SECRET, jwks_path="", leeway=0).verify(hs256(claims(exp=time.time() - 10)))
+
+
+def test_expiry_leeway():
+    verifier = TokenVerifier(secret=SECRET, jwks_path="", leeway=30)
+    assert verifier.verify(hs256(claims(exp=time.time() - 10)))
+
+
+def test_missing_expiry():
+    payload = claims()
+    del payload["exp"]
+    with pytest.raises(InvalidTokenError):
+        TokenVerifier(secret=SECRET, jwks_path="").verify(hs256(payload))
+
+
+def test_bad_signature():
+    token = hs256(claims(), secret=b"another-secret")
+    with pytest.raises(InvalidTokenError, match="signature"):
+        TokenVerifier(secret=SECRET, jwks_path="").verify(token)
+
+
+def test_tampered_claims():
+    header, _, signature = hs256(claims()).split(".")
+    forged = f"{header}.{b64(json.dumps(claims(sub='admin')).encode())}.{signature}"
+    with pytest.raises(InvalidTokenError):
+        TokenVerifier(secret=SECRET, jwks_path="").verify(forged)
+
+
+def test_wrong_audience():
+    with pytest.raises(InvalidTokenError, match="audience"):
+        TokenVerifier(secret=SECRET, jwks_path="").verify(hs256(claims(aud="someone-else")))
+
+
+def test_alg_none_is_never_accepted():
+    header = b64(json.dumps({"alg": "none", "typ": "JWT"}).encode())
+    token = f"{header}.{b64(json.dumps(claims()).encode())}."
+    assert TokenVerifier(secret=SECRET, jwks_path="").verify(token) is None
+
+
+def test_valid_rs256_token(jwks_path, rsa_key):
+    verifier = TokenVerifier(secret="", jwks_path=jwks_path)
+    assert verifier.verify(rs256(claims(), rsa_key))["sub"] == "user-1"
+
+
+def test_rs256_signed_by_another_key(jwks_path):
+    other = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(InvalidTokenError, match="signature"):
+        TokenVerifier(secret="", jwks_path=jwks_path).verify(rs256(claims(), other))
+
+
+def test_unknown_kid_falls_back(jwks_path, rsa_key):
+    assert TokenVerifier(secret="", jwks_path=jwks_path).verify(rs256(claims(), rsa_key, kid="k2")) is None
+
+
+def test_alg_confusion_with_public_key_as_hmac_secret(jwks_path, rsa_key):
+    # An HS256 token "signed" with the public key must not verify against the JWKS
+    public_pem = rsa_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    token = hs256(claims(), secret=public_pem, header={"alg": "HS256", "typ": "JWT", "kid": "k1"})
+    assert TokenVerifier(secret="", jwks_path=jwks_path).verify(token) is None
+    with pytest.raises(InvalidTokenError, match="signature"):
+        TokenVerifier(secret=SECRET, jwks_path=jwks_path).verify(token)
+
+
+def test_malformed_token():
+    with pytest.raises(InvalidTokenError, match="Malformed"):
+        TokenVerifier(secret=SECRET, jwks_path="").verify("not-a-jwt")
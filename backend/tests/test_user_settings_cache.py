@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.services.shared_state import MemorySharedState
+from app.services.user_settings_cache import UserSettingsCache
+
+
+class SlowLoader:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, user_id, token=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"api_keys": {"openai": f"key-{self.calls}"}}
+
+
+def make_cache(loader):
+    return UserSettingsCache(loader, ttl=60, max_size=10, state=MemorySharedState())
+
+
+def test_concurrent_callers_share_one_load():
+    async def scenario():
+        loader = SlowLoader()
+        cache = make_cache(loader)
+        rows = await asyncio.gather(*(cache.get("u1") for _ in range(5)))
+        assert loader.calls == 1
+        assert all(row == rows[0] for row in rows)
+
+    asyncio.run(scenario())
+
+
+def test_waiters_retry_when_the_loading_caller_is_cancelled():
+    async def scenario():
+        loader = SlowLoader()
+        cache = make_cache(loader)
+        first = asyncio.create_task(cache.get("u1"))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get("u1")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        rows = await asyncio.wait_for(asyncio.gather(*waiters), 1)
+        assert all(row["api_keys"] for row in rows)
+        assert loader.calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_failed_load_reaches_every_waiter():
+    async def scenario():
+        async def broken(user_id, token=None):
+            await asyncio.sleep(0.02)
+            raise RuntimeError("down")
+
+        cache = make_cache(broken)
+        results = await asyncio.gather(*(cache.get("u1") for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not cache._inflight
+
+    asyncio.run(scenario())